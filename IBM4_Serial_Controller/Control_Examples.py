@@ -9,14 +9,36 @@ Methods for testing the operation of the IBM4 Serial Controller Class
 5. Multi-reads and timings
 6. Multimeter mode
 7. Linear single channel sweep
+8. asyncio reads on several IBM4
+9. Linear sweep with adaptive settle time
+10. Continuous streaming acquisition
+11. Reads on every attached IBM4 using a pool
+12. Examples run against an emulated IBM4
+13. Differential voltages between all pairs of channels
+14. Sweep written to disk step by step, resumable
+15. Sweep of both analog outputs over a grid of voltages
+16. Up / down sweep for hysteresis measurements using a sweep program
+17. Datalogging at a fixed rate to rolling files
+18. One IBM4 shared by several threads
+19. Tight write / read loop using pre-encoded commands
+20. Constant current through a sense resistor using closed loop control
+21. Long acquisition of one million readings
+22. Host timestamps of readings and resampling onto a uniform time grid
 
 R. Sheehan 12 - 6 - 2024
 """
 
 import time
+import threading
+import asyncio
 import numpy
 import Sweep_Interval
 import IBM4_Lib
+import IBM4_Async
+import IBM4_Pool
+import IBM4_Emulator
+import IBM4_SweepFile
+import IBM4_Worker
 
 MOD_NAME_STR = "Control_Examples"
 
@@ -243,6 +265,9 @@ def Multiple_Readings():
         # Execution of ReadAverageVoltageAllChnnl takes ~ 5 ReadAverageVoltage which makes sense really
         # since ReadAverageVoltageAllChnnl consists of 5 calls to ReadAverageVoltage
         # R. Sheehan 9 - 7 - 2024
+        # ReadAverageVoltageAllChnnl now sends the 5 Average commands in a single transaction, see Ser_Iface.ScanAllChnnl
+        # the saving is the link round trip of 4 of the 5 reads, see IBM4_Benchmark.Throughput_Benchmark
+        # ReadLong records the host time of each chunk of readings, from which the sample rate during the read is estimated, see Timed_Readings
 
         Nreads = 501
         Vset = 1.5
@@ -379,3 +404,464 @@ def Linear_Sweep_V2():
         print(ERR_STATEMENT)
         print(e)
 
+def Async_Multiple_Boards(port_names = ['COM3', 'COM4']):
+    """
+    Read from several IBM4 at the same time using a single asyncio event loop
+    """
+
+    FUNC_NAME = ".Async_Multiple_Boards()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    async def acquire():
+        devs = [IBM4_Async.AsyncSer_Iface(port) for port in port_names]
+        for dev in devs:
+            await dev.OpenComms()
+
+        Nreads = 501
+        input_ch = 'A2'
+
+        print("Multiple Reads on Several IBM4")
+        print("Ports:", port_names)
+
+        # the reads on each board are in flight at the same time
+        start = time.time()
+        results = await asyncio.gather( *[dev.ReadMultipleVoltage(input_ch, Nreads) for dev in devs] )
+        end = time.time()
+        for port, res in zip(port_names, results):
+            if res is not None:
+                print("%(v1)s: Measured Voltage: %(v2)0.3f +/- %(v3)0.3f (V)"%{"v1":port, "v2":res[0], "v3":res[1]})
+        print("%(v1)d measurements performed in %(v2)0.3f seconds"%{"v1":Nreads*len(devs), "v2":end-start})
+
+        for dev in devs:
+            await dev.CloseComms()
+
+    try:
+        asyncio.run( acquire() )
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Linear_Sweep_Settle():
+    """
+    Perform a linear sweep that waits only as long as the load needs to settle at each step
+    """
+
+    FUNC_NAME = ".Linear_Sweep_Settle()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        no_steps = 50
+        v_start = 0.0
+        v_end = 3.0
+        the_interval = Sweep_Interval.SweepSpace(no_steps, v_start, v_end)
+
+        # after each step A2 is read until it is stable to within 5 mV, for at most 0.5 s
+        start = time.time()
+        sweep_data = the_dev.SingleChannelSweepB('A0', the_interval, settle_channel = 'A2', settle_tol = 0.005, settle_max = 0.5)
+        end = time.time()
+
+        print('Measured data')
+        print(sweep_data[:, :-1])
+        print("Settle time: mean %(v1)0.3f s, max %(v2)0.3f s"%{"v1":numpy.mean(sweep_data[:, -1]), "v2":numpy.max(sweep_data[:, -1])})
+        print("Sweep took %(v1)0.3f s, a fixed delay would have taken at least %(v2)0.3f s"%{"v1":end-start, "v2":0.25*sweep_data.shape[0]})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Streaming_Acquisition(no_chunks = 20):
+    """
+    Read a channel continuously, processing each chunk of readings as it arrives
+    """
+
+    FUNC_NAME = ".Streaming_Acquisition()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        print("Streaming Acquisition on A2")
+        with the_dev.Stream('A2', chunk_size = 1000) as stream:
+            for seq, t_start, t_done, vals in stream.Chunks(max_chunks = no_chunks):
+                # vals is a view of the ring buffer, use numpy.copy(vals) to keep it
+                print("Chunk %(v1)d: %(v2)0.3f +/- %(v3)0.3f (V) in %(v4)0.3f s"%{"v1":seq, "v2":numpy.mean(vals), "v3":numpy.std(vals, ddof = 1), "v4":t_done-t_start})
+            print(stream.Status())
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Pool_All_Boards():
+    """
+    Open every IBM4 attached to the PC and read all their input channels at the same time
+    """
+
+    FUNC_NAME = ".Pool_All_Boards()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        with IBM4_Pool.IBM4Pool() as pool:
+            print(pool)
+            print("IDN strings:", [res["result"] for res in pool.IdentifyIBM4()])
+
+            start = time.time()
+            results = pool.ReadAverageVoltageAllChnnl(100)
+            end = time.time()
+            for res in results:
+                print("%(v1)s: %(v2)s in %(v3)0.3f s"%{"v1":res["port"], "v2":res["result"], "v3":res["t_done"]-res["t_start"]})
+            print("All boards read in %(v1)0.3f seconds"%{"v1":end-start})
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Emulated_IBM4():
+    """
+    Run some of the examples against a software IBM4, no board is needed
+    """
+
+    FUNC_NAME = ".Emulated_IBM4()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # A0 drives A2 and, through a divider, A3, A1 drives A4 and A5, the inputs respond with a time constant of 5 ms
+        circuit = IBM4_Emulator.Circuit(tau = 0.005, noise = 0.002)
+        with IBM4_Emulator.Emulator(circuit = circuit) as emu:
+            print("IBM4 emulator running at", emu.port)
+
+            # the emulator is recorded in the discovery cache, so it is found in the same way as a board
+            the_dev = IBM4_Lib.Ser_Iface()
+            print("IBM4 IDN string:", the_dev.IdentifyIBM4() )
+
+            the_dev.WriteVoltage('A0', 1.5)
+            time.sleep(0.05)
+            print("Voltages at A2, A3, A4, A5, D2:", the_dev.ReadAverageVoltageAllChnnl(100))
+
+            the_dev.LinkSpeed()
+
+            sweep_data = the_dev.SingleChannelSweepA('A0', 0.0, 3.0, 10, settle_channel = 'A2', settle_tol = 0.005)
+            print('Measured data')
+            print(sweep_data)
+
+            del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Differential_Matrix():
+    """
+    Obtain the differential voltages between every pair of channels from a single acquisition
+    """
+
+    FUNC_NAME = ".Differential_Matrix()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        # the circuit of Differential_Readings, A2 set to Vin, A3 between the resistor and the diode, A4 at GND
+        Nreads = 237
+        Rval = 10.0 / 1000.0 # sense resistance in kOhm
+        Vset = 2.25
+        output_ch = 'A0' # select the voltage output channel either A0 or A1
+
+        the_dev.WriteVoltage(output_ch, Vset)
+        time.sleep(1) # give it some time to settle
+
+        # one block of reads on A2, A3, A4 replaces the three DifferentialRead calls
+        res = the_dev.DiffMatrix(['A2', 'A3', 'A4'], Nreads)
+        print("Differential voltages, row - column:", res["channels"])
+        print(res["mean"])
+        print("Set Voltage: %(v1)0.3f +/- %(v2)0.3f (V)"%{"v1":res["mean"][0, 2],"v2":res["delta"][0, 2]})
+        print("Sense Voltage: %(v1)0.3f +/- %(v2)0.3f (V)"%{"v1":res["mean"][0, 1],"v2":res["delta"][0, 1]})
+        print("Sense Current: %(v1)0.1f +/- %(v2)0.1f (mA)"%{"v1":res["mean"][0, 1]/Rval,"v2":res["delta"][0, 1]/Rval})
+        print("Diode Voltage: %(v1)0.3f +/- %(v2)0.3f (V)"%{"v1":res["mean"][1, 2],"v2":res["delta"][1, 2]})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Resumable_Sweep(sweep_file = 'Linear_Sweep.ibm4'):
+    """
+    Perform a long linear sweep that writes each step to disk, if the sweep is interrupted run it again to resume
+    """
+
+    FUNC_NAME = ".Resumable_Sweep()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        # steps already held in sweep_file are not measured again
+        sweep_data = the_dev.SingleChannelSweepA('A0', 0.0, 3.0, 300, sweep_file = sweep_file)
+
+        print('Measured data')
+        print(sweep_data)
+
+        # the file can be read back without an IBM4
+        header, file_data = IBM4_SweepFile.Read_Sweep_File(sweep_file)
+        print("%(v1)s holds %(v2)d of %(v3)d steps, columns %(v4)s"%{"v1":sweep_file, "v2":file_data.shape[0], "v3":len(header["params"]["set_points"]), "v4":header["columns"]})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Grid_Sweep():
+    """
+    Sweep A0 and A1 over a grid of voltages and read all analog inputs at each point
+    """
+
+    FUNC_NAME = ".Grid_Sweep()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        # define the sweep space of each output
+        interval_A0 = Sweep_Interval.SweepSpace(6, 0.0, 2.5)
+        interval_A1 = Sweep_Interval.SweepSpace(11, 0.0, 2.5)
+
+        # grid_data[i, j] holds [A2, A3, A4, A5, D2] read with A0 at step i and A1 at step j
+        grid_data = the_dev.TwoChannelSweep(interval_A0, interval_A1, no_averages = 10)
+
+        set_A0 = interval_A0.SetPoints()
+        set_A1 = interval_A1.SetPoints()
+        print('Voltage at A2 (rows: A0 set-point, columns: A1 set-point)')
+        print('A0 \\ A1', set_A1)
+        for i in range(0, len(set_A0), 1):
+            print('%(v1)0.2f'%{"v1":set_A0[i]}, grid_data[i, :, IBM4_Lib.READ_CHNNLS['A2']])
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Hysteresis_Sweep():
+    """
+    Sweep A0 up and back down in one continuous run, holding the output at the top of the sweep, and separate the two branches
+    """
+
+    FUNC_NAME = ".Hysteresis_Sweep()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        # define the sweep program, up from 0 to 2.5V, hold for 5 reads, down to 0V
+        prog = Sweep_Interval.SweepProgram()
+        prog.Ramp(0.0, 2.5, 26).Dwell(5).Ramp(2.5, 0.0, 26)
+
+        sweep_data = the_dev.ProgramSweep('A0', prog, no_averages = 10)
+
+        # split the rows of the sweep by segment
+        segment = prog.SegmentIndex()
+        print('Up branch')
+        print(sweep_data[segment == 0])
+        print('Down branch')
+        print(sweep_data[segment == 2])
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Data_Logging():
+    """
+    Log the voltage at all analog inputs once per second for one minute, to files of 20 rows each
+    """
+
+    FUNC_NAME = ".Data_Logging()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        the_dev.WriteVoltage('A0', 1.5)
+
+        # rows are written to IBM4_Log_0000.csv, IBM4_Log_0001.csv, ...
+        summary = the_dev.DataLogger('IBM4_Log', interval = 1.0, duration = 60, rows_per_file = 20, loud = True)
+
+        print('Rows written: ', summary["rows"])
+        print('Deadlines missed: ', summary["missed"])
+        print('Max. lateness: %(v1)0.2f ms'%{"v1":1000.0*summary["max_late_s"]})
+        print('Log files: ', summary["files"])
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Shared_IBM4():
+    """
+    Log from one thread while another thread performs a sweep on the same IBM4
+    """
+
+    FUNC_NAME = ".Shared_IBM4()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # every call is run by the worker thread that owns the IBM4, callers get a future back
+        with IBM4_Worker.WorkerSer_Iface() as the_dev:
+
+            def log_A5(no_rows):
+                for i in range(0, no_rows, 1):
+                    # the log reads jump ahead of any call still queued by the sweep
+                    print('A5: ', the_dev.ReadAverageVoltage('A5', 10, priority = IBM4_Worker.HIGH).result())
+                    time.sleep(0.5)
+
+            logger = threading.Thread(target = log_A5, args = (10,))
+            logger.start()
+
+            sweep_data = the_dev.SingleChannelSweepA('A0', 0.0, 2.5, 11).result()
+            logger.join()
+
+            print('Measured data')
+            print(sweep_data)
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Fast_Loop():
+    """
+    Set A0 and read A2 in a tight loop using pre-encoded commands
+    """
+
+    FUNC_NAME = ".Fast_Loop()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        # the channels are validated and the commands encoded once, here, not on every call
+        fast = the_dev.FastPath()
+        write_A0 = fast.Writer('A0')
+        read_A2 = fast.Reader('A2')
+
+        set_points = numpy.linspace(0.0, 3.0, 301)
+        readings = numpy.zeros(len(set_points))
+        start = time.perf_counter()
+        for i in range(0, len(set_points), 1):
+            write_A0(set_points[i])
+            readings[i] = read_A2()
+        elapsed = time.perf_counter() - start
+
+        print('%(v1)d write / read pairs in %(v2)0.3f s'%{"v1":len(set_points), "v2":elapsed})
+        print('Max. difference between set and read voltage: %(v1)0.4f V'%{"v1":numpy.max(numpy.abs(readings - set_points))})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Constant_Current():
+    """
+    Hold a constant current through the sense resistor of the circuit used in Differential_Readings using closed loop control of A0
+    """
+
+    FUNC_NAME = ".Constant_Current()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        # this assumes that you are reading the voltage across a resistor and diode in series
+        # A2 set to Vin, A3 between the resistor and the diode, A4 at GND
+        Rval = 10.0 / 1000.0 # sense resistance in kOhm
+        Iset = 20.0 # desired current in mA
+
+        # the sense voltage A2 - A3 is held at Iset * Rval
+        summary = the_dev.PIDControl('A0', Iset*Rval, 'A2', 'A3', kp = 0.5, ki = 10.0, duration = 5.0)
+
+        print("Sense Current: %(v1)0.1f (mA)"%{"v1":summary["reading"][-1]/Rval})
+        print("Output Voltage: %(v1)0.3f (V)"%{"v1":summary["output"][-1]})
+        print("Loop rate: %(v1)0.1f Hz, latency p50 / p99: %(v2)0.2f / %(v3)0.2f ms, jitter: %(v4)0.2f ms"%{"v1":summary["rate_hz"],
+              "v2":1000.0*summary["latency_s"]["p50"], "v3":1000.0*summary["latency_s"]["p99"], "v4":1000.0*summary["jitter_s"]})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Long_Acquisition():
+    """
+    Take one million readings at A2 in a single call, the IBM4 accepts fewer than 10000 readings per command
+    so ReadLong splits the acquisition into chunks and pipelines them
+    """
+
+    FUNC_NAME = ".Long_Acquisition()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        the_dev.WriteVoltage('A0', 1.5) # A0 is connected to A2
+
+        no_reads = 1000000
+        start = time.perf_counter()
+        res = the_dev.ReadLong('A2', no_reads, chunk_size = IBM4_Lib.CHUNK_READS)
+        elapsed = time.perf_counter() - start
+
+        print('%(v1)d readings in %(v2)0.1f s'%{"v1":no_reads, "v2":elapsed})
+        print('Mean: %(v1)0.4f V, half-range: %(v2)0.4f V, std: %(v3)0.4f V'%{"v1":res[0], "v2":res[1], "v3":res[3]})
+        print('Readings lost to timed out chunks: %(v1)d'%{"v1":numpy.count_nonzero(numpy.isnan(res[2]))})
+
+        # the averaging methods also accept 10000 or more readings, the chunk averages are weighted by their no. of readings
+        print('Average of 50000 readings: %(v1)0.4f V'%{"v1":the_dev.ReadAverageVoltage('A2', 50000)})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Timed_Readings():
+    """
+    Estimate when each reading at A2 was taken from the host times of the chunks of readings,
+    then resample the readings onto a uniform time grid so that they can be passed to an FFT
+    """
+
+    FUNC_NAME = ".Timed_Readings()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        # instantiate an object that interfaces with the IBM4
+        the_dev = IBM4_Lib.Ser_Iface() # find the first connected IBM4, open in DC mode by default
+
+        the_dev.WriteVoltage('A0', 1.5) # A0 is connected to A2
+
+        # small chunks give a finer picture of how the sample rate varies during the read
+        res = the_dev.ReadLong('A2', 20000, chunk_size = 500)
+        timing = res[4]
+        sample_time = timing.SampleTime()
+        print('Effective sample rate: %(v1)0.1f Hz'%{"v1":timing.Rate()})
+        print('Time per reading over the chunks, min / max: %(v1)0.2f / %(v2)0.2f us'%{"v1":1.0e6*numpy.nanmin(sample_time), "v2":1.0e6*numpy.nanmax(sample_time)})
+
+        # the readings interpolated onto a grid of times at the effective sample rate
+        t, vals = timing.Resample(res[2])
+        spectrum = numpy.abs( numpy.fft.rfft(vals - numpy.mean(vals)) )
+        freqs = numpy.fft.rfftfreq(vals.size, t[1] - t[0])
+        print('Largest noise component at %(v1)0.1f Hz'%{"v1":freqs[numpy.argmax(spectrum)]})
+
+        # a stream records the host time of each chunk in the same way
+        with the_dev.Stream('A2', chunk_size = 500) as stream:
+            vals, timing = stream.Collect(20)
+        print('Stream: %(v1)d readings at %(v2)0.1f Hz'%{"v1":vals.size, "v2":timing.Rate()})
+
+        del the_dev # destructor for the IBM4 object, closes comms
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
@@ -0,0 +1,698 @@
+"""
+asyncio version of the IBM4 Serial Interface
+
+Every method of IBM4_Lib.Ser_Iface blocks on instr_obj.write and read_until, so a host driving several boards
+needs a thread per board. The AsyncSer_Iface methods are coroutines, the serial port is opened in non-blocking mode
+and the event loop is only woken when bytes arrive, so a single event loop can keep many boards busy at once, e.g.
+
+async def main():
+    async with AsyncSer_Iface('COM3') as dev1, AsyncSer_Iface('COM4') as dev2:
+        v1, v2 = await asyncio.gather(dev1.ReadAverageVoltage('A2', 100), dev2.ReadAverageVoltage('A2', 100))
+
+asyncio.run(main())
+
+The channel dictionaries and command strings are those defined in IBM4_Lib.
+Any port understood by serial.serial_for_url can be used, e.g. a pty created by an emulator or 'loop://'
+"""
+
+# asyncio documentation
+# https://docs.python.org/3/library/asyncio.html
+# https://docs.python.org/3/library/asyncio-eventloop.html#watching-file-descriptors
+# pyserial URL handlers
+# https://pyserial.readthedocs.io/en/latest/url_handlers.html
+
+import time
+import asyncio
+import serial
+import numpy
+import IBM4_Lib
+import IBM4_Decode
+import IBM4_Framing
+import Sweep_Interval
+
+MOD_NAME_STR = "IBM4_Async"
+
+class AsyncSer_Iface(object):
+    """
+    class for interfacing to an IBM4 from an asyncio event loop
+    """
+
+    # Exception handling messages are held in local variables rather than in self.FUNC_NAME, self.ERR_STATEMENT
+    # since several coroutines may be running methods on the same object at the same time
+
+    def __init__(self, port_name, read_mode = 'DC', baud_rate = IBM4_Lib.DEFAULT_BAUD):
+        """
+        Constructor for the asyncio IBM4 Serial Interface
+        No comms are performed here, the link is opened by awaiting OpenComms or by using the object in an async with statement
+
+        port_name is the name of the COM port, or the pyserial URL, to which the IBM4 is attached
+        read_mode is the reading mode of the IBM4, see IBM4_Lib.Ser_Iface
+        baud_rate is the baud rate used to open the link, see IBM4_Lib.Ser_Iface.NegotiateBaud
+        """
+
+        self.MOD_NAME_STR = MOD_NAME_STR
+
+        # Dictionaries for the Read, Write, PWM Channels, Read Modes and Read Types
+        self.Read_Chnnls = IBM4_Lib.READ_CHNNLS
+        self.Write_Chnnls = IBM4_Lib.WRITE_CHNNLS
+        self.PWM_Chnnls = IBM4_Lib.PWM_CHNNLS
+        self.Read_Modes = IBM4_Lib.READ_MODES
+        self.Read_Types = IBM4_Lib.READ_TYPES
+
+        # Voltage Bounding Values
+        self.VMAX = IBM4_Lib.VMAX
+        self.VMIN = IBM4_Lib.VMIN
+        self.DELTA_VMIN = IBM4_Lib.DELTA_VMIN
+
+        # parameters to be passed to the serial open command
+        self.baud_rate = baud_rate # serial comms baud_rate
+        self.read_timeout = 3 # timeout for reading data from the IBM4, units of second
+        self.poll_interval = 0.002 # used to wait for data on ports that cannot be watched by the event loop, e.g. loop://, units of second
+        self.IBM4Port = port_name
+        self.read_mode = read_mode
+        self.instr_obj = None
+
+        self.framer = IBM4_Framing.ReplyFramer() # matches received bytes to the commands that were sent
+        self.lock = None # asyncio.Lock, created inside the event loop by OpenComms
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "class for interfacing to an IBM4 from an asyncio event loop"
+
+    async def __aenter__(self):
+        await self.OpenComms(self.read_mode)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.CloseComms()
+
+    def CommsStatus(self):
+        """
+        investigate the status of the serial comms link
+        """
+
+        return self.instr_obj is not None and self.instr_obj.is_open
+
+    async def OpenComms(self, read_mode = 'DC'):
+        """
+        open a non-blocking serial link to the port attached to an IBM4
+        """
+
+        FUNC_NAME = ".OpenComms()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            if self.IBM4Port is not None:
+                # timeout = 0 and write_timeout = 0 => reads and writes return immediately
+                # the pyserial URL handlers, e.g. loop://, treat write_timeout = 0 as an immediate timeout, their writes never block anyway
+                write_timeout = None if '://' in self.IBM4Port else 0
+                self.instr_obj = serial.serial_for_url(self.IBM4Port, self.baud_rate, timeout = 0, write_timeout = write_timeout, stopbits = serial.STOPBITS_ONE)
+                self.lock = asyncio.Lock()
+                self.framer = IBM4_Framing.ReplyFramer()
+                await self.SetMode(read_mode)
+                await self.ZeroIBM4()
+            else:
+                ERR_STATEMENT = ERR_STATEMENT + '\nNo IBM4 attached to PC'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def CloseComms(self):
+        """
+        zero the outputs of the IBM4 and close the serial link
+        """
+
+        if self.CommsStatus():
+            await self.ZeroIBM4()
+            self.instr_obj.close()
+
+    # low level comms
+
+    async def _Send(self, write_cmd):
+        """
+        write the str write_cmd to the IBM4 without blocking the event loop
+        """
+
+        view = memoryview( str.encode(write_cmd) )
+        while len(view) > 0:
+            n = self.instr_obj.write(view)
+            view = view[n if n is not None else len(view):]
+            if len(view) > 0:
+                await asyncio.sleep(self.poll_interval) # output buffer is full, let the other tasks run
+
+    async def _Receive(self):
+        """
+        wait until bytes are received from the IBM4 and return them
+        """
+
+        if self.instr_obj.in_waiting == 0:
+            loop = asyncio.get_running_loop()
+            try:
+                fd = self.instr_obj.fileno()
+                ready = loop.create_future()
+                loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+                try:
+                    await ready
+                finally:
+                    loop.remove_reader(fd)
+            except (AttributeError, NotImplementedError, serial.SerialException, ValueError):
+                # port has no file descriptor, e.g. loop://, or the event loop cannot watch it, e.g. Windows
+                await asyncio.sleep(self.poll_interval)
+        return self.instr_obj.read(self.instr_obj.in_waiting)
+
+    async def _Transact(self, write_cmd, no_vals = 0, no_lines = 0, wait = True):
+        """
+        send write_cmd to the IBM4 and, if wait, wait for its reply to be complete
+
+        Returns the IBM4_Framing.Request that holds the reply
+        """
+
+        async with self.lock:
+            req = self.framer.Expect(str.encode(write_cmd), no_vals, no_lines)
+            await self._Send(write_cmd)
+            if wait:
+                try:
+                    await asyncio.wait_for(self._AwaitReply(req), self.read_timeout)
+                except asyncio.TimeoutError:
+                    self.framer.Discard(req)
+                    raise
+            return req
+
+    async def _AwaitReply(self, req):
+        """
+        feed received bytes to the framer until the reply to req is complete
+        """
+
+        while not req.complete:
+            self.framer.Feed( await self._Receive() )
+
+    # methods for writing data to the IBM4
+
+    async def SetMode(self, read_mode = 'DC'):
+        """
+        read_mode is the reading mode of the IBM4, see IBM4_Lib.Ser_Iface.SetMode
+        """
+
+        FUNC_NAME = ".SetMode()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c3 = True if read_mode in self.Read_Modes else False # confirm that read_mode choice is a valid one
+            if c1 and c3:
+                await self._Transact(IBM4_Lib.MODE_CMD%{"v1":self.Read_Modes[read_mode]}, wait = False)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nInvalid read mode specified'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def ZeroIBM4(self):
+        """
+        zero the analog and PWM outputs of the IBM4
+        """
+
+        FUNC_NAME = ".ZeroIBM4()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            if self.CommsStatus():
+                for zero_cmd in IBM4_Lib.ZERO_CMDS:
+                    await self._Transact(zero_cmd, wait = False)
+                for k, v in self.PWM_Chnnls.items():
+                    await self._Transact(IBM4_Lib.PWM_CMD%{"v1":v, "v2":0}, wait = False)
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def IdentifyIBM4(self):
+        """
+        Extract the IBM4 identity string and version number
+        """
+
+        FUNC_NAME = ".IdentifyIBM4()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            if self.CommsStatus():
+                req = await self._Transact(IBM4_Lib.IDN_CMD, no_lines = 1)
+                line = bytes(req.body).strip()
+                return line if b'ISBY' in line else None
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def WriteVoltage(self, output_channel, set_voltage = 0.0):
+        """
+        Output set_voltage on one of the analog output pins of the IBM4, see IBM4_Lib.Ser_Iface.WriteVoltage
+
+        output_channel is one of A0, A1
+        set_voltage must be in the range [0.0, 3.3)
+        """
+
+        FUNC_NAME = ".WriteVoltage()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c2 = True if output_channel in self.Write_Chnnls else False # confirm that the output channel label is correct
+            c3 = True if set_voltage >= self.VMIN and set_voltage < self.VMAX else False # confirm that the set voltage value is in range
+            if c1 and c2 and c3:
+                await self._Transact(IBM4_Lib.WRITE_CMD%{"v1":self.Write_Chnnls[output_channel], "v2":set_voltage}, wait = False)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\noutput_channel outside range {A0, A1}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nset_voltage outside range [0.0, 3.3)'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def WritePWM(self, percentage):
+        """
+        Set the PWM output signal on D9, percentage must be in the range [0.0, 100]
+        """
+
+        FUNC_NAME = ".WritePWM()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c3 = True if percentage >= 0 and percentage < 101 else False # confirm that PWM percentage is a sensible value
+            if c1 and c3:
+                await self._Transact(IBM4_Lib.PWM_CMD%{"v1":self.PWM_Chnnls["D9"], "v2":percentage}, wait = False)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\npercentage outside range [0, 100]'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    # methods for obtaining data from the IBM4
+
+    async def ReadVoltage(self, input_channel, read_type = 'Single Voltage', no_reads = 10):
+        """
+        Method for accessing the various types of Voltage Readings that are available, see IBM4_Lib.Ser_Iface.ReadVoltage
+        """
+
+        FUNC_NAME = ".ReadVoltage()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c2 = True if input_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
+            c3 = True if read_type in ('Single Voltage', 'Single Binary') or no_reads > 2 else False # confirm that no. averages being taken is a sensible value
+            c4 = True if read_type in self.Read_Types else False # confirm that the read_type has been chosen correctly
+
+            if c1 and c2 and c3 and c4:
+                if read_type == 'Multiple Voltage':
+                    return await self.ReadMultipleVoltage(input_channel, no_reads)
+                elif read_type == 'Average Voltage':
+                    return await self.ReadAverageVoltage(input_channel, no_reads)
+                elif read_type == 'Single Binary':
+                    return await self.ReadSingleBinary(input_channel)
+                elif read_type == 'Multiple Binary':
+                    return await self.ReadMultipleBinary(input_channel, no_reads)
+                else:
+                    return await self.ReadSingleVoltage(input_channel)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads must be at least 3'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nread_type incorrectly specified'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def DifferentialRead(self, pos_channel, neg_channel, read_type = 'Single Voltage', no_reads = 10):
+        """
+        Method for accessing the various types of Differential Voltage Readings that are available, see IBM4_Lib.Ser_Iface.DifferentialRead
+        """
+
+        FUNC_NAME = ".DifferentialRead()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c2 = True if pos_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
+            c3 = True if neg_channel in self.Read_Chnnls else False # confirm that the negative channel label is correct
+            c4 = True if neg_channel != pos_channel else False # confirm that the channels are not the same
+            c5 = True if read_type in ('Single Voltage', 'Single Binary') or no_reads > 2 else False # confirm that no. averages being taken is a sensible value
+            c6 = True if read_type in self.Read_Types else False # confirm that the read_type has been chosen correctly
+
+            if c1 and c2 and c3 and c4 and c5 and c6:
+                if read_type == 'Multiple Voltage':
+                    return await self.DiffReadMultiple(pos_channel, neg_channel, no_reads)
+                elif read_type == 'Average Voltage':
+                    return await self.DiffReadAverage(pos_channel, neg_channel, no_reads)
+                elif read_type == 'Single Binary':
+                    return await self.DiffReadSingleBinary(pos_channel, neg_channel)
+                elif read_type == 'Multiple Binary':
+                    return await self.DiffReadMultipleBinary(pos_channel, neg_channel, no_reads)
+                else:
+                    return await self.DiffReadSingle(pos_channel, neg_channel)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\npos_channel outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nneg_channel outside range {A2, A3, A4, A5, D2}'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\npos_channel cannot be the same as neg_channel'
+                if not c5:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads must be at least 3'
+                if not c6:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nread_type incorrectly specified'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def _Read(self, FUNC_NAME, read_cmd, channels_ok, no_reads, no_vals, binary, loud, single = False):
+        """
+        Perform a read, common to all the single ended and differential read methods
+
+        read_cmd is the command to be sent, None if the channels were not valid
+        no_reads is the no. readings requested from the IBM4, no_vals is the no. values it will return
+        single = True => a single reading, no_reads = 1, otherwise a multiple or average reading, no_reads in the range [3, 10000)
+
+        Returns the values as a numpy array, of ints if binary, or for a reply of one value the list returned by IBM4_Framing.Reply_Values
+        """
+
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c3 = True if (single and no_reads == 1) or (not single and no_reads > 2 and no_reads < 10000) else False # confirm that no. averages being taken is a sensible value
+            if c1 and channels_ok and c3:
+                req = await self._Transact(read_cmd, no_vals = no_vals)
+                if no_vals == 1:
+                    vals = IBM4_Framing.Reply_Values(req.body) # a single reading or an average, see IBM4_Framing.Reply_Values
+                else:
+                    vals = IBM4_Decode.Decode_Ints(req.body, no_vals) if binary else IBM4_Decode.Decode_Floats(req.body, no_vals)
+                if loud:
+                    print(bytes(req.body))
+                    print(vals)
+                return vals
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not channels_ok:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\ninput channels incorrectly specified'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def _SingleCmd(self, fmt, input_channel, no_reads):
+        """
+        build a single ended read command, returns None along with False if input_channel is not valid
+        """
+
+        if input_channel in self.Read_Chnnls:
+            return fmt%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads}, True
+        return None, False
+
+    def _DiffCmd(self, fmt, pos_channel, neg_channel, no_reads):
+        """
+        build a differential read command, returns None along with False if the channels are not valid
+        """
+
+        if pos_channel in self.Read_Chnnls and neg_channel in self.Read_Chnnls and pos_channel != neg_channel:
+            return fmt%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}, True
+        return None, False
+
+    @staticmethod
+    def _Summary(vals):
+        """
+        [average, half-range, values] as returned by the multiple read methods
+        """
+
+        if vals is None or len(vals) == 0:
+            return None
+        return [numpy.mean(vals), 0.5*( numpy.max(vals) - numpy.min(vals) ), vals]
+
+    # single ended voltage reading methods
+
+    async def ReadSingleVoltage(self, input_channel, loud = False):
+        """
+        Single voltage reading at input_channel
+        """
+
+        read_cmd, ok = self._SingleCmd(IBM4_Lib.READ_CMD, input_channel, 1)
+        vals = await self._Read(".ReadSingleVoltage()", read_cmd, ok, 1, 1, False, loud, single = True)
+        return float(vals[-1]) if vals is not None and len(vals) > 0 else None
+
+    async def ReadSingleBinary(self, input_channel, loud = False):
+        """
+        Single binary reading at input_channel
+        """
+
+        read_cmd, ok = self._SingleCmd(IBM4_Lib.BREAD_CMD, input_channel, 1)
+        vals = await self._Read(".ReadSingleBinary()", read_cmd, ok, 1, 1, True, loud, single = True)
+        return int(vals[-1]) if vals is not None and len(vals) > 0 else None
+
+    async def ReadAverageVoltage(self, input_channel, no_reads = 10, loud = False):
+        """
+        Average of no_reads voltage readings at input_channel, averaged by the IBM4
+        """
+
+        read_cmd, ok = self._SingleCmd(IBM4_Lib.AVERAGE_CMD, input_channel, no_reads)
+        vals = await self._Read(".ReadAverageVoltage()", read_cmd, ok, no_reads, 1, False, loud)
+        return float(vals[-1]) if vals is not None and len(vals) > 0 else None
+
+    async def ReadAverageVoltageAllChnnl(self, no_reads = 10, loud = False):
+        """
+        Averaged voltage reading at each analog input channel [A2, A3, A4, A5, D2], failed reads are stored as nan
+        Returns None if the read cannot be made
+        """
+
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + ".ReadAverageVoltageAllChnnl()"
+
+        try:
+            c1 = self.CommsStatus() # confirm that the instrument object has been instantiated
+            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            if c1 and c3:
+                read_vals = numpy.full(len(self.Read_Chnnls), numpy.nan) # failed reads are stored as nan
+                # the five Average commands are sent in one write and the replies collected afterwards, as in IBM4_Lib
+                read_cmds = [self._SingleCmd(IBM4_Lib.AVERAGE_CMD, item, no_reads)[0] for item in self.Read_Chnnls]
+                async with self.lock:
+                    reqs = [self.framer.Expect(str.encode(read_cmd), 1) for read_cmd in read_cmds]
+                    await self._Send( ''.join(read_cmds) )
+                    try:
+                        await asyncio.wait_for(self._AwaitReply(reqs[-1]), self.read_timeout) # replies arrive in order
+                    except asyncio.TimeoutError:
+                        for req in reqs:
+                            self.framer.Discard(req)
+                for i, req in enumerate(reqs):
+                    if req.complete:
+                        read_vals[i] = float( IBM4_Framing.Reply_Values(req.body)[-1] )
+                if loud:
+                    print('Voltages at AI: ',read_vals)
+                return read_vals
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def ScanAllChnnl(self, no_reads = 10, loud = False):
+        """
+        Averaged voltage reading at each analog input channel in a single transaction, see IBM4_Lib.Ser_Iface.ScanAllChnnl
+        """
+
+        read_vals = await self.ReadAverageVoltageAllChnnl(no_reads, loud)
+        if read_vals is None:
+            return None
+        scan = numpy.full(1, numpy.nan, dtype = IBM4_Lib.SCAN_DTYPE)
+        scan["t"] = time.time()
+        for i, chnnl in enumerate(self.Read_Chnnls):
+            scan[chnnl] = read_vals[i]
+        return scan
+
+    async def ReadMultipleVoltage(self, input_channel, no_reads = 10, loud = False):
+        """
+        no_reads voltage readings at input_channel
+
+        Returns [average, half-range, numpy array of all voltage readings]
+        """
+
+        read_cmd, ok = self._SingleCmd(IBM4_Lib.READ_CMD, input_channel, no_reads)
+        return self._Summary( await self._Read(".ReadMultipleVoltage()", read_cmd, ok, no_reads, no_reads, False, loud) )
+
+    async def ReadMultipleBinary(self, input_channel, no_reads = 10, loud = False):
+        """
+        no_reads binary readings at input_channel, returned as a numpy array of ints
+        """
+
+        read_cmd, ok = self._SingleCmd(IBM4_Lib.BREAD_CMD, input_channel, no_reads)
+        return await self._Read(".ReadMultipleBinary()", read_cmd, ok, no_reads, no_reads, True, loud)
+
+    # differential voltage reading methods
+
+    async def DiffReadSingle(self, pos_channel, neg_channel, loud = False):
+        """
+        Single differential voltage reading pos_channel - neg_channel
+        """
+
+        read_cmd, ok = self._DiffCmd(IBM4_Lib.DIFF_READ_CMD, pos_channel, neg_channel, 1)
+        vals = await self._Read(".DiffReadSingle()", read_cmd, ok, 1, 1, False, loud, single = True)
+        return float(vals[-1]) if vals is not None and len(vals) > 0 else None
+
+    async def DiffReadAverage(self, pos_channel, neg_channel, no_reads = 10, loud = False):
+        """
+        Average of no_reads differential voltage readings pos_channel - neg_channel, averaged by the IBM4
+        """
+
+        read_cmd, ok = self._DiffCmd(IBM4_Lib.DIFF_AVERAGE_CMD, pos_channel, neg_channel, no_reads)
+        vals = await self._Read(".DiffReadAverage()", read_cmd, ok, no_reads, 1, False, loud)
+        return float(vals[-1]) if vals is not None and len(vals) > 0 else None
+
+    async def DiffReadMultiple(self, pos_channel, neg_channel, no_reads = 10, loud = False):
+        """
+        no_reads differential voltage readings pos_channel - neg_channel
+
+        Returns [average, half-range, numpy array of all differential readings]
+        """
+
+        read_cmd, ok = self._DiffCmd(IBM4_Lib.DIFF_READ_CMD, pos_channel, neg_channel, no_reads)
+        return self._Summary( await self._Read(".DiffReadMultiple()", read_cmd, ok, no_reads, no_reads, False, loud) )
+
+    async def DiffReadSingleBinary(self, pos_channel, neg_channel, loud = False):
+        """
+        Single differential binary reading pos_channel - neg_channel
+        """
+
+        read_cmd, ok = self._DiffCmd(IBM4_Lib.DIFF_BREAD_CMD, pos_channel, neg_channel, 1)
+        vals = await self._Read(".DiffReadSingleBinary()", read_cmd, ok, 1, 1, True, loud, single = True)
+        return int(vals[-1]) if vals is not None and len(vals) > 0 else None
+
+    async def DiffReadMultipleBinary(self, pos_channel, neg_channel, no_reads = 10, loud = False):
+        """
+        no_reads differential binary readings pos_channel - neg_channel, returned as a numpy array of ints
+        """
+
+        read_cmd, ok = self._DiffCmd(IBM4_Lib.DIFF_BREAD_CMD, pos_channel, neg_channel, no_reads)
+        return await self._Read(".DiffReadMultipleBinary()", read_cmd, ok, no_reads, no_reads, True, loud)
+
+    # methods for initiating voltage sweeps
+
+    async def SingleChannelSweepA(self, swp_channel, v_strt, v_end, no_steps, v_fixed = 0.0, no_averages = 10):
+        """
+        Linear sweep of swp_channel from v_strt to v_end in no_steps, see IBM4_Lib.Ser_Iface.SingleChannelSweepA
+        """
+
+        FUNC_NAME = ".SingleChannelSweepA()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the intstrument object has been instantiated
+            c2 = True if swp_channel in self.Write_Chnnls else False # confirm that the output channel label is correct
+            c3 = True if v_strt >= self.VMIN and v_strt < v_end else False # confirm that the voltage sweep bounds are in range
+            c4 = True if v_end > v_strt and v_end <= self.VMAX else False # confirm that the voltage sweep bounds are in range
+            c5 = True if (v_end - v_strt) > self.DELTA_VMIN else False # confirm that the voltage sweep bounds are in range
+            c6 = True if no_steps > 2 else False # confirm that the no. of steps is appropriate
+            c7 = True if no_averages > 3 and no_averages < 103 else False # confirm that no. averages being taken is a sensible value
+            c8 = True if v_fixed >= self.VMIN and v_fixed <= self.VMAX else False # confirm that the fixed voltage is in range
+
+            if c1 and c2 and c3 and c4 and c5 and c6 and c7 and c8:
+                delta_v = max( (v_end - v_strt) / float(no_steps - 1), self.DELTA_VMIN) # Determine the sweep voltage increment, this is bounded below by delta_v_min
+                return await self._Sweep(swp_channel, Sweep_Interval.Set_Points(v_strt, v_end, delta_v), v_fixed, no_averages)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\noutput_channel outside range {A0, A1}'
+                if not c3 or not c4 or not c5:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nvoltage sweep bounds not appropriate for range [0.0, 3.3)'
+                if not c6:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nn_steps not defined correctly'
+                if not c7:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nn_averages not defined correctly'
+                if not c8:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nv_fixed not in the correct range'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    async def _Sweep(self, swp_channel, set_points, v_fixed, no_averages):
+        """
+        Sweep engine shared by SingleChannelSweepA and SingleChannelSweepB, see IBM4_Lib.Ser_Iface._Sweep
+        swp_channel is set to each of the voltages in set_points in turn while the other analog output is held at v_fixed
+        """
+
+        fixed_channel = 'A1' if swp_channel == 'A0' else 'A0'
+        await self.WriteVoltage(fixed_channel, v_fixed)
+        DELAY = 0.25 # timed delay value in units of seconds
+        voltage_data = numpy.full( (len(set_points), 1 + len(self.Read_Chnnls)), numpy.nan ) # sized up front, see IBM4_Lib.Ser_Iface._Sweep
+        voltage_data[:, 0] = set_points
+        for i in range(0, len(set_points), 1):
+            await self.WriteVoltage(swp_channel, set_points[i])
+            await asyncio.sleep(DELAY)
+            voltage_data[i, 1:] = await self.ReadAverageVoltageAllChnnl(no_averages)
+        await self.ZeroIBM4()
+        return voltage_data
+
+    async def SingleChannelSweepB(self, swp_channel, voltage_interval:Sweep_Interval.SweepSpace, v_fixed = 0.0, no_averages = 10):
+        """
+        Linear sweep of swp_channel over voltage_interval, see IBM4_Lib.Ser_Iface.SingleChannelSweepB
+        The settling delay after each step is awaited, so other boards and tasks keep running during the sweep
+
+        Output is a numpy array of shape (no. set-points, 6), each row of the form
+        [v_set, A2, A3, A4, A5, D2]
+        """
+
+        FUNC_NAME = ".SingleChannelSweepB()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = self.CommsStatus() # confirm that the intstrument object has been instantiated
+            c2 = True if swp_channel in self.Write_Chnnls else False # confirm that the output channel label is correct
+            c3 = voltage_interval.defined # check that the parameters in the interval have been defined correctly
+            c7 = True if no_averages > 3 and no_averages < 103 else False # confirm that no. averages being taken is a sensible value
+            c8 = True if v_fixed >= self.VMIN and v_fixed < self.VMAX else False # confirm that the fixed voltage is in range
+
+            if c1 and c2 and c3 and c7 and c8:
+                return await self._Sweep(swp_channel, voltage_interval.SetPoints(), v_fixed, no_averages)
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\noutput_channel outside range {A0, A1}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nvoltage sweep bounds not defined'
+                if not c7:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nn_averages not defined correctly'
+                if not c8:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nv_fixed not in the correct range'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
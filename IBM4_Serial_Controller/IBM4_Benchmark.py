@@ -0,0 +1,661 @@
+"""
+Methods for benchmarking the host side of the IBM4 Serial Controller Class
+
+0. Reply parsing, regex vs vectorised byte decoder
+1. Reply framing, read_until / ResetBuffer vs IBM4_Framing, on a replayed byte stream with stale data interleaved
+2. Sweep result assembly, numpy.append / numpy.vstack vs a preallocated array
+3. IBM4 throughput, samples/s and per-call latency of every read type, differential reads, all-channel reads and sweeps
+4. Per-call host overhead of the Ser_Iface read / write methods vs the pre-encoded IBM4_Fast path, against a port that answers at once
+
+Benchmarks 0 - 2 and 4 need no IBM4, benchmark 3 runs against an IBM4 or an IBM4_Emulator.
+All of them can be run from the command line and the results saved as JSON so that runs can be compared over time, e.g.
+
+python IBM4_Benchmark.py --emulate --output run1.json
+python IBM4_Benchmark.py --port COM3 --output run2.json --compare run1.json
+"""
+
+import re
+import sys
+import json
+import time
+import platform
+import threading
+import collections
+import numpy
+import Sweep_Interval
+import IBM4_Lib
+import IBM4_Decode
+import IBM4_Framing
+import IBM4_Stats
+import IBM4_Emulator
+import IBM4_Fast
+
+MOD_NAME_STR = "IBM4_Benchmark"
+
+def Make_Reply(read_cmd, vals, fmt = b'%0.4f'):
+    """
+    Assemble a reply of the form returned by the IBM4 for a multi-read command
+    The IBM4 echoes the command line before writing each value on its own line
+
+    read_cmd (type: bytes) is the command that was sent, e.g. b'Read1:5000'
+    vals (type: numpy array) are the values to be included in the reply
+    fmt (type: bytes) is the format used to write each value
+    """
+
+    line_fmt = fmt + b'\r\n'
+    return read_cmd + b'\r\n' + b''.join([line_fmt%(v) for v in vals])
+
+def Regex_Floats(read_result, no_reads):
+    """
+    The original parsing path of the IBM4_Lib multi-read methods
+    """
+
+    vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) )
+    return numpy.asarray(vals_str[-no_reads:], dtype = numpy.float64)
+
+def Regex_Ints(read_result, no_reads):
+    """
+    The original parsing path of the IBM4_Lib multi-read binary methods
+    """
+
+    vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) )
+    return numpy.asarray(vals_str[-no_reads:], dtype = numpy.int64)
+
+def Time_Call(func, args, no_repeats):
+    """
+    Return the best time in seconds, over no_repeats calls, of func(*args)
+    """
+
+    best = float('inf')
+    for i in range(0, no_repeats, 1):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def Parse_Benchmark(read_counts = (10, 100, 1000, 5000, 10000), no_repeats = 20, reply_files = None):
+    """
+    Compare the time taken by the regex parsing path and by IBM4_Decode for multi-read replies
+
+    read_counts is a list of no_reads values for which replies are generated
+    no_repeats is the number of times each parse is timed, the best time is reported
+    reply_files is an optional list of files containing replies recorded from an IBM4
+    each file is parsed in its entirety and the decoded values are compared against the regex values
+    """
+
+    FUNC_NAME = ".Parse_Benchmark()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        rng = numpy.random.default_rng(11062024) # fixed seed so that runs can be compared
+
+        replies = []
+        for no_reads in read_counts:
+            vals = rng.uniform(0.0, 3.3, no_reads)
+            replies.append( ('Read (float)', no_reads, Make_Reply(b'Read1:%d'%(no_reads), vals), Regex_Floats, IBM4_Decode.Decode_Floats) )
+            vals = rng.integers(0, 65536, no_reads)
+            replies.append( ('BRead (int)', no_reads, Make_Reply(b'BRead1:%d'%(no_reads), vals, b'%d'), Regex_Ints, IBM4_Decode.Decode_Ints) )
+
+        if reply_files is not None:
+            for name in reply_files:
+                with open(name, 'rb') as the_file:
+                    read_result = the_file.read()
+                no_reads = IBM4_Decode.Count_Values(read_result)
+                replies.append( (name, no_reads, read_result, Regex_Floats, IBM4_Decode.Decode_Floats) )
+
+        print("Reply Parsing: regex on str(bytes) vs vectorised byte decoder")
+        print("%(v1)-14s %(v2)8s %(v3)12s %(v4)12s %(v5)8s %(v6)6s"%{"v1":"Reply", "v2":"no_reads", "v3":"regex (ms)", "v4":"decode (ms)", "v5":"speedup", "v6":"match"})
+        results = []
+        for label, no_reads, read_result, old_parse, new_parse in replies:
+            match = numpy.array_equal(old_parse(read_result, no_reads), new_parse(read_result, no_reads))
+            t_old = Time_Call(old_parse, (read_result, no_reads), no_repeats)
+            t_new = Time_Call(new_parse, (read_result, no_reads), no_repeats)
+            results.append( {"reply":label, "no_reads":no_reads, "regex_s":t_old, "decode_s":t_new, "match":match} )
+            print("%(v1)-14s %(v2)8d %(v3)12.3f %(v4)12.3f %(v5)8.1f %(v6)6s"%{"v1":label, "v2":no_reads, "v3":1000.0*t_old, "v4":1000.0*t_new, "v5":t_old/t_new, "v6":match})
+        return results
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+class Replay_Port(object):
+    """
+    Stand-in for serial.Serial that replays a recorded IBM4 byte stream against a virtual clock
+
+    stream is a list with the bytes sent by the IBM4 in reply to each command line written, in order
+    the replies may contain stale lines ahead of the echo and unsolicited lines after the reply
+    Each reply starts arriving latency seconds after its command is written, or once the previous reply has arrived,
+    and then arrives line by line at byte_time seconds per byte.
+    A read that finds nothing to return advances the clock to the next arrival, or by timeout if nothing arrives in time,
+    so the clock measures the time the host spends waiting on the link, independent of the speed of the host
+    """
+
+    def __init__(self, stream, timeout = 3.0, latency = 0.002, byte_time = 5.0e-6):
+        self.stream = stream
+        self.timeout = timeout
+        self.latency = latency
+        self.byte_time = byte_time
+        self.now = 0.0 # the virtual clock, units of second
+        self.no_writes = 0 # no. command lines written
+        self.arrivals = collections.deque() # [time, line] pairs that have not yet arrived
+        self.rx = bytearray() # bytes that have arrived and have not been read
+
+    def isOpen(self):
+        return True
+
+    def write(self, data):
+        t = max(self.now + self.latency, self.arrivals[-1][0] if len(self.arrivals) > 0 else 0.0)
+        for i in range(0, data.count(b'\n'), 1):
+            reply = self.stream[self.no_writes] if self.no_writes < len(self.stream) else b''
+            self.no_writes = self.no_writes + 1
+            for line in reply.splitlines(keepends = True):
+                t = t + len(line)*self.byte_time
+                self.arrivals.append( [t, line] )
+        return len(data)
+
+    def _Arrive(self):
+        while len(self.arrivals) > 0 and self.arrivals[0][0] <= self.now:
+            self.rx.extend( self.arrivals.popleft()[1] )
+
+    def _Wait(self, deadline):
+        """
+        advance the clock to the next arrival, returns False if nothing arrives before deadline
+        """
+
+        if len(self.arrivals) > 0 and self.arrivals[0][0] <= deadline:
+            self.now = self.arrivals[0][0]
+            self._Arrive()
+            return True
+        self.now = deadline
+        return False
+
+    @property
+    def in_waiting(self):
+        self._Arrive()
+        return len(self.rx)
+
+    def read(self, size = 1):
+        self._Arrive()
+        if len(self.rx) == 0 and not self._Wait(self.now + self.timeout):
+            return b''
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def read_until(self, expected = b'\n', size = None):
+        # like pyserial the tail of the line is compared with expected, a str never matches a bytes line so the read lasts until timeout
+        deadline = self.now + self.timeout
+        line = bytearray()
+        while True:
+            self._Arrive()
+            idx = self.rx.find(expected) if isinstance(expected, bytes) else -1
+            if idx > -1:
+                line.extend( self.rx[:idx + len(expected)] )
+                del self.rx[:idx + len(expected)]
+                return bytes(line)
+            line.extend(self.rx)
+            self.rx.clear()
+            if not self._Wait(deadline):
+                return bytes(line)
+
+    def reset_input_buffer(self):
+        self._Arrive()
+        self.rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+class Replay_Iface(object):
+    """
+    The parts of IBM4_Lib.Ser_Iface used by _Transact, so that the library code itself is run against a Replay_Port
+    """
+
+    def __init__(self, port):
+        self.instr_obj = port
+        self.framer = IBM4_Framing.ReplyFramer()
+        self.io_lock = threading.RLock()
+        self.link_stats = IBM4_Stats.LinkStats()
+
+    _Collect = IBM4_Lib.Ser_Iface._Collect
+    _Transact = IBM4_Lib.Ser_Iface._Transact
+    _Write = IBM4_Lib.Ser_Iface._Write
+    _Feed = IBM4_Lib.Ser_Iface._Feed
+
+def Replay_Stream(no_cmds = 200, stale_prob = 0.2, seed = 11062024):
+    """
+    Generate a sequence of IBM4 commands and the byte stream that an IBM4 would return for them
+    A fraction stale_prob of the replies are preceded by stale lines, e.g. the tail of an earlier reply that timed out,
+    and a fraction stale_prob are followed by an unsolicited line
+
+    Returns a list of (write_cmd, no_vals, is_int, expected values, reply bytes)
+    """
+
+    rng = numpy.random.default_rng(seed)
+    cmds = []
+    for i in range(0, no_cmds, 1):
+        kind = rng.integers(0, 5)
+        chnnl = rng.integers(0, 5)
+        if kind == 0:
+            write_cmd = IBM4_Lib.WRITE_CMD%{"v1":rng.integers(0, 2), "v2":rng.uniform(0.0, 3.2)}
+            no_vals, is_int, vals = 0, False, numpy.zeros(0)
+        elif kind == 1:
+            write_cmd = IBM4_Lib.AVERAGE_CMD%{"v1":chnnl, "v2":10}
+            no_vals, is_int, vals = 1, False, rng.uniform(0.0, 3.3, 1)
+        elif kind == 2:
+            write_cmd = IBM4_Lib.READ_CMD%{"v1":chnnl, "v2":1}
+            no_vals, is_int, vals = 1, False, rng.uniform(0.0, 3.3, 1)
+        elif kind == 3:
+            write_cmd = IBM4_Lib.READ_CMD%{"v1":chnnl, "v2":100}
+            no_vals, is_int, vals = 100, False, rng.uniform(0.0, 3.3, 100)
+        else:
+            write_cmd = IBM4_Lib.BREAD_CMD%{"v1":chnnl, "v2":50}
+            no_vals, is_int, vals = 50, True, rng.integers(0, 65536, 50)
+        fmt = b'%d' if is_int else b'%0.4f'
+        vals = numpy.asarray([int(fmt%(v)) if is_int else float(fmt%(v)) for v in vals]) # the values as they appear on the link
+        reply = Make_Reply(str.encode(write_cmd.strip()), vals, fmt)
+        if rng.random() < stale_prob:
+            reply = Make_Reply(b'', rng.uniform(0.0, 3.3, rng.integers(1, 4)))[2:] + reply
+        if rng.random() < stale_prob:
+            reply = reply + b'%0.4f\r\n'%(rng.uniform(0.0, 3.3))
+        cmds.append( (write_cmd, no_vals, is_int, vals, reply) )
+    return cmds
+
+def Unframed_Read(port, write_cmd, no_vals, is_int, terminator = '\n'):
+    """
+    The command path of IBM4_Lib before the framer: write, read_until, keep the last no_vals values, ResetBuffer
+    terminator = '\n' is the original str terminator, which never matches, so every read waits for read_timeout
+    """
+
+    port.write( str.encode(write_cmd) )
+    vals = None
+    if no_vals > 0:
+        read_result = port.read_until(terminator, size = None)
+        try:
+            vals = Regex_Ints(read_result, no_vals) if is_int else Regex_Floats(read_result, no_vals)
+        except ValueError:
+            vals = numpy.zeros(0) # e.g. a stale float in reply to BRead, reported as an exception by the original methods
+    port.reset_input_buffer()
+    port.reset_output_buffer()
+    return vals
+
+def Framed_Read(iface, write_cmd, no_vals, is_int):
+    """
+    The command path of IBM4_Lib through Ser_Iface._Transact and the framer
+    """
+
+    try:
+        req = iface._Transact(write_cmd, no_vals)
+    except TimeoutError:
+        return numpy.zeros(0)
+    if no_vals == 0:
+        return None
+    return IBM4_Decode.Decode_Ints(req.body, no_vals) if is_int else IBM4_Decode.Decode_Floats(req.body, no_vals)
+
+def Framing_Benchmark(no_cmds = 200, stale_prob = 0.2, timeout = 3.0, latency = 0.002, byte_time = 5.0e-6, seed = 11062024):
+    """
+    Run the same replayed byte stream, with stale and unsolicited lines interleaved, through
+    0. the original path, read_until('\n') + regex + ResetBuffer
+    1. the original path with the terminator corrected to b'\n'
+    2. the framed path, Ser_Iface._Transact
+    and report the no. of correct replies, the virtual time spent waiting on the link and the host CPU time
+    """
+
+    FUNC_NAME = ".Framing_Benchmark()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        cmds = Replay_Stream(no_cmds, stale_prob, seed)
+        stream = [cmd[4] for cmd in cmds]
+        no_reads = len([cmd for cmd in cmds if cmd[1] > 0])
+
+        paths = ["read_until('\\n')", "read_until(b'\\n')", "framed"]
+        print("Reply Framing: %(v1)d commands, %(v2)d reads, stale / unsolicited line probability %(v3)0.2f"%{"v1":no_cmds, "v2":no_reads, "v3":stale_prob})
+        print("%(v1)-20s %(v2)10s %(v3)14s %(v4)16s %(v5)12s"%{"v1":"Path", "v2":"correct", "v3":"link time (s)", "v4":"per read (ms)", "v5":"host (ms)"})
+        results = []
+        for i, label in enumerate(paths):
+            port = Replay_Port(stream, timeout, latency, byte_time)
+            iface = Replay_Iface(port)
+            correct = 0
+            start = time.perf_counter()
+            for write_cmd, no_vals, is_int, expected, reply in cmds:
+                if i < 2:
+                    vals = Unframed_Read(port, write_cmd, no_vals, is_int, '\n' if i == 0 else b'\n')
+                else:
+                    vals = Framed_Read(iface, write_cmd, no_vals, is_int)
+                if no_vals > 0 and vals is not None and vals.size == expected.size and numpy.allclose(vals, expected, rtol = 1.0e-12, atol = 0.0):
+                    correct = correct + 1
+            host = time.perf_counter() - start
+            results.append( {"path":label, "correct":correct, "reads":no_reads, "link_s":port.now, "host_s":host} )
+            print("%(v1)-20s %(v2)10s %(v3)14.3f %(v4)16.3f %(v5)12.3f"%{"v1":label, "v2":"%d/%d"%(correct, no_reads), "v3":port.now, "v4":1000.0*port.now/max(1, no_reads), "v5":1000.0*host})
+        return results
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Append_Assembly(set_points, chnnl_values):
+    """
+    The original sweep result assembly, numpy.append for each step, numpy.vstack to grow the result
+    """
+
+    voltage_data = numpy.array([])
+    count = 0
+    for i in range(0, len(set_points), 1):
+        step_data = numpy.array([])
+        step_data = numpy.append(step_data, set_points[i])
+        step_data = numpy.append(step_data, chnnl_values[i])
+        voltage_data = numpy.append(voltage_data, step_data) if count == 0 else numpy.vstack([voltage_data, step_data])
+        count = count + 1 if count == 0 else count
+    return voltage_data
+
+def Prealloc_Assembly(set_points, chnnl_values):
+    """
+    The sweep result assembly of IBM4_Lib.Ser_Iface._Sweep, rows filled in place in an array sized from the set-points
+    """
+
+    voltage_data = numpy.full( (len(set_points), 1 + chnnl_values.shape[1]), numpy.nan )
+    voltage_data[:, 0] = set_points
+    for i in range(0, len(set_points), 1):
+        voltage_data[i, 1:] = chnnl_values[i]
+    return voltage_data
+
+def Sweep_Benchmark(step_counts = (1, 10, 100, 1000, 5000), no_repeats = 5):
+    """
+    Compare the time taken to assemble the result of a sweep of each no. of steps in step_counts, excluding all IBM4 comms
+    """
+
+    FUNC_NAME = ".Sweep_Benchmark()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        rng = numpy.random.default_rng(11062024)
+        print("Sweep Result Assembly: numpy.append / numpy.vstack vs preallocated")
+        print("%(v1)8s %(v2)14s %(v3)14s %(v4)8s %(v5)10s"%{"v1":"no_steps", "v2":"append (ms)", "v3":"prealloc (ms)", "v4":"speedup", "v5":"shape"})
+        results = []
+        for no_steps in step_counts:
+            set_points = numpy.linspace(0.0, 3.2, no_steps)
+            chnnl_values = rng.uniform(0.0, 3.3, (no_steps, 5))
+            t_old = Time_Call(Append_Assembly, (set_points, chnnl_values), no_repeats)
+            t_new = Time_Call(Prealloc_Assembly, (set_points, chnnl_values), no_repeats)
+            shape = Prealloc_Assembly(set_points, chnnl_values).shape
+            results.append( {"no_steps":no_steps, "append_s":t_old, "prealloc_s":t_new, "shape":shape} )
+            print("%(v1)8d %(v2)14.3f %(v3)14.3f %(v4)8.1f %(v5)10s"%{"v1":no_steps, "v2":1000.0*t_old, "v3":1000.0*t_new, "v4":t_old/t_new, "v5":str(shape)})
+        return results
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+class Instant_Port(object):
+    """
+    Stand-in for serial.Serial that answers each command line as soon as it is written, with the echo and reply of an IBM4_Emulator
+    The reply to each distinct command line is computed once and then reused, so that timing a call measures only the host side of the call
+    """
+
+    def __init__(self):
+        self.emu = IBM4_Emulator.Emulator(register = False) # only its Respond method is used, no pty is opened
+        self.replies = {} # command line : echo + reply
+        self.rx = bytearray() # bytes that have been answered and not read
+        self.name = 'instant'
+
+    def isOpen(self):
+        return True
+
+    def write(self, data):
+        for line in bytes(data).split(b'\n'):
+            line = line.strip()
+            if len(line) > 0:
+                reply = self.replies.get(line)
+                if reply is None:
+                    reply = line + b'\r\n' + self.emu.Respond(line, time.monotonic())[0]
+                    self.replies[line] = reply
+                self.rx.extend(reply)
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def read(self, size = 1):
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self.rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        pass
+
+class Instant_Iface(IBM4_Lib.Ser_Iface):
+    """
+    IBM4_Lib.Ser_Iface whose link is an Instant_Port
+    """
+
+    def OpenComms(self, read_mode = 'DC'):
+        self.instr_obj = Instant_Port()
+        self.SetMode(read_mode)
+        self.ZeroIBM4()
+
+def Command_Benchmark(no_calls = 5000, no_reads = 100):
+    """
+    Compare the per-call host overhead of the Ser_Iface read / write methods with that of the IBM4_Fast Readers and Writers
+    Both are run against an Instant_Port, so the times exclude the link and the IBM4 and measure only the work done on the host per call
+    """
+
+    FUNC_NAME = ".Command_Benchmark()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        the_dev = Instant_Iface('instant')
+        fast = the_dev.FastPath()
+        set_points = numpy.linspace(0.0, 3.2, no_calls).tolist()
+        write_A0 = fast.Writer('A0')
+        pwm = fast.PWMWriter()
+        tests = [("WriteVoltage", lambda i: the_dev.WriteVoltage('A0', set_points[i]), lambda i: write_A0(set_points[i])),
+                 ("WritePWM", lambda i: the_dev.WritePWM(i % 101), lambda i: pwm(i % 101)),
+                 ("Single Voltage", lambda i: the_dev.ReadSingleVoltage('A2'), lambda i, r = fast.Reader('A2'): r()),
+                 ("Single Binary", lambda i: the_dev.ReadSingleBinary('A2'), lambda i, r = fast.Reader('A2', 'Single Binary'): r()),
+                 ("Average Voltage", lambda i: the_dev.ReadAverageVoltage('A2', 10), lambda i, r = fast.Reader('A2', 'Average Voltage', 10): r()),
+                 ("Multiple Voltage", lambda i: the_dev.ReadMultipleVoltage('A2', no_reads), lambda i, r = fast.Reader('A2', 'Multiple Voltage', no_reads): r()),
+                 ("Diff Single Voltage", lambda i: the_dev.DiffReadSingle('A2', 'A3'), lambda i, r = fast.Reader('A2', neg_channel = 'A3'): r())]
+
+        print("Command Path: per-call host overhead, %(v1)d calls, link and IBM4 excluded"%{"v1":no_calls})
+        print("%(v1)-20s %(v2)16s %(v3)16s %(v4)8s"%{"v1":"Call", "v2":"Ser_Iface (us)", "v3":"IBM4_Fast (us)", "v4":"speedup"})
+        results = []
+        for label, old, new in tests:
+            per_call = []
+            for func in [old, new]:
+                func(0) # the first call encodes and caches the reply of the Instant_Port
+                start = time.perf_counter()
+                for i in range(0, no_calls, 1):
+                    func(i)
+                per_call.append( (time.perf_counter() - start)/no_calls )
+            results.append( {"call":label, "ser_iface_s":per_call[0], "fast_s":per_call[1]} )
+            print("%(v1)-20s %(v2)16.1f %(v3)16.1f %(v4)8.1f"%{"v1":label, "v2":1.0e6*per_call[0], "v3":1.0e6*per_call[1], "v4":per_call[0]/per_call[1]})
+        the_dev.IBM4Port = None # nothing to zero or close
+        return results
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Time_Calls(func, args, no_repeats):
+    """
+    Time no_repeats calls of func(*args)
+
+    Returns the list of times in seconds and the no. of calls that failed, i.e. returned None
+    """
+
+    times = []
+    failed = 0
+    for i in range(0, no_repeats, 1):
+        start = time.perf_counter()
+        res = func(*args)
+        times.append(time.perf_counter() - start)
+        if res is None:
+            failed = failed + 1
+    return times, failed
+
+def Summarise(test, no_reads, no_samples, times, failed):
+    """
+    Summarise the times of the calls made by one test, no_samples is the no. of values read by each call
+    """
+
+    median = float(numpy.median(times))
+    return {"test":test, "no_reads":no_reads, "samples_per_call":no_samples, "calls":len(times), "failed":failed,
+            "latency_s":{"min":float(numpy.min(times)), "median":median, "mean":float(numpy.mean(times)), "max":float(numpy.max(times))},
+            "samples_per_s":no_samples/median if median > 0 else 0.0}
+
+def Throughput_Benchmark(the_dev, read_counts = (10, 100, 1000, 5000), no_repeats = 5, input_channel = 'A2', pos_channel = 'A2', neg_channel = 'A3', sweep_steps = (10, 50), no_averages = 10):
+    """
+    Measure the samples/s and the per-call latency achieved by the_dev, an open IBM4_Lib.Ser_Iface
+
+    Every read type in READ_TYPES is timed through ReadVoltage, and differentially through DifferentialRead, for each no_reads in read_counts,
+    the single read types are timed once since they ignore no_reads.
+    ReadAverageVoltageAllChnnl, ScanAllChnnl and five sequential ReadAverageVoltage calls are timed for each no_reads, SingleChannelSweepA on A0 for each no. steps in sweep_steps
+
+    Returns a list of dictionaries, one per test and no_reads, see Summarise
+    """
+
+    FUNC_NAME = ".Throughput_Benchmark()"
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        c1 = True if the_dev.instr_obj is not None and the_dev.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+        c2 = True if all([n > 2 and n < 10000 for n in read_counts]) else False # ReadVoltage and DifferentialRead accept no_reads in [3, 10000)
+        c3 = True if no_repeats > 0 else False
+
+        if c1 and c2 and c3:
+            results = []
+            print("IBM4 Throughput: %(v1)d calls per test"%{"v1":no_repeats})
+            print("%(v1)-32s %(v2)8s %(v3)14s %(v4)14s %(v5)8s"%{"v1":"Test", "v2":"no_reads", "v3":"median (ms)", "v4":"samples/s", "v5":"failed"})
+
+            def run(test, func, args, no_reads, no_samples):
+                times, failed = Time_Calls(func, args, no_repeats)
+                res = Summarise(test, no_reads, no_samples, times, failed)
+                results.append(res)
+                print("%(v1)-32s %(v2)8d %(v3)14.3f %(v4)14.1f %(v5)8d"%{"v1":test, "v2":no_reads, "v3":1000.0*res["latency_s"]["median"], "v4":res["samples_per_s"], "v5":failed})
+
+            for read_type in the_dev.Read_Types:
+                single = read_type.startswith('Single')
+                for no_reads in read_counts[:1] if single else read_counts:
+                    run('ReadVoltage ' + read_type, the_dev.ReadVoltage, (input_channel, read_type, no_reads), 1 if single else no_reads, 1 if single else no_reads)
+            for read_type in the_dev.Read_Types:
+                single = read_type.startswith('Single')
+                for no_reads in read_counts[:1] if single else read_counts:
+                    run('DifferentialRead ' + read_type, the_dev.DifferentialRead, (pos_channel, neg_channel, read_type, no_reads), 1 if single else no_reads, 1 if single else no_reads)
+            for no_reads in read_counts:
+                # binary reads converted to volts on the host, compare with ReadVoltage Multiple Voltage
+                run('ReadMultipleCalibrated', the_dev.ReadMultipleCalibrated, (input_channel, no_reads), no_reads, no_reads)
+
+            def sequential(no_reads):
+                # the all-channel read as it was originally made, one round trip per channel
+                return [the_dev.ReadAverageVoltage(item, no_reads) for item in the_dev.Read_Chnnls]
+
+            for no_reads in read_counts:
+                run('ReadAverageVoltage x5 sequential', sequential, (no_reads,), no_reads, len(the_dev.Read_Chnnls)*no_reads)
+                run('ReadAverageVoltageAllChnnl', the_dev.ReadAverageVoltageAllChnnl, (no_reads,), no_reads, len(the_dev.Read_Chnnls)*no_reads)
+                run('ScanAllChnnl', the_dev.ScanAllChnnl, (no_reads,), no_reads, len(the_dev.Read_Chnnls)*no_reads)
+            for no_steps in sweep_steps:
+                # the set points are those generated by Sweep_Interval for no_steps, each step reads every channel no_averages times
+                no_points = len(Sweep_Interval.SweepSpace(no_steps, 0.0, 3.0).SetPoints())
+                run('SingleChannelSweepA %d steps'%(no_steps), the_dev.SingleChannelSweepA, ('A0', 0.0, 3.0, no_steps, 0.0, no_averages), no_averages, no_points*len(the_dev.Read_Chnnls)*no_averages)
+            return results
+        else:
+            if not c1:
+                ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+            if not c2:
+                ERR_STATEMENT = ERR_STATEMENT + '\nread_counts must lie in the range [3, 10000)'
+            if not c3:
+                ERR_STATEMENT = ERR_STATEMENT + '\nno_repeats must be at least 1'
+            raise Exception
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def To_Json(obj):
+    """
+    Convert the numpy values and tuples held in the benchmark results into types that json can write
+    """
+
+    if isinstance(obj, dict):
+        return {str(k):To_Json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [To_Json(v) for v in obj]
+    if isinstance(obj, numpy.generic):
+        return obj.item()
+    if isinstance(obj, bytes):
+        return obj.decode(errors = 'replace')
+    return obj
+
+def Compare_Runs(baseline, current):
+    """
+    Print the change in samples/s of each throughput test between two runs, baseline and current are dictionaries loaded from the JSON files
+    """
+
+    base = {(res["test"], res["no_reads"]):res for res in baseline.get("throughput", None) or []}
+    print("Throughput compared with the run of %(v1)s"%{"v1":baseline.get("started", "?")})
+    print("%(v1)-32s %(v2)8s %(v3)14s %(v4)14s %(v5)8s"%{"v1":"Test", "v2":"no_reads", "v3":"baseline/s", "v4":"current/s", "v5":"ratio"})
+    for res in current.get("throughput", None) or []:
+        old = base.get( (res["test"], res["no_reads"]) )
+        if old is not None and old["samples_per_s"] > 0:
+            print("%(v1)-32s %(v2)8d %(v3)14.1f %(v4)14.1f %(v5)8.2f"%{"v1":res["test"], "v2":res["no_reads"], "v3":old["samples_per_s"], "v4":res["samples_per_s"], "v5":res["samples_per_s"]/old["samples_per_s"]})
+
+def main():
+    """
+    Command line entry point, see python IBM4_Benchmark.py --help
+    """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the IBM4 Serial Controller')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--port', default = None, help = 'port or pyserial URL of the IBM4, default: the first IBM4 found')
+    target.add_argument('--emulate', action = 'store_true', help = 'run against an IBM4_Emulator on a pty')
+    target.add_argument('--offline', action = 'store_true', help = 'run only the benchmarks that need no IBM4')
+    parser.add_argument('--uart', action = 'store_true', help = 'with --emulate, limit the emulator to the baud rate of the link')
+    parser.add_argument('--baud', type = int, default = IBM4_Lib.DEFAULT_BAUD, help = 'baud rate used to open the link')
+    parser.add_argument('--read-counts', type = int, nargs = '+', default = [10, 100, 1000, 5000], help = 'no_reads values to test')
+    parser.add_argument('--sweep-steps', type = int, nargs = '+', default = [10, 50], help = 'no. steps of the sweeps to test')
+    parser.add_argument('--repeats', type = int, default = 5, help = 'no. calls timed per test')
+    parser.add_argument('--channel', default = 'A2', help = 'input channel read by the single ended tests')
+    parser.add_argument('--host', action = 'store_true', help = 'also run the parsing, framing, sweep assembly and command path benchmarks')
+    parser.add_argument('--output', default = None, help = 'JSON file to which the results are written')
+    parser.add_argument('--compare', default = None, help = 'JSON file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    run = {"started":time.strftime('%Y-%m-%d %H:%M:%S'), "args":vars(args), "python":sys.version.split()[0], "numpy":numpy.__version__,
+           "platform":platform.platform(), "machine":platform.machine()}
+
+    if args.offline or args.host:
+        run["parse"] = Parse_Benchmark()
+        run["framing"] = Framing_Benchmark()
+        run["sweep_assembly"] = Sweep_Benchmark()
+        run["command_path"] = Command_Benchmark()
+
+    if not args.offline:
+        emu = IBM4_Emulator.Emulator(uart = args.uart, register = False) if args.emulate else None
+        port = emu.Start() if emu is not None else args.port
+        try:
+            the_dev = IBM4_Lib.Ser_Iface(port, baud_rate = args.baud)
+            if the_dev.instr_obj is not None and the_dev.instr_obj.isOpen():
+                run["target"] = {"port":the_dev.IBM4Port, "idn":the_dev.IdentifyIBM4(), "baud_rate":the_dev.baud_rate, "emulated":args.emulate}
+                run["throughput"] = Throughput_Benchmark(the_dev, args.read_counts, args.repeats, args.channel, sweep_steps = args.sweep_steps)
+                run["link_stats"] = the_dev.stats()
+                the_dev.ZeroIBM4()
+                the_dev.instr_obj.close()
+        finally:
+            if emu is not None:
+                emu.Stop()
+
+    run = To_Json(run)
+    if args.output is not None:
+        with open(args.output, 'w') as the_file:
+            json.dump(run, the_file, indent = 1)
+        print('Results written to', args.output)
+    if args.compare is not None:
+        with open(args.compare, 'r') as the_file:
+            Compare_Runs(json.load(the_file), run)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Host side calibration of the binary readings of the IBM4
+
+A voltage reading is written by the IBM4 as an ASCII float, e.g. 1.2345, a binary reading as the ADC count, e.g. 38291.
+BRead replies are shorter on the wire and need no float formatting on the board, so long acquisitions are faster
+when counts are read and converted to volts on the host.
+
+Each analog input channel, in each read mode, is converted as
+volts = gain*counts + offset
+A Calibration holds the gain and offset of every channel in every mode for one IBM4, identified by its IDN string.
+The conversion is applied to whole numpy arrays, or to a block of several channels at once.
+Nominal values, full scale of VMAX in DC mode and of +/- VMAX_AC in AC mode, are used until the IBM4 is calibrated
+against its own voltage readings with Calibrate. The calibrations are stored in a JSON file, by IDN string, e.g.
+
+cal = IBM4_Calibration.Calibrate(the_dev)
+volts = cal.ToVolts(the_dev.ReadMultipleBinary('A2', 5000), 'A2', 'DC')
+"""
+
+import os
+import json
+import time
+import numpy
+import IBM4_Lib
+
+MOD_NAME_STR = "IBM4_Calibration"
+
+# location of the calibration file, can be overridden by setting the environment variable IBM4_CALIBRATION
+CAL_FILE = os.environ.get('IBM4_CALIBRATION', os.path.join(os.path.expanduser('~'), '.ibm4_calibration.json'))
+
+def Nominal_Table():
+    """
+    The nominal calibration of each read mode, read mode : {"gain":[one value per channel], "offset":[one value per channel]}
+    DC mode maps [0, ADC_MAX] onto [0, VMAX], AC mode maps [0, ADC_MAX] onto [-VMAX_AC, +VMAX_AC]
+    """
+
+    no_chnnls = len(IBM4_Lib.READ_CHNNLS)
+    dc_gain = IBM4_Lib.VMAX/IBM4_Lib.ADC_MAX
+    ac_gain = 2.0*IBM4_Lib.VMAX_AC/IBM4_Lib.ADC_MAX
+    return {"DC":{"gain":[dc_gain]*no_chnnls, "offset":[0.0]*no_chnnls},
+            "AC":{"gain":[ac_gain]*no_chnnls, "offset":[-IBM4_Lib.VMAX_AC]*no_chnnls}}
+
+class Calibration(object):
+    """
+    Conversion of the ADC counts of one IBM4 to volts
+    """
+
+    def __init__(self, idn = None, table = None):
+        """
+        Constructor for the Calibration object
+
+        idn (type: str) is the IDN string of the IBM4
+        table (type: dict) read mode : {"gain":[...], "offset":[...]}, one value per channel in the order of IBM4_Lib.READ_CHNNLS
+        modes missing from table take their nominal values
+        """
+
+        self.idn = idn
+        self.gain = {}
+        self.offset = {}
+        self.date = {} # when each read mode was calibrated, None for nominal values
+        table = {} if table is None else table
+        for mode, nominal in Nominal_Table().items():
+            entry = table.get(mode, nominal)
+            self.gain[mode] = numpy.asarray(entry["gain"], dtype = numpy.float64)
+            self.offset[mode] = numpy.asarray(entry["offset"], dtype = numpy.float64)
+            self.date[mode] = entry.get("date", None)
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 calibration for %(v1)s"%{"v1":self.idn}
+
+    def Table(self):
+        """
+        The calibration as a dictionary that can be written as JSON
+        """
+
+        return {mode:{"gain":self.gain[mode].tolist(), "offset":self.offset[mode].tolist(), "date":self.date[mode]} for mode in self.gain}
+
+    def ToVolts(self, counts, input_channel, read_mode = 'DC'):
+        """
+        Convert the counts (type: numpy array) read at input_channel in read_mode to volts
+        """
+
+        idx = IBM4_Lib.READ_CHNNLS[input_channel]
+        return self.gain[read_mode][idx]*numpy.asarray(counts, dtype = numpy.float64) + self.offset[read_mode][idx]
+
+    def BlockToVolts(self, block, channels, read_mode = 'DC'):
+        """
+        Convert a block of counts of shape (len(channels), no_reads), row i read at channels[i], to volts in one pass
+        """
+
+        idx = [IBM4_Lib.READ_CHNNLS[ch] for ch in channels]
+        gain = self.gain[read_mode][idx]
+        offset = self.offset[read_mode][idx]
+        return gain[:, numpy.newaxis]*numpy.asarray(block, dtype = numpy.float64) + offset[:, numpy.newaxis]
+
+    def Fit(self, read_mode, counts, volts):
+        """
+        Fit the gain and offset of every channel in read_mode
+
+        counts, volts (type: numpy arrays of shape (no_levels, no_chnnls)) mean count and mean voltage read at each channel at each level
+        A channel whose counts span less than 5% of full scale, e.g. one that is not wired to an output, keeps its gain and has its offset fitted
+        """
+
+        for idx in range(0, counts.shape[1], 1):
+            x = counts[:, idx]
+            y = volts[:, idx]
+            ok = numpy.isfinite(x) & numpy.isfinite(y)
+            if numpy.count_nonzero(ok) == 0:
+                continue
+            if numpy.count_nonzero(ok) > 1 and numpy.ptp(x[ok]) > 0.05*IBM4_Lib.ADC_MAX:
+                self.gain[read_mode][idx], self.offset[read_mode][idx] = numpy.polyfit(x[ok], y[ok], 1)
+            else:
+                self.offset[read_mode][idx] = numpy.mean(y[ok] - self.gain[read_mode][idx]*x[ok])
+        self.date[read_mode] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+def Load(idn, cal_file = None):
+    """
+    Return the Calibration stored for the IBM4 with identity string idn, nominal values are used if none is stored
+    """
+
+    cal_file = CAL_FILE if cal_file is None else cal_file
+    key = idn.decode(errors = 'replace') if isinstance(idn, bytes) else idn
+    try:
+        with open(cal_file, 'r') as the_file:
+            cals = json.load(the_file)
+        table = cals.get(key, None) if isinstance(cals, dict) else None
+    except (OSError, ValueError):
+        table = None
+    return Calibration(key, table)
+
+def Save(cal, cal_file = None):
+    """
+    Store the Calibration cal in the calibration file, replacing any stored for the same IBM4
+    """
+
+    FUNC_NAME = ".Save()" # use this in exception handling messages
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    cal_file = CAL_FILE if cal_file is None else cal_file
+    try:
+        try:
+            with open(cal_file, 'r') as the_file:
+                cals = json.load(the_file)
+            cals = cals if isinstance(cals, dict) else {}
+        except (OSError, ValueError):
+            cals = {}
+        cals[cal.idn] = cal.Table()
+        # write to a temporary file first so that an interrupted write never leaves a corrupt file
+        tmp_file = cal_file + '.tmp'
+        with open(tmp_file, 'w') as the_file:
+            json.dump(cals, the_file, indent = 1)
+        os.replace(tmp_file, cal_file)
+    except OSError as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Calibrate(the_dev, levels = (0.3, 1.0, 1.7, 2.4, 3.0), no_reads = 200, settle = 0.25, save = True, loud = False):
+    """
+    Calibrate the binary readings of the_dev, an open IBM4_Lib.Ser_Iface, against its voltage readings in its present read mode
+
+    Both analog outputs are set to each of the levels in turn, after settle seconds every channel is read with an Average and a BRead
+    of no_reads, all sent in one transaction, and the gain and offset of each channel are fitted to the mean counts and voltages.
+    The outputs are zeroed when done.
+
+    Returns the updated Calibration of the_dev, which is also saved to the calibration file if save
+    """
+
+    FUNC_NAME = ".Calibrate()" # use this in exception handling messages
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        cal = the_dev.GetCalibration()
+        if cal is None:
+            ERR_STATEMENT = ERR_STATEMENT + '\nCould not identify the IBM4'
+            raise Exception
+        channels = list(IBM4_Lib.READ_CHNNLS)
+        counts = numpy.full( (len(levels), len(channels)), numpy.nan )
+        volts = numpy.full( (len(levels), len(channels)), numpy.nan )
+        for i, level in enumerate(levels):
+            for output_channel in IBM4_Lib.WRITE_CHNNLS:
+                the_dev.WriteVoltage(output_channel, level)
+            time.sleep(settle)
+            pipe = the_dev.Pipeline()
+            for ch in channels:
+                pipe.Average(ch, no_reads)
+                pipe.BRead(ch, no_reads)
+            res = pipe.Execute()
+            for j in range(0, len(channels), 1):
+                if res[2*j] is not None and res[2*j + 1] is not None:
+                    volts[i, j] = res[2*j]
+                    counts[i, j] = numpy.mean(res[2*j + 1])
+            if loud: print('Level %(v1)0.2f V: counts %(v2)s, volts %(v3)s'%{"v1":level, "v2":counts[i], "v3":volts[i]})
+        the_dev.ZeroIBM4()
+
+        cal.Fit(the_dev.read_mode, counts, volts)
+        if loud:
+            print('Gain: ', cal.gain[the_dev.read_mode])
+            print('Offset: ', cal.offset[the_dev.read_mode])
+        if save:
+            Save(cal)
+        return cal
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
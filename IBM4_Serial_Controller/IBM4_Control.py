@@ -0,0 +1,211 @@
+"""
+Closed loop control of an IBM4 analog output
+
+Holding a measured quantity constant, e.g. the current through a sense resistor, by setting the output voltage by hand
+means repeating Write / Read until the reading is close enough, and again whenever the load drifts.
+A ControlLoop drives A0 or A1 so that a single-ended or differential reading tracks a setpoint using a PID controller.
+
+The PID uses
+proportional action on the error, setpoint - reading
+integral action with anti-windup, the integral is frozen while the output is clamped and the error would drive it further into the clamp
+derivative action on the reading rather than the error, so that a change of setpoint does not kick the output
+The output is clamped to the range of the analog outputs, [VMIN, VMAX - DELTA_VMIN].
+
+The loop uses the pre-encoded Reader and Writer of IBM4_Fast and, by default, runs back to back as fast as the link allows,
+the measured dt of each step is used by the PID. With interval set, steps are scheduled on the monotonic clock as in IBM4_Logger.
+The time taken by each step (latency) and the time between the starts of successive steps (period) are recorded,
+the jitter is the standard deviation of the period, e.g.
+
+loop = IBM4_Control.ControlLoop(the_dev, 'A0', 'A2', 'A3', IBM4_Control.PID(0.5, 20.0, 0.0, setpoint = 0.1))
+summary = loop.Run(duration = 5.0)
+"""
+
+import time
+import threading
+import numpy
+import IBM4_Lib
+
+MOD_NAME_STR = "IBM4_Control"
+
+class PID(object):
+    """
+    PID controller with anti-windup and output clamping
+    """
+
+    def __init__(self, kp, ki = 0.0, kd = 0.0, setpoint = 0.0, out_min = IBM4_Lib.VMIN, out_max = IBM4_Lib.VMAX - IBM4_Lib.DELTA_VMIN):
+        """
+        Constructor for the PID object
+
+        kp (type: float) proportional gain, units of V / unit of reading
+        ki (type: float) integral gain, units of V / (unit of reading s)
+        kd (type: float) derivative gain, units of V s / unit of reading
+        setpoint (type: float) the value the reading is to track
+        out_min, out_max (type: float) the output is clamped to [out_min, out_max]
+        """
+
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = setpoint
+        self.out_min = out_min
+        self.out_max = out_max
+        self.Reset()
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "PID kp = %(v1)g, ki = %(v2)g, kd = %(v3)g, setpoint = %(v4)g"%{"v1":self.kp, "v2":self.ki, "v3":self.kd, "v4":self.setpoint}
+
+    def Reset(self, output = None):
+        """
+        Clear the state of the controller, the integral starts at output, so that the first output does not jump from the present one
+        """
+
+        self.integral = self.out_min if output is None else min(max(output, self.out_min), self.out_max)
+        self.last_reading = None
+        self.output = self.integral
+        self.saturated = False
+
+    def Update(self, reading, dt):
+        """
+        Return the output for reading, dt (s) is the time since the previous reading
+        """
+
+        error = self.setpoint - reading
+        p_term = self.kp*error
+        d_term = 0.0
+        if self.last_reading is not None and dt > 0:
+            d_term = -self.kd*(reading - self.last_reading)/dt
+            integral = self.integral + self.ki*error*dt
+            output = p_term + integral + d_term
+            # anti-windup, only integrate when the output is in range or the error would bring it back into range
+            if (output > self.out_max and error > 0) or (output < self.out_min and error < 0):
+                output = p_term + self.integral + d_term
+            else:
+                self.integral = integral
+        else:
+            output = p_term + self.integral
+        self.last_reading = reading
+        self.saturated = output > self.out_max or output < self.out_min
+        self.output = min(max(output, self.out_min), self.out_max)
+        return self.output
+
+class ControlLoop(object):
+    """
+    PID control of one analog output from a single-ended or differential reading
+    """
+
+    def __init__(self, the_dev, output_channel, pos_channel, neg_channel = None, pid = None, no_reads = 1):
+        """
+        Constructor for the ControlLoop object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4
+        output_channel (type: str) is the output driven, A0 or A1
+        pos_channel (type: str) is the channel read, neg_channel = None => single-ended reading, otherwise pos_channel - neg_channel
+        pid (type: PID) is the controller
+        no_reads (type: int) no_reads = 1 => a single read per step, otherwise the average of no_reads reads
+        """
+
+        fast = the_dev.FastPath()
+        self.the_dev = the_dev
+        self.output_channel = output_channel
+        self.pid = PID(0.5, 10.0) if pid is None else pid
+        self.write = fast.Writer(output_channel)
+        if no_reads > 1:
+            self.read = fast.Reader(pos_channel, 'Average Voltage', no_reads, neg_channel)
+        else:
+            self.read = fast.Reader(pos_channel, 'Single Voltage', 1, neg_channel)
+        self.stop_event = threading.Event()
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 control loop on %(v1)s, %(v2)s"%{"v1":self.output_channel, "v2":self.pid}
+
+    def Stop(self):
+        """
+        Stop a Run, e.g. from another thread
+        """
+
+        self.stop_event.set()
+
+    def Run(self, duration = 5.0, max_steps = None, interval = None, v_start = None, loud = False):
+        """
+        Run the loop until duration seconds have passed, max_steps steps have been taken, Stop is called or the user presses Ctrl-C
+
+        interval = None => steps are taken back to back, otherwise one step every interval seconds
+        v_start is the output at the start, v_start = None => the output last set by the PID
+        The output is left at its last value when the loop stops
+
+        Returns a dictionary summarising the run
+        t, reading, output (type: numpy arrays) time since the start, reading and output of each step
+        steps, rate_hz, the final error, missed deadlines when interval is set,
+        latency_s and period_s: mean, std, p50, p99 and max of the time taken by each step and of the time between the starts of successive steps,
+        jitter_s: the standard deviation of the period
+        """
+
+        FUNC_NAME = ".Run()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        self.stop_event.clear()
+        pid = self.pid
+        pid.Reset(pid.output if v_start is None else v_start)
+        times = []
+        readings = []
+        outputs = []
+        latency = []
+        missed = 0
+        try:
+            self.write(pid.output)
+            t0 = time.perf_counter()
+            t_prev = None
+            k = 0 # index of the next deadline when interval is set
+            while not self.stop_event.is_set():
+                if max_steps is not None and len(times) >= max_steps:
+                    break
+                if interval is not None:
+                    wait = t0 + k*interval - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                t_step = time.perf_counter()
+                if duration is not None and t_step - t0 >= duration:
+                    break
+                reading = self.read()
+                t_read = time.perf_counter()
+                output = pid.Update(reading, 0.0 if t_prev is None else t_read - t_prev)
+                self.write(output)
+                t_prev = t_read
+                times.append(t_step - t0)
+                readings.append(reading)
+                outputs.append(output)
+                latency.append(time.perf_counter() - t_step)
+                if interval is not None:
+                    k_next = max(k + 1, int( numpy.ceil( (time.perf_counter() - t0)/interval ) ))
+                    missed = missed + (k_next - k - 1)
+                    k = k_next
+                if loud and len(times) % 100 == 0:
+                    print('Step',len(times),'reading %(v1)0.4f output %(v2)0.3f'%{"v1":reading, "v2":output})
+        except KeyboardInterrupt:
+            print('Control loop stopped by user')
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+        times = numpy.array(times)
+        latency = numpy.array(latency)
+        period = numpy.diff(times)
+
+        def describe(vals):
+            if vals.size == 0:
+                return {"mean":0.0, "std":0.0, "p50":0.0, "p99":0.0, "max":0.0}
+            return {"mean":float(numpy.mean(vals)), "std":float(numpy.std(vals)), "p50":float(numpy.percentile(vals, 50)),
+                    "p99":float(numpy.percentile(vals, 99)), "max":float(numpy.max(vals))}
+
+        return {"t":times, "reading":numpy.array(readings), "output":numpy.array(outputs), "steps":times.size,
+                "rate_hz":1.0/numpy.mean(period) if period.size > 0 else 0.0,
+                "error":pid.setpoint - readings[-1] if len(readings) > 0 else None, "missed":missed,
+                "latency_s":describe(latency), "period_s":describe(period), "jitter_s":float(numpy.std(period)) if period.size > 0 else 0.0}
@@ -0,0 +1,199 @@
+"""
+Vectorised decoding of the numeric replies returned by the IBM4
+
+The multi-read methods of IBM4_Lib.Ser_Iface originally converted each reply to its str repr,
+ran re.findall over the repr and then converted the list of strings using numpy.
+The methods here work directly on the raw bytes returned by the serial link, or on a reused bytearray / memoryview,
+and produce a typed numpy array in one vectorised pass without building any intermediate strings
+
+For well formed replies the numbers located are the same as those located by the regex r'[-+]?\d+[\.]?\d*'
+"""
+
+import numpy
+
+MOD_NAME_STR = "IBM4_Decode" # use this in exception handling messages
+
+# ASCII codes of the characters that make up a number
+ZERO = 48
+NINE = 57
+DOT = 46
+MINUS = 45
+PLUS = 43
+
+# powers of ten looked up by index rather than computed element by element
+POW10 = 10.0**numpy.arange(0, 23)
+
+def Scan_Tokens(buf):
+    """
+    Classify the bytes of an IBM4 reply
+
+    Inputs:
+    buf (type: numpy uint8 array) contains the reply received from the IBM4
+
+    Outputs:
+    is_dig, is_dot, is_sign (type: numpy bool arrays) mark the bytes that are digits, decimal points and signs of a number
+    in_tok (type: numpy bool array) marks the bytes that are part of a number
+    tok_start (type: numpy bool array) marks the first byte of each number
+    """
+
+    # A digit belongs to a number, a '.' belongs to a number if it follows a digit,
+    # a sign belongs to a number if it precedes a digit
+
+    is_dig = (buf >= ZERO) & (buf <= NINE)
+    prev_dig = numpy.concatenate(([False], is_dig[:-1]))
+    next_dig = numpy.concatenate((is_dig[1:], [False]))
+    is_dot = (buf == DOT) & prev_dig
+    is_sign = ((buf == MINUS) | (buf == PLUS)) & next_dig
+
+    in_tok = is_dig | is_dot | is_sign
+    prev_tok = numpy.concatenate(([False], in_tok[:-1]))
+    tok_start = (in_tok & ~prev_tok) | is_sign
+
+    # a second decimal point terminates a number, e.g. 1.2.3 => 1.2, 3
+    dot_idx = numpy.flatnonzero(is_dot)
+    tok_id = numpy.cumsum(tok_start)
+    repeat = tok_id[dot_idx[1:]] == tok_id[dot_idx[:-1]]
+    if repeat.any():
+        is_dot[dot_idx[1:][repeat]] = False
+        in_tok = is_dig | is_dot | is_sign
+        prev_tok = numpy.concatenate(([False], in_tok[:-1]))
+        tok_start = (in_tok & ~prev_tok) | is_sign
+
+    return is_dig, is_dot, is_sign, in_tok, tok_start
+
+def Locate_Ends(raw):
+    """
+    Locate the position of the last byte of every number contained in the buffer raw
+
+    Inputs:
+    raw (type: bytes, bytearray, memoryview) is the reply received from the IBM4
+
+    Outputs:
+    ends (type: numpy array) contains the index of the last byte of each number
+    """
+
+    buf = numpy.frombuffer(raw, dtype = numpy.uint8)
+
+    if buf.size == 0:
+        return numpy.zeros(0, dtype = numpy.int64)
+
+    is_dig, is_dot, is_sign, in_tok, tok_start = Scan_Tokens(buf)
+    next_tok = numpy.concatenate((in_tok[1:], [False]))
+    next_start = numpy.concatenate((tok_start[1:], [False]))
+    return numpy.flatnonzero(in_tok & (~next_tok | next_start))
+
+def Locate_Values(raw):
+    """
+    Locate every number contained in the buffer raw
+
+    Inputs:
+    raw (type: bytes, bytearray, memoryview) is the reply received from the IBM4
+
+    Outputs:
+    sign (type: numpy array) is +/-1 for each number found
+    mantissa (type: numpy array) is the value of each number with its decimal point removed
+    nfrac (type: numpy array) is the no. of digits after the decimal point of each number
+    """
+
+    # The scan works on the byte codes
+    # each number is labelled using a cumulative sum over the positions at which numbers start
+    # and the digits are accumulated into the mantissa of their number using numpy.bincount
+
+    buf = numpy.frombuffer(raw, dtype = numpy.uint8)
+
+    if buf.size == 0:
+        return numpy.zeros(0), numpy.zeros(0), numpy.zeros(0, dtype = numpy.int64)
+
+    is_dig, is_dot, is_sign, in_tok, tok_start = Scan_Tokens(buf)
+    tok_id = numpy.cumsum(tok_start) - 1
+    dot_idx = numpy.flatnonzero(is_dot)
+
+    ntok = int(numpy.count_nonzero(tok_start))
+
+    if ntok == 0:
+        return numpy.zeros(0), numpy.zeros(0), numpy.zeros(0, dtype = numpy.int64)
+
+    # sign of each number
+    sign = numpy.ones(ntok)
+    sign_idx = numpy.flatnonzero(is_sign)
+    sign[tok_id[sign_idx]] = numpy.where(buf[sign_idx] == MINUS, -1.0, 1.0)
+
+    # position of the decimal point of each number, numbers without one are given a point beyond the end of the buffer
+    dot_pos = numpy.full(ntok, buf.size)
+    dot_pos[tok_id[dot_idx]] = dot_idx
+
+    # rank of each digit within its number, counted from the most significant digit
+    dig_idx = numpy.flatnonzero(is_dig)
+    dig_tok = tok_id[dig_idx]
+    ndig = numpy.bincount(dig_tok, minlength = ntok)
+    first_dig = numpy.cumsum(ndig) - ndig
+    rank = numpy.arange(dig_idx.size) - first_dig[dig_tok]
+
+    # mantissa is the integer formed from all the digits of the number
+    # it is exact as a float64 provided it has less than 16 digits
+    power = ndig[dig_tok] - 1 - rank
+    digits = buf[dig_idx] - ZERO
+    mantissa = numpy.bincount(dig_tok, weights = digits * POW10[power], minlength = ntok)
+    nfrac = numpy.bincount(dig_tok, weights = dig_idx > dot_pos[dig_tok], minlength = ntok).astype(numpy.int64)
+
+    return sign, mantissa, nfrac
+
+def Decode_Floats(raw, no_vals = None):
+    """
+    Convert the numbers contained in an IBM4 reply to floating point values
+
+    Inputs:
+    raw (type: bytes, bytearray, memoryview) is the reply received from the IBM4
+    no_vals (type: int) only the last no_vals numbers in raw are returned, no_vals = None => return all numbers
+
+    Outputs:
+    vals (type: numpy array) contains the float values
+    """
+
+    FUNC_NAME = ".Decode_Floats()" # use this in exception handling messages
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        sign, mantissa, nfrac = Locate_Values(raw)
+        if no_vals is not None:
+            sign = sign[-no_vals:]
+            mantissa = mantissa[-no_vals:]
+            nfrac = nfrac[-no_vals:]
+        # exact integer divided by exact power of ten gives the same correctly rounded value as float(str)
+        return sign * (mantissa / POW10[nfrac])
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Decode_Ints(raw, no_vals = None):
+    """
+    Convert the numbers contained in an IBM4 reply to integer values
+
+    Inputs:
+    raw (type: bytes, bytearray, memoryview) is the reply received from the IBM4
+    no_vals (type: int) only the last no_vals numbers in raw are returned, no_vals = None => return all numbers
+
+    Outputs:
+    vals (type: numpy array) contains the integer values
+    """
+
+    FUNC_NAME = ".Decode_Ints()" # use this in exception handling messages
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        sign, mantissa, nfrac = Locate_Values(raw)
+        if no_vals is not None:
+            sign = sign[-no_vals:]
+            mantissa = mantissa[-no_vals:]
+            nfrac = nfrac[-no_vals:]
+        return ( sign * numpy.trunc(mantissa / POW10[nfrac]) ).astype(numpy.int64)
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+
+def Count_Values(raw):
+    """
+    Count the numbers contained in an IBM4 reply without converting them
+    """
+
+    return Locate_Values(raw)[0].size
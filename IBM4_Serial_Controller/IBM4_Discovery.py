@@ -0,0 +1,219 @@
+"""
+Discovery of the IBM4 attached to the PC
+
+IBM4_Lib.Ser_Iface.FindIBM4 originally probed COM1 - COM256, or every /dev/tty*, one at a time
+with each probe paying its own open / write / timeout.
+Here the candidate ports are listed using serial.tools.list_ports, USB-serial devices with the IBM4 VID are tried first,
+and the ports are probed concurrently. Every IBM4 found is returned, not just the first.
+
+A small cache file records the port at which each IBM4 IDN string was last found,
+so that a reconnect tries the last-known port before anything else
+"""
+
+# pyserial port enumeration
+# https://pyserial.readthedocs.io/en/latest/tools.html#module-serial.tools.list_ports
+# concurrent.futures
+# https://docs.python.org/3/library/concurrent.futures.html
+
+import os
+import sys
+import glob
+import json
+import time
+import concurrent.futures
+import serial
+import serial.tools.list_ports
+import IBM4_Lib
+
+MOD_NAME_STR = "IBM4_Discovery"
+
+# The IBM4 is based on the Adafruit ItsyBitsy M4, USB vendor ID of Adafruit
+IBM4_VIDS = [0x239A]
+
+# location of the discovery cache, can be overridden by setting the environment variable IBM4_CACHE
+CACHE_FILE = os.environ.get('IBM4_CACHE', os.path.join(os.path.expanduser('~'), '.ibm4_ports.json'))
+
+def Candidate_Ports():
+    """
+    List the serial ports that might have an IBM4 attached, most likely first
+
+    USB-serial ports with an IBM4 VID come first, then other USB-serial ports, then the remaining listed ports,
+    then, on linux / mac, any /dev/tty* that were not listed
+    """
+
+    FUNC_NAME = ".Candidate_Ports()" # use this in exception handling messages
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        ibm4_vid = []
+        usb = []
+        other = []
+        for info in serial.tools.list_ports.comports():
+            if info.vid in IBM4_VIDS:
+                ibm4_vid.append(info.device)
+            elif info.vid is not None:
+                usb.append(info.device)
+            else:
+                other.append(info.device)
+        ports = ibm4_vid + usb + other
+
+        if sys.platform.startswith('win'):
+            # list_ports enumerates every COM port known to windows, fall back to brute force if it finds nothing
+            if len(ports) == 0:
+                ports = ['COM%s'%(i+1) for i in range(256)]
+        elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
+            # this excludes your current terminal "/dev/tty"
+            ports = ports + [p for p in sorted(glob.glob('/dev/tty[A-Za-z]*')) if p not in ports]
+        elif sys.platform.startswith('darwin'):
+            ports = ports + [p for p in sorted(glob.glob('/dev/tty.*')) if p not in ports]
+        else:
+            ERR_STATEMENT = ERR_STATEMENT + '\nUnsupported platform'
+            raise EnvironmentError('Unsupported platform')
+
+        return ports
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+        return []
+
+def Probe_Port(port, timeout = 0.25, baud_rate = 9600):
+    """
+    Send *IDN to port and wait up to timeout seconds for an IBM4 identity string
+
+    Returns the identity string as bytes, or None if no IBM4 answered
+    """
+
+    try:
+        s = serial.serial_for_url(port, baud_rate, timeout = 0.02, write_timeout = 0.1, stopbits = serial.STOPBITS_ONE)
+        try:
+            s.write( str.encode(IBM4_Lib.IDN_CMD) )
+            response = bytearray()
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                response.extend( s.read(max(1, s.in_waiting)) )
+                if b'ISBY' in response:
+                    # wait for the end of the line containing the identity string
+                    start = response.find(b'ISBY')
+                    end = response.find(b'\n', start)
+                    if end > -1:
+                        return bytes(response[start:end]).strip()
+        finally:
+            s.close()
+    except (OSError, ValueError, serial.SerialException):
+        # Ignore the errors that arise from non-IBM4 serial ports
+        pass
+    return None
+
+def Read_Cache(cache_file = None):
+    """
+    Read the discovery cache, a dictionary of IDN string : list of ports, most recently used first
+    """
+
+    cache_file = CACHE_FILE if cache_file is None else cache_file
+    try:
+        with open(cache_file, 'r') as the_file:
+            cache = json.load(the_file)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def Write_Cache(found, cache_file = None):
+    """
+    Record the ports at which IBM4 were found, found is a list of (port, IDN string) pairs
+    """
+
+    cache_file = CACHE_FILE if cache_file is None else cache_file
+    try:
+        cache = Read_Cache(cache_file)
+        for port, idn in reversed(found):
+            key = idn.decode(errors = 'replace') if isinstance(idn, bytes) else str(idn)
+            ports = [p for p in cache.get(key, []) if p != port]
+            cache[key] = [port] + ports
+        # write to a temporary file first so that an interrupted write never leaves a corrupt cache
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w') as the_file:
+            json.dump(cache, the_file, indent = 1)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # the cache is only an optimisation, failure to write it is not an error
+        pass
+
+def Forget_Port(port, cache_file = None):
+    """
+    Remove port from the discovery cache, e.g. when the pty of an IBM4_Emulator is closed
+    """
+
+    cache_file = CACHE_FILE if cache_file is None else cache_file
+    try:
+        cache = Read_Cache(cache_file)
+        cache = {key:[p for p in ports if p != port] for key, ports in cache.items()}
+        cache = {key:ports for key, ports in cache.items() if len(ports) > 0}
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w') as the_file:
+            json.dump(cache, the_file, indent = 1)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+def Cached_Ports(cache_file = None):
+    """
+    List the ports recorded in the discovery cache, most recently used first
+    """
+
+    ports = []
+    for key, vals in Read_Cache(cache_file).items():
+        for port in vals:
+            if port not in ports:
+                ports.append(port)
+    return ports
+
+def Find_All_IBM4(loud = False, max_workers = 16, timeout = 0.25, use_cache = True, baud_rate = 9600):
+    """
+    Probe all candidate ports concurrently and return every IBM4 found
+
+    Returns a list of (port, IDN string) pairs, in the order of Candidate_Ports
+    """
+
+    FUNC_NAME = ".Find_All_IBM4()" # use this in exception handling messages
+    ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+    try:
+        ports = Candidate_Ports()
+        if use_cache:
+            ports = ports + [p for p in Cached_Ports() if p not in ports] # the cache may name ports that are not listed, e.g. an emulator pty
+        if loud: print('Probing', len(ports), 'ports')
+
+        found = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, min(max_workers, len(ports)))) as pool:
+            idns = list( pool.map(lambda p: Probe_Port(p, timeout, baud_rate), ports) )
+        for port, idn in zip(ports, idns):
+            if idn is not None:
+                if loud: print(f'IBM4 found at {port}')
+                found.append( (port, idn) )
+
+        if use_cache and len(found) > 0:
+            Write_Cache(found)
+        return found
+    except Exception as e:
+        print(ERR_STATEMENT)
+        print(e)
+        return []
+
+def Find_IBM4(loud = False, timeout = 0.25, use_cache = True, baud_rate = 9600):
+    """
+    Return the port of the first IBM4 found, or None
+
+    The ports in the discovery cache are tried first, one at a time, only if none of them answers are all the candidate ports probed
+    """
+
+    if use_cache:
+        for port in Cached_Ports():
+            if loud: print('Trying cached port: ',port)
+            idn = Probe_Port(port, timeout, baud_rate)
+            if idn is not None:
+                if loud: print(f'IBM4 found at {port}')
+                Write_Cache( [(port, idn)] )
+                return port
+
+    found = Find_All_IBM4(loud, timeout = timeout, use_cache = use_cache, baud_rate = baud_rate)
+    return found[0][0] if len(found) > 0 else None
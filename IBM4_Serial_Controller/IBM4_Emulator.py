@@ -0,0 +1,418 @@
+"""
+Software emulation of an IBM4 on a pseudo-terminal
+
+Every method of IBM4_Lib.Ser_Iface needs a physical IBM4 attached to the PC.
+An Emulator opens a pty and answers the commands sent by Ser_Iface, IBM4_Async, IBM4_Pipeline and IBM4_Stream in the same way
+as the IBM4 circuit python code, so that the host side can be tested and benchmarked without a board, e.g.
+
+with IBM4_Emulator.Emulator() as emu:
+    the_dev = IBM4_Lib.Ser_Iface(emu.port)
+    print(the_dev.ReadAverageVoltage('A2', 100))
+
+Start() registers the pty in the IBM4_Discovery cache so that Ser_Iface() and FindIBM4 find the emulator without being told its port,
+Stop() removes it again. The emulator can also be run as a separate process, python IBM4_Emulator.py --help
+
+The emulator echoes each command line and then writes its reply, one value per line.
+A Circuit wires the analog outputs A0, A1 to the analog inputs, each input follows its output through a gain and an offset
+with a first order response of time constant tau, plus gaussian noise, and is quantised by a 16 bit ADC.
+Reply timing is modelled as
+latency per command + sample_time per value read + byte_time per byte of reply
+with byte_time = 10 / baud rate when uart = True, i.e. a board reached through a UART bridge at the baud rate selected by the host.
+The IBM4 works on one command at a time, so these times add up over a run of commands.
+link_latency is the round trip delay of the link itself, e.g. USB polling, which delays each reply
+without holding up the next command, so that it is hidden when commands are pipelined
+
+Assumptions where the behaviour of the circuit python code is not recorded here:
+values are written as %0.4f (voltages) or %d (binary), AC mode reports (V - VMAX/2)*AC_GAIN,
+a line that is not a known command is echoed with no reply
+"""
+
+# pseudo-terminals
+# https://docs.python.org/3/library/os.html#os.openpty
+# https://docs.python.org/3/library/pty.html
+
+import os
+import re
+import sys
+import time
+import select
+import queue
+import threading
+import numpy
+import IBM4_Lib
+import IBM4_Discovery
+
+MOD_NAME_STR = "IBM4_Emulator"
+
+DEFAULT_IDN = b'ISBY-UCC-Emulator'
+
+ADC_MAX = IBM4_Lib.ADC_MAX # full scale reading of the 16 bit ADC
+AC_GAIN = IBM4_Lib.VMAX_AC/(0.5*IBM4_Lib.VMAX) # AC mode maps [0, VMAX) onto [-VMAX_AC, +VMAX_AC]
+
+# input channel : (output channel driving it or None, gain, offset in V)
+DEFAULT_WIRING = {"A2":("A0", 1.0, 0.0), "A3":("A0", 0.5, 0.0), "A4":("A1", 1.0, 0.0), "A5":("A1", 0.5, 0.0), "D2":(None, 0.0, 0.0)}
+
+# The commands understood by the emulator, see the command strings in IBM4_Lib
+IDN_RE = re.compile(rb'^\*IDN$')
+ZERO_RE = re.compile(rb'^([ab])0$')
+MODE_RE = re.compile(rb'^Mode(\d+)$')
+WRITE_RE = re.compile(rb'^Write(\d+):([-+]?\d*\.?\d+)$')
+PWM_RE = re.compile(rb'^PWM(\d+):(\d+)$')
+READ_RE = re.compile(rb'^(Read|BRead|Average)(\d+):(\d+)$')
+DIFF_RE = re.compile(rb'^Diff_(Read|BRead|Average)(\d+):(\d+):(\d+)$')
+
+class Circuit(object):
+    """
+    Model of the circuit connecting the IBM4 analog outputs to its analog inputs
+    """
+
+    def __init__(self, wiring = None, tau = 0.0, noise = 0.001, seed = None):
+        """
+        Constructor for the Circuit object
+
+        wiring (type: dict) input channel : (output channel or None, gain, offset), defaults to DEFAULT_WIRING
+        tau (type: float) time constant of the response of each input to a step at its output, units of second
+        noise (type: float) standard deviation of the noise added to each reading, units of V
+        seed is passed to numpy.random.default_rng so that a run can be repeated
+        """
+
+        self.wiring = dict(DEFAULT_WIRING) if wiring is None else dict(wiring)
+        self.tau = tau
+        self.noise = noise
+        self.rng = numpy.random.default_rng(seed)
+        # output channel : [voltage before the last step, voltage set by the last step, time of the last step]
+        self.outputs = {chnnl:[0.0, 0.0, 0.0] for chnnl in IBM4_Lib.WRITE_CHNNLS}
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 circuit model, tau = %(v1)0.3g s, noise = %(v2)0.3g V"%{"v1":self.tau, "v2":self.noise}
+
+    def Node(self, output_channel, times):
+        """
+        Voltage at output_channel at each of the times, a numpy array, times are time.monotonic() values
+        """
+
+        v_from, v_to, t_set = self.outputs[output_channel]
+        if self.tau <= 0.0:
+            return numpy.full(len(times), v_to)
+        return v_to + (v_from - v_to)*numpy.exp( -numpy.maximum(times - t_set, 0.0)/self.tau )
+
+    def SetOutput(self, output_channel, set_voltage, t_set):
+        """
+        Step output_channel to set_voltage at time t_set, the step starts from the voltage present at t_set
+        """
+
+        v_now = float( self.Node(output_channel, numpy.array([t_set]))[0] )
+        self.outputs[output_channel] = [v_now, set_voltage, t_set]
+
+    def Sample(self, input_channel, times):
+        """
+        Read input_channel at each of the times
+
+        Returns the ADC codes, a numpy int64 array
+        """
+
+        source, gain, offset = self.wiring.get(input_channel, (None, 0.0, 0.0))
+        volts = numpy.full(len(times), offset) if source is None else gain*self.Node(source, times) + offset
+        if self.noise > 0.0:
+            volts = volts + self.rng.normal(0.0, self.noise, len(times))
+        return numpy.rint( numpy.clip(volts/IBM4_Lib.VMAX, 0.0, 1.0)*ADC_MAX ).astype(numpy.int64)
+
+class Emulator(object):
+    """
+    An IBM4 emulated on a pseudo-terminal
+    """
+
+    def __init__(self, idn = DEFAULT_IDN, circuit = None, latency = 0.001, sample_time = 2.0e-5, byte_time = 0.0, uart = False, register = True, link_latency = 0.0):
+        """
+        Constructor for the Emulator object, the pty is opened by Start()
+
+        idn (type: bytes) is the reply to *IDN, it must contain ISBY for the emulator to be recognised as an IBM4
+        circuit (type: Circuit) is the model of the circuit attached to the outputs, defaults to Circuit()
+        latency (type: float) time taken to start answering each command, units of second
+        sample_time (type: float) time taken per value read, units of second
+        byte_time (type: float) time taken to send each byte of a reply, units of second
+        uart = True => byte_time is taken from the baud rate selected by the host, 10 bits per byte
+        register = True => the pty is recorded in the IBM4_Discovery cache while the emulator is running
+        link_latency (type: float) round trip delay of the link, added to the arrival of each reply, units of second
+        """
+
+        self.idn = idn
+        self.circuit = Circuit() if circuit is None else circuit
+        self.latency = latency
+        self.sample_time = sample_time
+        self.byte_time = byte_time
+        self.uart = uart
+        self.register = register
+        self.link_latency = link_latency
+
+        self.port = None # name of the pty opened by Start()
+        self.master = None
+        self.slave = None
+        self.thread = None
+        self.sender = None
+        self.outbox = queue.Queue() # (time at which the bytes reach the host, bytes) written by the sender thread
+        self.running = False
+
+        # state of the emulated IBM4
+        self.read_mode = IBM4_Lib.READ_MODES['DC']
+        self.pwm = {}
+        self.commands = 0 # no. commands answered
+        self.unknown = 0 # no. lines that were not a known command
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 emulator at %(v1)s"%{"v1":self.port}
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+    def Start(self):
+        """
+        Open the pty and start answering commands
+
+        Returns the name of the pty, or None if it could not be opened
+        """
+
+        FUNC_NAME = ".Start()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            if self.running:
+                return self.port
+            if not hasattr(os, 'openpty'):
+                ERR_STATEMENT = ERR_STATEMENT + '\nPseudo-terminals are not available on ' + sys.platform
+                raise OSError('os.openpty not available')
+
+            import tty
+            self.master, self.slave = os.openpty()
+            tty.setraw(self.slave) # no echo or line editing by the terminal driver, the emulator does its own echo
+            self.port = os.ttyname(self.slave) # the slave end is held open so that the host can close and reopen the port
+            self.running = True
+            self.thread = threading.Thread(target = self._Run, name = MOD_NAME_STR, daemon = True)
+            self.thread.start()
+            self.sender = threading.Thread(target = self._Sender, name = MOD_NAME_STR + '_sender', daemon = True)
+            self.sender.start()
+            if self.register:
+                IBM4_Discovery.Write_Cache( [(self.port, self.idn)] )
+            return self.port
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+            return None
+
+    def Stop(self):
+        """
+        Stop answering commands and close the pty
+        """
+
+        if self.running:
+            self.running = False
+            self.thread.join()
+            self.outbox.put(None)
+            self.sender.join()
+            if self.register:
+                IBM4_Discovery.Forget_Port(self.port)
+            os.close(self.master)
+            os.close(self.slave)
+            self.master = self.slave = None
+
+    def _Run(self):
+        """
+        Read command lines from the pty and answer them in order
+        """
+
+        FUNC_NAME = "._Run()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        buffer = bytearray()
+        t_free = 0.0 # time at which the emulated IBM4 finishes the command it is working on
+        try:
+            while self.running:
+                ready, _, _ = select.select([self.master], [], [], 0.05)
+                if len(ready) == 0:
+                    continue
+                buffer.extend( os.read(self.master, 4096) )
+                while True:
+                    idx = buffer.find(b'\n')
+                    if idx < 0:
+                        break
+                    line = bytes(buffer[:idx]).strip()
+                    del buffer[:idx + 1]
+                    if len(line) == 0:
+                        continue
+                    # the IBM4 answers one command at a time, a command queued behind another starts when that one is finished
+                    t_start = max(time.monotonic(), t_free)
+                    self._Send(line + b'\r\n', t_start)
+                    reply, no_samples = self.Respond(line, t_start + self.latency)
+                    t_free = t_start + self.latency + no_samples*self.sample_time
+                    self._Send(reply, t_free)
+        except OSError as e:
+            if self.running:
+                print(ERR_STATEMENT)
+                print(e)
+        finally:
+            self.running = False
+
+    def _ByteTime(self):
+        """
+        Time taken to send one byte, units of second
+        """
+
+        if self.uart:
+            import termios
+            baud = termios.tcgetattr(self.slave)[5] # the output speed set by the host, a termios B* constant
+            rate = next( (r for r in IBM4_Lib.BAUD_RATES if getattr(termios, 'B%d'%(r), None) == baud), IBM4_Lib.DEFAULT_BAUD )
+            return 10.0/rate
+        return self.byte_time
+
+    def _Send(self, data, t_ready):
+        """
+        Queue data to be written to the pty once t_ready has passed and the link latency has elapsed
+        """
+
+        if len(data) > 0:
+            self.outbox.put( (t_ready + self.link_latency, data) )
+
+    def _Sender(self):
+        """
+        Write the queued replies to the pty, in order, paced at the byte time of the link
+        """
+
+        block = 256
+        t_ready = 0.0
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                return
+            t_ready = max(t_ready, item[0]) # a reply cannot overtake the one before it
+            data = item[1]
+            byte_time = self._ByteTime()
+            try:
+                for start in range(0, len(data), block):
+                    part = data[start:start + block]
+                    delay = t_ready - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    os.write(self.master, part)
+                    t_ready = max(t_ready, time.monotonic()) + len(part)*byte_time
+            except OSError:
+                pass # the pty was closed by Stop()
+
+    def Respond(self, line, t_start):
+        """
+        Carry out the command in line, the readings begin at time t_start
+
+        Returns the reply as bytes, excluding the echo, and the no. of values read
+        """
+
+        self.commands = self.commands + 1
+
+        if IDN_RE.match(line):
+            return self.idn + b'\r\n', 0
+
+        m = ZERO_RE.match(line)
+        if m:
+            self.circuit.SetOutput('A0' if m.group(1) == b'a' else 'A1', 0.0, t_start)
+            return b'', 0
+
+        m = MODE_RE.match(line)
+        if m:
+            self.read_mode = int(m.group(1))
+            return b'', 0
+
+        m = WRITE_RE.match(line)
+        if m:
+            chnnl = [k for k, v in IBM4_Lib.WRITE_CHNNLS.items() if v == int(m.group(1))]
+            if len(chnnl) > 0:
+                self.circuit.SetOutput(chnnl[0], min(max(float(m.group(2)), IBM4_Lib.VMIN), IBM4_Lib.VMAX), t_start)
+            return b'', 0
+
+        m = PWM_RE.match(line)
+        if m:
+            self.pwm[int(m.group(1))] = int(m.group(2))
+            return b'', 0
+
+        m = READ_RE.match(line)
+        if m:
+            kind, no_reads = m.group(1), max(1, int(m.group(3)))
+            codes = self._Codes(int(m.group(2)), no_reads, t_start)
+            return self._Format(kind, codes, True), no_reads
+
+        m = DIFF_RE.match(line)
+        if m:
+            kind, no_reads = m.group(1), max(1, int(m.group(4)))
+            codes = self._Codes(int(m.group(2)), no_reads, t_start) - self._Codes(int(m.group(3)), no_reads, t_start)
+            return self._Format(kind, codes, False), 2*no_reads
+
+        self.unknown = self.unknown + 1
+        return b'', 0
+
+    def _Codes(self, chnnl_no, no_reads, t_start):
+        """
+        ADC codes of no_reads readings of the input channel numbered chnnl_no, spaced by sample_time from t_start
+        """
+
+        chnnl = [k for k, v in IBM4_Lib.READ_CHNNLS.items() if v == chnnl_no]
+        times = t_start + self.sample_time*numpy.arange(no_reads)
+        return self.circuit.Sample(chnnl[0], times) if len(chnnl) > 0 else numpy.zeros(no_reads, dtype = numpy.int64)
+
+    def _Format(self, kind, codes, single_ended):
+        """
+        The reply to a Read, BRead or Average command, one value per line
+        """
+
+        if kind == b'BRead':
+            return b''.join([b'%d\r\n'%(c) for c in codes.tolist()])
+        volts = codes*(IBM4_Lib.VMAX/ADC_MAX)
+        if single_ended and self.read_mode == IBM4_Lib.READ_MODES['AC']:
+            volts = (volts - 0.5*IBM4_Lib.VMAX)*AC_GAIN
+        elif not single_ended and self.read_mode == IBM4_Lib.READ_MODES['AC']:
+            volts = volts*AC_GAIN
+        if kind == b'Average':
+            return b'%0.4f\r\n'%(float(numpy.mean(volts)))
+        return b''.join([b'%0.4f\r\n'%(v) for v in volts.tolist()])
+
+def main():
+    """
+    Run an emulator until interrupted, e.g. for use by a test running in another process
+    """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Emulate an IBM4 on a pseudo-terminal')
+    parser.add_argument('--idn', default = DEFAULT_IDN.decode(), help = 'reply to *IDN, must contain ISBY')
+    parser.add_argument('--latency', type = float, default = 0.001, help = 'time to start answering each command (s)')
+    parser.add_argument('--link-latency', type = float, default = 0.0, help = 'round trip delay of the link (s)')
+    parser.add_argument('--sample-time', type = float, default = 2.0e-5, help = 'time per value read (s)')
+    parser.add_argument('--byte-time', type = float, default = 0.0, help = 'time per byte of reply (s)')
+    parser.add_argument('--uart', action = 'store_true', help = 'take the byte time from the baud rate selected by the host')
+    parser.add_argument('--tau', type = float, default = 0.0, help = 'time constant of the circuit (s)')
+    parser.add_argument('--noise', type = float, default = 0.001, help = 'standard deviation of the noise on each reading (V)')
+    parser.add_argument('--seed', type = int, default = None, help = 'seed for the noise')
+    parser.add_argument('--no-register', action = 'store_true', help = 'do not record the pty in the discovery cache')
+    args = parser.parse_args()
+
+    emu = Emulator(str.encode(args.idn), Circuit(tau = args.tau, noise = args.noise, seed = args.seed), args.latency,
+                   args.sample_time, args.byte_time, args.uart, not args.no_register, args.link_latency)
+    if emu.Start() is not None:
+        print('IBM4 emulator running at', emu.port, flush = True)
+        try:
+            while emu.running:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        emu.Stop()
+
+if __name__ == '__main__':
+    main()
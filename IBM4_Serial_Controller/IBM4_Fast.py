@@ -0,0 +1,284 @@
+"""
+Low latency command path for tight loops
+
+Each call of a Ser_Iface read or write method formats its command into a str, encodes it as bytes,
+runs its c1 .. c10 checks with their dictionary lookups and builds a new IBM4_Framing.Request, on every call.
+At high call rates, e.g. in a control loop, this host side overhead is a noticeable part of each call.
+
+A FastPath moves that work to plan time. The channels, read type and no_reads are validated once when a Reader or Writer is made,
+and the command bytes are encoded then. A Reader sends its pre-encoded command and reuses its Request and its output array on every call,
+a Writer looks up the command for a set voltage in a table of every 0.01V step of the output, encoded in advance. e.g.
+
+fast = the_dev.FastPath()
+read_A2 = fast.Reader('A2') # validated and encoded once
+write_A0 = fast.Writer('A0')
+for i in range(1000):
+    write_A0( 0.5*read_A2() )
+
+Readers and Writers are cached by their arguments, asking twice for the same combination returns the same object.
+Errors at plan time are printed and None is returned, as for the Ser_Iface methods,
+errors at call time, e.g. a voltage out of range or a timeout, raise an exception so that a tight loop does not run on with bad values.
+The array returned by a multiple read Reader is overwritten by its next call, copy it to keep it.
+IBM4_Benchmark.Command_Benchmark compares the per call host overhead with that of the Ser_Iface methods
+"""
+
+import numpy
+import IBM4_Lib
+import IBM4_Decode
+import IBM4_Framing
+
+MOD_NAME_STR = "IBM4_Fast"
+
+NO_RECYCLE = 8 # no. of Requests cycled by each Writer, the echo of a write may still be awaited when the next write is sent
+
+# command strings, no. of reads fixed to 1 or not, values are ints or not, one per read type in IBM4_Lib.READ_TYPES
+READ_PLANS = {"Single Voltage":(IBM4_Lib.READ_CMD, IBM4_Lib.DIFF_READ_CMD, True, False),
+              "Multiple Voltage":(IBM4_Lib.READ_CMD, IBM4_Lib.DIFF_READ_CMD, False, False),
+              "Average Voltage":(IBM4_Lib.AVERAGE_CMD, IBM4_Lib.DIFF_AVERAGE_CMD, False, False),
+              "Single Binary":(IBM4_Lib.BREAD_CMD, IBM4_Lib.DIFF_BREAD_CMD, True, True),
+              "Multiple Binary":(IBM4_Lib.BREAD_CMD, IBM4_Lib.DIFF_BREAD_CMD, False, True)}
+
+class Reader(object):
+    """
+    A read command encoded once and sent with a reused Request
+    """
+
+    def __init__(self, the_dev, command, no_reads, scalar, binary):
+        """
+        Constructor for the Reader object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4
+        command (type: str) is the validated read command
+        no_reads (type: int) is the no. of values in the reply
+        scalar (type: bool) the reply is a single value, returned as a float or int
+        binary (type: bool) the values are ints
+        """
+
+        self.dev = the_dev
+        self.cmd = str.encode(command)
+        self.no_reads = no_reads
+        self.scalar = scalar
+        self.binary = binary
+        self.req = IBM4_Framing.Request(self.cmd, no_vals = no_reads)
+        self.out = None if scalar else numpy.zeros(no_reads, dtype = numpy.int64 if binary else numpy.float64)
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 fast reader %(v1)s"%{"v1":self.req.command.decode()}
+
+    def __call__(self):
+        """
+        Send the command and return the reply, a float / int for single reads and averages, the reused output array otherwise
+        Raises TimeoutError if the reply is not complete within read_timeout
+        """
+
+        dev = self.dev
+        req = self.req
+        with dev.io_lock:
+            req.Rearm()
+            dev.framer.Register(req)
+            dev._Write(self.cmd)
+            instr = dev.instr_obj
+            while req.state != IBM4_Framing.COMPLETE:
+                data = instr.read( max(1, instr.in_waiting) ) # blocks for at most read_timeout
+                if len(data) == 0:
+                    dev.link_stats.Timeout()
+                    dev.framer.Discard(req)
+                    self.req = IBM4_Framing.Request(self.cmd, no_vals = self.no_reads) # req waits in the framer for its late reply
+                    raise TimeoutError('No reply to ' + req.command.decode())
+                dev._Feed(data)
+        if self.scalar:
+            return int(req.body) if self.binary else float(req.body)
+        vals = IBM4_Decode.Decode_Ints(req.body, self.no_reads) if self.binary else IBM4_Decode.Decode_Floats(req.body, self.no_reads)
+        self.out[:] = vals
+        return self.out
+
+class Writer(object):
+    """
+    Table of pre-encoded commands for every output code, sent with recycled Requests
+    """
+
+    def __init__(self, the_dev, commands, scale, v_min, v_max, offset = 0.5):
+        """
+        Constructor for the Writer object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4
+        commands (type: list) the encoded command for each code, code = int(value*scale + offset)
+        offset = 0.5 rounds value to the nearest code, offset = 0.0 truncates it
+        v_min, v_max the values accepted are v_min <= value < v_max
+        """
+
+        self.dev = the_dev
+        self.cmds = commands
+        self.echoes = [cmd.strip() for cmd in commands]
+        self.scale = scale
+        self.offset = offset
+        self.v_min = v_min
+        self.v_max = v_max
+        self.reqs = [IBM4_Framing.Request(self.echoes[0]) for i in range(NO_RECYCLE)]
+        for req in self.reqs:
+            req.state = IBM4_Framing.COMPLETE # free for use
+        self.idx = 0
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 fast writer %(v1)s"%{"v1":self.echoes[0].decode()}
+
+    def __call__(self, value):
+        """
+        Send the command for value, raises ValueError if value is outside [v_min, v_max)
+        """
+
+        if not (value >= self.v_min and value < self.v_max):
+            raise ValueError('%(v1)s outside range [%(v2)s, %(v3)s)'%{"v1":value, "v2":self.v_min, "v3":self.v_max})
+        code = int(value*self.scale + self.offset)
+        dev = self.dev
+        with dev.io_lock:
+            req = self.reqs[self.idx]
+            if req.state < IBM4_Framing.COMPLETE:
+                req = IBM4_Framing.Request(self.echoes[code]) # still awaiting its echo, e.g. a long run of writes with no read, use a new one
+            else:
+                self.idx = (self.idx + 1) % NO_RECYCLE
+                req.command = self.echoes[code]
+                req.Rearm()
+            dev.framer.Register(req)
+            dev._Write(self.cmds[code])
+            # frame whatever has already arrived so that echoes do not accumulate over a long run of writes
+            if dev.instr_obj.in_waiting > 0:
+                dev._Feed( dev.instr_obj.read(dev.instr_obj.in_waiting) )
+
+class FastPath(object):
+    """
+    Factory and cache of the Readers and Writers of one IBM4
+    """
+
+    def __init__(self, the_dev):
+        """
+        Constructor for the FastPath object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4
+        """
+
+        self.dev = the_dev
+        self.readers = {} # (input_channel, neg_channel, read_type, no_reads) : Reader
+        self.writers = {} # output_channel : Writer
+        self.pwm = None
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 fast path, %(v1)d readers, %(v2)d writers"%{"v1":len(self.readers), "v2":len(self.writers)}
+
+    def Reader(self, input_channel, read_type = 'Single Voltage', no_reads = 1, neg_channel = None):
+        """
+        Return a Reader of input_channel, or of input_channel - neg_channel when neg_channel is given
+
+        read_type is one of the keys of IBM4_Lib.READ_TYPES, no_reads is ignored for the single reads
+        calling the Reader returns a float / int for single reads and averages and a numpy array of no_reads values for multiple reads
+        """
+
+        FUNC_NAME = ".Reader()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            plan = READ_PLANS.get(read_type)
+            no_reads = 1 if plan is not None and plan[2] else no_reads
+            key = (input_channel, neg_channel, read_type, no_reads)
+            if key in self.readers:
+                return self.readers[key]
+
+            c1 = True if self.dev.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if input_channel in IBM4_Lib.READ_CHNNLS else False # confirm that the input channel label is correct
+            c3 = True if neg_channel is None or (neg_channel in IBM4_Lib.READ_CHNNLS and neg_channel != input_channel) else False # confirm that the negative channel label is correct
+            c4 = True if plan is not None else False # confirm that the read_type has been chosen correctly
+            c5 = True if no_reads == 1 or (no_reads > 2 and no_reads < 10000) else False # confirm that no. reads is a sensible value
+            c10 = c1 and c2 and c3 and c4 and c5
+
+            if c10:
+                single_cmd, diff_cmd, single, binary = plan
+                if neg_channel is None:
+                    command = single_cmd%{"v1":IBM4_Lib.READ_CHNNLS[input_channel], "v2":no_reads}
+                else:
+                    command = diff_cmd%{"v1":IBM4_Lib.READ_CHNNLS[input_channel], "v2":IBM4_Lib.READ_CHNNLS[neg_channel], "v3":no_reads}
+                average = read_type == 'Average Voltage'
+                reader = Reader(self.dev, command, 1 if average else no_reads, single or average, binary)
+                self.readers[key] = reader
+                return reader
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nneg_channel outside range {A2, A3, A4, A5, D2} or equal to input_channel'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nread_type not recognised'
+                if not c5:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def Writer(self, output_channel):
+        """
+        Return a Writer that sets the voltage at output_channel, calling it with set_voltage in [0.0, 3.3) sends the command encoded for set_voltage
+        """
+
+        FUNC_NAME = ".Writer()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            if output_channel in self.writers:
+                return self.writers[output_channel]
+
+            c1 = True if self.dev.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if output_channel in IBM4_Lib.WRITE_CHNNLS else False # confirm that the output channel label is correct
+            c10 = c1 and c2
+
+            if c10:
+                # the command for every 0.01V step, formatted exactly as WriteVoltage formats it
+                scale = 1.0/IBM4_Lib.DELTA_VMIN
+                no_codes = int(IBM4_Lib.VMAX*scale + 0.5) + 1
+                cmds = [str.encode( IBM4_Lib.WRITE_CMD%{"v1":IBM4_Lib.WRITE_CHNNLS[output_channel], "v2":code/scale} ) for code in range(no_codes)]
+                writer = Writer(self.dev, cmds, scale, IBM4_Lib.VMIN, IBM4_Lib.VMAX)
+                self.writers[output_channel] = writer
+                return writer
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\noutput_channel outside range {A0, A1}'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def PWMWriter(self):
+        """
+        Return a Writer that sets the PWM output at D9, calling it with percentage in [0, 101) sends the command encoded for percentage
+        """
+
+        FUNC_NAME = ".PWMWriter()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            if self.pwm is None:
+                if not self.dev.instr_obj.isOpen():
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                    raise Exception
+                # PWM_CMD formats the percentage with %d, i.e. truncates it
+                cmds = [str.encode( IBM4_Lib.PWM_CMD%{"v1":IBM4_Lib.PWM_CHNNLS["D9"], "v2":code} ) for code in range(101)]
+                self.pwm = Writer(self.dev, cmds, 1.0, 0, 101, offset = 0.0)
+            return self.pwm
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
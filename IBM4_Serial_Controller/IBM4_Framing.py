@@ -0,0 +1,339 @@
+"""
+Framing of the replies returned by the IBM4
+
+The IBM4 echoes each command line that it receives and then writes its reply, one value per line.
+A ReplyFramer keeps a list of the commands that have been sent and are awaiting a reply, it is fed the bytes
+received from the serial link and works out which bytes belong to which command and when each reply is complete.
+Commands are answered in the order in which they are sent.
+
+Each Request moves through the states
+AWAIT_ECHO => AWAIT_BODY => COMPLETE
+or is moved to DISCARDED if its reply never arrives, e.g. after a timeout.
+A discarded request is kept in the list, for at most DISCARD_EXPIRY seconds, so that it absorbs its own late echo and reply,
+which would otherwise be taken as the reply to the next request when that is the same command, e.g. Read1:1 repeated.
+The oldest pending request is the only one that can receive bytes. A line received while the oldest request is in AWAIT_ECHO
+that is not its echo is stale, e.g. left over from a reply that timed out, and is dropped.
+A line received when no request is pending is unsolicited and is dropped.
+This replaces the calls to ResetBuffer and the searches for ISBY / vals[-1] that were used to work around stale bytes
+"""
+
+import re
+import time
+import collections
+import IBM4_Decode
+
+MOD_NAME_STR = "IBM4_Framing"
+
+# States of a Request
+AWAIT_ECHO = 0
+AWAIT_BODY = 1
+COMPLETE = 2
+DISCARDED = 3
+
+# replies of at most SMALL_REPLY values, e.g. single reads and averages, are located line by line with NUMBER_RE
+# the vectorised scan of IBM4_Decode costs more than it saves on a reply of a few bytes
+SMALL_REPLY = 8
+NUMBER_RE = re.compile(rb'[-+]?\d+\.?\d*') # locates the same numbers as IBM4_Decode
+
+# time for which a discarded request waits for its late reply, units of second
+DISCARD_EXPIRY = 5.0
+
+def Reply_Values(body):
+    """
+    Return the numbers in body, the reply to a command returning at most SMALL_REPLY values, as a list of bytes, e.g. float(Reply_Values(body)[-1])
+    A reply of one value is converted far faster this way than by the vectorised scan of IBM4_Decode, which is kept for the multi-reads
+    """
+
+    return NUMBER_RE.findall(body)
+
+class Request(object):
+    """
+    An IBM4 command awaiting its reply
+    """
+
+    def __init__(self, command, no_vals = 0, no_lines = 0):
+        """
+        Constructor for the Request object
+
+        command (type: bytes) is the command line sent to the IBM4
+        no_vals (type: int) is the number of numeric values expected in the reply
+        no_lines (type: int) is the number of lines expected in the reply
+        no_vals = no_lines = 0 => the reply consists of the echoed command only, e.g. Write, PWM
+        """
+
+        self.command = command.strip() # the echo of the command is compared against this
+        self.no_vals = no_vals
+        self.no_lines = no_lines
+        self.state = AWAIT_ECHO
+        self.vals_seen = 0 # no. values received so far
+        self.lines_seen = 0 # no. lines received so far
+        self.body = bytearray() # the reply, excluding the echoed command
+        self.t_sent = time.perf_counter() # time at which the request was registered, used to measure its latency
+        self.expires = None # time after which a discarded request stops waiting for its late reply, None while the reply is awaited
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 request %(v1)s"%{"v1":self.command}
+
+    @property
+    def echoed(self):
+        return self.state != AWAIT_ECHO
+
+    @property
+    def complete(self):
+        return self.state == COMPLETE
+
+    def Rearm(self):
+        """
+        Clear the reply so that the Request can be registered again, see ReplyFramer.Register
+        the body bytearray is emptied rather than replaced so that its memory is reused
+        """
+
+        self.state = AWAIT_ECHO
+        self.vals_seen = 0
+        self.lines_seen = 0
+        del self.body[:]
+        self.t_sent = time.perf_counter()
+        self.expires = None
+
+    def EchoOnly(self):
+        """
+        Is the reply to the command just the echo of the command
+        """
+
+        return self.no_vals == 0 and self.no_lines == 0
+
+    def Done(self):
+        """
+        Has the full reply been received, once the echo has been seen
+        """
+
+        if self.no_vals > 0:
+            return self.vals_seen >= self.no_vals
+        if self.no_lines > 0:
+            return self.lines_seen >= self.no_lines
+        return True
+
+class ReplyFramer(object):
+    """
+    Match the bytes received from the IBM4 to the commands that were sent
+    """
+
+    def __init__(self, echo = True):
+        """
+        Constructor for the ReplyFramer object
+
+        echo (type: bool) does the IBM4 echo each command before replying
+        """
+
+        self.echo = echo
+        self.buffer = bytearray() # bytes received but not yet assigned to a reply
+        self.pending = collections.deque() # requests awaiting a reply, oldest first
+        self.stale_lines = 0 # no. lines dropped while waiting for an echo
+        self.unsolicited_lines = 0 # no. lines dropped because no request was pending
+        self.lost_echoes = 0 # no. echo-only requests taken as complete without their echo
+        self.discarded = 0 # no. requests discarded before their reply was complete
+        self.late_replies = 0 # no. replies to discarded requests that arrived and were dropped
+
+    def Expect(self, command, no_vals = 0, no_lines = 0):
+        """
+        Register a command that has been, or is about to be, sent to the IBM4
+
+        Returns the Request object that will hold the reply
+        """
+
+        return self.Register( Request(command, no_vals, no_lines) )
+
+    def Register(self, req):
+        """
+        Register a Request built by the caller, e.g. one that is rearmed and reused for every call of a command, see IBM4_Fast
+
+        Returns req
+        """
+
+        if not self.echo:
+            req.state = COMPLETE if req.EchoOnly() else AWAIT_BODY
+        if not req.complete:
+            self.pending.append(req)
+        return req
+
+    def Discard(self, req):
+        """
+        Stop waiting for the reply to req, e.g. after a timeout
+        req stays in the list of pending requests, so that its echo and reply, if they arrive within DISCARD_EXPIRY seconds, are dropped
+        rather than taken as the reply to a later request, and is then marked DISCARDED. A discarded req must not be registered again
+        """
+
+        if req.expires is None and req in self.pending:
+            req.expires = time.perf_counter() + DISCARD_EXPIRY
+            self.discarded = self.discarded + 1
+
+    def Reset(self):
+        """
+        Discard all pending requests and all buffered bytes
+        """
+
+        for req in self.pending:
+            req.state = DISCARDED
+        self.discarded = self.discarded + len(self.pending)
+        self.pending.clear()
+        self.buffer.clear()
+
+    def Outstanding(self):
+        """
+        Are any requests awaiting a reply, discarded requests waiting for their late reply are not counted
+        """
+
+        return any([req.expires is None for req in self.pending])
+
+    def Counters(self):
+        """
+        Return a dictionary of the framing counters
+        """
+
+        return {"stale_lines":self.stale_lines, "unsolicited_lines":self.unsolicited_lines,
+                "lost_echoes":self.lost_echoes, "discarded":self.discarded, "late_replies":self.late_replies,
+                "pending":len([req for req in self.pending if req.expires is None])}
+
+    def Feed(self, data):
+        """
+        Process bytes received from the IBM4
+
+        Returns a list of the requests whose replies were completed by data
+        """
+
+        self.buffer.extend(data)
+        completed = []
+        while True:
+            if len(self.pending) == 0:
+                # no request is waiting, any complete lines are unsolicited
+                last = self.buffer.rfind(b'\n')
+                if last > -1:
+                    self.unsolicited_lines = self.unsolicited_lines + self.buffer.count(b'\n', 0, last + 1)
+                    del self.buffer[:last + 1]
+                break
+
+            head = self.pending[0]
+            if head.expires is not None and time.perf_counter() > head.expires:
+                # the late reply never arrived, any part of it that does arrive is stale
+                self.pending.popleft()
+                head.state = DISCARDED
+                continue
+            if head.state == AWAIT_ECHO:
+                line = self._NextLine()
+                if line is None:
+                    break
+                if len(line) > 0:
+                    self._Echo(line, completed)
+            elif head.no_vals > 0:
+                if not self._Values(head):
+                    break
+            else:
+                line = self._NextLine()
+                if line is None:
+                    break
+                if len(line) > 0:
+                    head.body.extend(line + b'\r\n')
+                    head.lines_seen = head.lines_seen + 1
+            if len(self.pending) > 0 and self.pending[0].echoed and self.pending[0].Done():
+                self._Complete(completed)
+        return completed
+
+    def _NextLine(self):
+        """
+        Remove the next complete line from the buffer, returns None if no complete line has been received
+        """
+
+        idx = self.buffer.find(b'\n')
+        if idx < 0:
+            return None
+        line = bytes(self.buffer[:idx]).strip()
+        del self.buffer[:idx + 1]
+        return line
+
+    def _Echo(self, line, completed):
+        """
+        Match line against the echo of the oldest pending request
+        """
+
+        head = self.pending[0]
+        if line == head.command:
+            head.state = AWAIT_BODY
+            return
+        # The echo of a write command may never arrive, if line is the echo of a later request
+        # then the requests ahead of it, which must all be echo-only or discarded, are taken as complete
+        for i in range(1, len(self.pending), 1):
+            if not (self.pending[i - 1].EchoOnly() or self.pending[i - 1].expires is not None):
+                break
+            if line == self.pending[i].command:
+                for j in range(0, i, 1):
+                    if self.pending[0].expires is None:
+                        self.lost_echoes = self.lost_echoes + 1
+                    self._Complete(completed)
+                self.pending[0].state = AWAIT_BODY
+                return
+        self.stale_lines = self.stale_lines + 1
+
+    def _Values(self, head):
+        """
+        Move complete lines of values from the buffer into the body of head
+        Returns False if more bytes are needed
+        """
+
+        last = self.buffer.rfind(b'\n')
+        if last < 0:
+            return False
+        needed = head.no_vals - head.vals_seen
+        if self.buffer.count(b'\n', 0, last + 1) < needed:
+            # every value is followed by a newline, the reply cannot be complete yet
+            # leave the bytes in the buffer rather than scanning each small chunk as it arrives
+            return False
+        if needed <= SMALL_REPLY:
+            return self._FewValues(head, needed)
+        chunk = bytes(self.buffer[:last + 1])
+        ends = IBM4_Decode.Locate_Ends(chunk)
+        if ends.size < needed:
+            cut = last
+            head.vals_seen = head.vals_seen + ends.size
+        else:
+            cut = chunk.find(b'\n', ends[needed - 1])
+            head.vals_seen = head.no_vals
+        head.body.extend(chunk[:cut + 1])
+        del self.buffer[:cut + 1]
+        return head.vals_seen >= head.no_vals
+
+    def _FewValues(self, head, needed):
+        """
+        _Values for a reply of at most SMALL_REPLY values, the complete lines in the buffer are searched one at a time
+        Returns False if more bytes are needed
+        """
+
+        start = 0
+        found = 0
+        while found < needed:
+            end = self.buffer.find(b'\n', start)
+            if end < 0:
+                break
+            found = found + len( NUMBER_RE.findall(self.buffer, start, end) )
+            start = end + 1
+        head.vals_seen = min(head.no_vals, head.vals_seen + found)
+        head.body.extend(self.buffer[:start])
+        del self.buffer[:start]
+        return head.vals_seen >= head.no_vals
+
+    def _Complete(self, completed):
+        """
+        Mark the oldest pending request as complete
+        """
+
+        req = self.pending.popleft()
+        if req.expires is not None:
+            # the late reply to a discarded request, dropped
+            req.state = DISCARDED
+            self.late_replies = self.late_replies + 1
+            return
+        req.state = COMPLETE
+        completed.append(req)
@@ -62,6 +62,12 @@ R. Sheehan 11 - 6 - 2024
 # https://stackoverflow.com/questions/9989334/create-nice-column-output-in-python # use this one to format multimeter mode prompt
 # R. Sheehan 10 - 7 - 2024
 
+# The multi-read methods no longer cast read_result to str and run re.findall over it
+# at 5000 - 10000 samples per call the str / regex / numpy.float_ conversion cost almost as much as the serial transfer
+# the raw bytes are now handed to IBM4_Decode which locates and converts all the values in one vectorised pass
+# numpy.float_ has also been removed in numpy 2.0
+# see IBM4_Benchmark.Parse_Benchmark for a comparison of the two approaches
+
 # import required libraries
 from ast import Try
 import os
@@ -70,8 +76,91 @@ import glob
 import re
 import serial
 import time
+import threading
+import collections
 import numpy
 import Sweep_Interval
+import IBM4_Decode
+import IBM4_Discovery
+import IBM4_Framing
+import IBM4_Pipeline
+import IBM4_Stream
+import IBM4_Stats
+import IBM4_Calibration
+import IBM4_SweepFile
+import IBM4_Logger
+import IBM4_Timing
+
+# Dictionaries for the Read, Write, PWM Channels, the Read Modes and the Read Types
+# defined at module level so that every interface to the IBM4, e.g. IBM4_Async.AsyncSer_Iface, uses the same values
+READ_CHNNLS = {"A2":0, "A3":1, "A4":2, "A5":3, "D2":4}
+WRITE_CHNNLS = {"A0":0, "A1":1}
+PWM_CHNNLS = {"D5":5, "D7":7, "D9":9, "D10":10, "D11":11, "D12":12, "D13":13}
+READ_MODES = {"DC":0, "AC":1}
+READ_TYPES = {"Single Binary":0, "Multiple Binary":1, "Single Voltage":2, "Multiple Voltage":3, "Average Voltage":4}
+
+# Layout of the record returned by Ser_Iface.ScanAllChnnl, the host time of the scan followed by the averaged voltage at each analog input channel
+SCAN_DTYPE = numpy.dtype( [("t", numpy.float64)] + [(chnnl, numpy.float64) for chnnl in READ_CHNNLS] )
+
+# Baud rates tried by Ser_Iface.NegotiateBaud, fastest first
+# The IBM4 enumerates as a USB CDC serial device, for which the baud rate is nominal and data moves at USB speed
+# A board reached through a UART bridge, or firmware that configures its UART, is limited to roughly baud_rate / 10 bytes/s
+BAUD_RATES = [921600, 460800, 230400, 115200, 57600, 38400, 19200, 9600]
+DEFAULT_BAUD = 9600
+
+# Voltage Bounding Values
+VMAX = 3.3 # Max output voltage from IBM4
+VMIN = 0.0 # Min output voltage from IBM4
+DELTA_VMIN = 0.01 # Min voltage increment from IBM4
+VMAX_AC = 8.0 # Max magnitude of the input voltage in AC mode
+ADC_MAX = 65535 # full scale binary reading, see IBM4_Calibration
+
+# Command strings understood by the IBM4 circuit python code
+IDN_CMD = '*IDN\r\n'
+ZERO_CMDS = ['a0\r\n', 'b0\r\n']
+MODE_CMD = 'Mode%(v1)d\r\n'
+WRITE_CMD = 'Write%(v1)d:%(v2)0.2f\r\n'
+PWM_CMD = 'PWM%(v1)d:%(v2)d\r\n'
+READ_CMD = 'Read%(v1)d:%(v2)d\r\n'
+BREAD_CMD = 'BRead%(v1)d:%(v2)d\r\n'
+AVERAGE_CMD = 'Average%(v1)d:%(v2)d\r\n'
+DIFF_READ_CMD = 'Diff_Read%(v1)d:%(v2)d:%(v3)d\r\n'
+DIFF_BREAD_CMD = 'Diff_BRead%(v1)d:%(v2)d:%(v3)d\r\n'
+DIFF_AVERAGE_CMD = 'Diff_Average%(v1)d:%(v2)d:%(v3)d\r\n'
+
+# Acquisitions of 10000 or more reads, see Ser_Iface.ReadLong
+# the IBM4 accepts fewer than 10000 reads per command, so a long acquisition is split into commands of CHUNK_READS reads
+# CHUNK_WINDOW commands are kept in flight, the IBM4 starts the next chunk as soon as it has sent one and the host holds at most CHUNK_WINDOW replies
+# the reply to a chunk of n reads is given read_timeout + n*SAMPLE_TIME_MAX seconds, an Average sends nothing until all its reads are taken
+CHUNK_READS = 5000
+CHUNK_WINDOW = 4
+SAMPLE_TIME_MAX = 1.0e-3
+
+# Readings of several channels that are differenced, see Ser_Iface.DiffMatrix
+# the reads are taken in Read commands of DIFF_CHUNK reads that visit the channels in turn, so that reading k of each channel is taken
+# within a few ms of the others, the spread and standard deviation of a difference are then those of the pair rather than of the drift
+DIFF_CHUNK = 10
+
+def Diff_Matrix(block):
+    """
+    All-pairs differences of a block of readings taken on several channels
+
+    Inputs:
+    block (type: numpy array of shape (no_chnnls, no_reads)) row i holds the readings of channel i
+    diff_delta and diff_std are meaningful only if reading k of each channel is taken close together in time, e.g. by ReadBlock with a small chunk_size,
+    if each row is taken in one pass after the other, as by ReadBlock with chunk_size = None, only diff_mean is meaningful
+
+    Outputs:
+    diff_mean (type: numpy array of shape (no_chnnls, no_chnnls)) diff_mean[i, j] = mean of block[i] - block[j], antisymmetric
+    diff_delta (type: numpy array of shape (no_chnnls, no_chnnls)) half the range of block[i] - block[j], as returned by DiffReadMultiple
+    diff_std (type: numpy array of shape (no_chnnls, no_chnnls)) sample standard deviation of block[i] - block[j]
+    """
+
+    diffs = block[:, numpy.newaxis, :] - block[numpy.newaxis, :, :] # diffs[i, j] = block[i] - block[j]
+    diff_mean = numpy.mean(diffs, axis = -1)
+    diff_delta = 0.5*( numpy.max(diffs, axis = -1) - numpy.min(diffs, axis = -1) )
+    diff_std = numpy.std(diffs, axis = -1, ddof = 1) if block.shape[-1] > 1 else numpy.zeros(diff_mean.shape)
+    return diff_mean, diff_delta, diff_std
 
 # define the class for interfacing to an IBM4
 
@@ -85,7 +174,7 @@ class Ser_Iface(object):
     # constructor
     # opens a serial link to a known serial port      
     # define default arguments inside
-    def __init__(self, port_name = None, read_mode = 'DC'):
+    def __init__(self, port_name = None, read_mode = 'DC', baud_rate = DEFAULT_BAUD, negotiate_baud = False):
         """
         Constructor for the IBM4 Serial Interface
         
@@ -95,6 +184,9 @@ class Ser_Iface(object):
         read_mode is the reading mode of the IBM4 
         read_mode = 'DC' =>  IBM4 assumes analog inputs in the range [0, 3.3)
         read_mode = 'AC' =>  IBM4 assumes analog inputs in the range [-8, +8]
+
+        baud_rate is the baud rate used to open the link, and to search for the IBM4
+        negotiate_baud = True => once the link is open the fastest baud rate that the IBM4 answers at is selected, see NegotiateBaud
         """        
         try:
             self.MOD_NAME_STR = "IBM4_Lib"
@@ -102,26 +194,32 @@ class Ser_Iface(object):
             self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
 
             # Dictionaries for the Read, Write, PWM Channels
-            self.Read_Chnnls = {"A2":0, "A3":1, "A4":2, "A5":3, "D2":4}
-            self.Write_Chnnls = {"A0":0, "A1":1}
-            self.PWM_Chnnls = {"D5":5, "D7":7, "D9":9, "D10":10, "D11":11, "D12":12, "D13":13}
+            self.Read_Chnnls = READ_CHNNLS
+            self.Write_Chnnls = WRITE_CHNNLS
+            self.PWM_Chnnls = PWM_CHNNLS
             
             # Dictionary for the Read Mode
-            self.Read_Modes = {"DC":0, "AC":1}
+            self.Read_Modes = READ_MODES
             
             # Dictionary for Accessing the Different Read Types
-            self.Read_Types = {"Single Binary":0, "Multiple Binary":1, "Single Voltage":2, "Multiple Voltage":3, "Average Voltage":4}
+            self.Read_Types = READ_TYPES
 
             # Voltage Bounding Values
-            self.VMAX = 3.3 # Max output voltage from IBM4
-            self.VMIN = 0.0 # Min output voltage from IBM4
-            self.DELTA_VMIN = 0.01 # Min voltage increment from IBM4
+            self.VMAX = VMAX # Max output voltage from IBM4
+            self.VMIN = VMIN # Min output voltage from IBM4
+            self.DELTA_VMIN = DELTA_VMIN # Min voltage increment from IBM4
             
             # # parameters to be passed to the serial open command
-            self.baud_rate = 9600 # serial comms baud_rate
+            self.baud_rate = baud_rate # serial comms baud_rate
             self.read_timeout = 3 # timeout for reading data from the IBM4, units of second
             self.write_timeout = 0.5 # timeout for writing data to the IBM4, units of second
             self.instr_obj = None # assign a default argument to the instrument object
+            self.framer = IBM4_Framing.ReplyFramer() # matches the bytes received to the commands sent, see IBM4_Pipeline
+            self.io_lock = threading.RLock() # held while commands are sent and replies collected, so that an IBM4_Stream thread can share the link
+            self.link_stats = IBM4_Stats.LinkStats() # latency and throughput of the commands sent, see stats()
+            self.read_mode = read_mode # the read mode last selected by SetMode
+            self.calibration = None # conversion of binary readings to volts, loaded by GetCalibration when first needed
+            self.fast_path = None # pre-encoded commands for tight loops, made by FastPath when first needed
             
             # identify the port name
             if port_name is not None:
@@ -131,6 +229,9 @@ class Ser_Iface(object):
             
             # open the serial comms link to port_name
             self.OpenComms(read_mode)
+
+            if negotiate_baud:
+                self.NegotiateBaud()
         except TypeError as e:
             print(self.ERR_STATEMENT)
             print(e)
@@ -165,6 +266,8 @@ class Ser_Iface(object):
         
         """
         In order to be able to sweep correctly the buffer must be reset between write, read command pairs
+        This is no longer required, _Transact uses the framer to match each reply to its command
+        and stale or unsolicited lines are dropped, ResetBuffer is kept to abandon all outstanding commands
         """
 
         self.FUNC_NAME = ".ResetBuffer()" # use this in exception handling messages
@@ -175,6 +278,7 @@ class Ser_Iface(object):
             if self.instr_obj.isOpen():
                 self.instr_obj.reset_input_buffer() # this appears to have no effect
                 self.instr_obj.reset_output_buffer() # this appears to have no effect
+                self.framer.Reset() # forget all commands awaiting a reply and any partially received reply
             else:
                 self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
                 raise Exception
@@ -182,6 +286,291 @@ class Ser_Iface(object):
             print(self.ERR_STATEMENT)
             print(e)
 
+    def _Collect(self, reqs):
+        """
+        Read from the IBM4 until the replies to all the IBM4_Framing.Request objects in reqs are complete
+        Gives up if no bytes are received for read_timeout seconds
+
+        Returns True if all replies are complete
+        """
+
+        while not all([req.complete for req in reqs]):
+            data = self.instr_obj.read( max(1, self.instr_obj.in_waiting) ) # blocks for at most read_timeout
+            if len(data) == 0:
+                self.link_stats.Timeout()
+                return False
+            self._Feed(data)
+        return True
+
+    def _Write(self, data):
+        """
+        Send the bytes data to the IBM4
+        """
+
+        self.instr_obj.write(data)
+        self.link_stats.Sent(len(data))
+
+    def _Feed(self, data):
+        """
+        Pass the bytes data received from the IBM4 to the framer, the latency of each command completed by data is recorded
+        Commands whose reply is only their echo are counted but not timed, their echo is not read until the next reply is awaited
+        """
+
+        self.link_stats.Received(len(data))
+        now = time.perf_counter()
+        for req in self.framer.Feed(data):
+            self.link_stats.Record(req.command, None if req.EchoOnly() else now - req.t_sent, req.no_vals)
+
+    def _Transact(self, write_cmd, no_vals = 0, no_lines = 0):
+        """
+        Send write_cmd to the IBM4 and wait for the reply, the reply is expected to contain no_vals values or no_lines lines
+        Commands whose reply is only their echo, e.g. Write, PWM, Mode, do not wait, their echo is consumed by the framer
+        when the next reply is awaited
+
+        Returns the IBM4_Framing.Request holding the reply, raises TimeoutError if the reply is not complete within read_timeout
+        """
+
+        with self.io_lock:
+            req = self.framer.Expect(str.encode(write_cmd), no_vals, no_lines)
+            self._Write( str.encode(write_cmd) ) # when using serial str must be encoded as bytes
+            if req.EchoOnly():
+                # frame whatever has already arrived so that echoes do not accumulate over a long run of writes
+                if self.instr_obj.in_waiting > 0:
+                    self._Feed( self.instr_obj.read(self.instr_obj.in_waiting) )
+            elif not self._Collect([req]):
+                self.framer.Discard(req) # any part of the reply that arrives later is dropped as stale
+                raise TimeoutError('No reply to ' + write_cmd.strip())
+            return req
+
+    def _TransactChunks(self, write_cmds, no_vals, on_reply, no_reads = None, times = None, window = CHUNK_WINDOW):
+        """
+        Send the commands in write_cmds to the IBM4 with at most window of them awaiting a reply, the reply to write_cmds[k] is expected to contain no_vals[k] values
+        Each reply has its own timeout of read_timeout + no_reads[k]*SAMPLE_TIME_MAX seconds, no_reads[k] is the no. of reads taken by write_cmds[k], no_reads = None => no_vals
+        on_reply(k, req) is called as the reply to write_cmds[k] completes, in order, req = None if the reply timed out
+        times (type: numpy array of shape (len(write_cmds), 2)) if given, row k is set to the time.monotonic() at which the IBM4 started write_cmds[k],
+        the later of when it was sent and when the previous reply completed, and at which its reply completed, nan if it timed out
+
+        Returns the no. of replies that timed out
+        """
+
+        no_reads = no_vals if no_reads is None else no_reads
+        no_failed = 0
+        with self.io_lock:
+            timeout = self.instr_obj.timeout
+            sent = collections.deque() # (k, req, time sent) of the commands awaiting a reply
+            k_next = 0
+            t_prev = 0.0 # time at which the previous reply completed
+            try:
+                while k_next < len(write_cmds) or len(sent) > 0:
+                    while k_next < len(write_cmds) and len(sent) < window:
+                        req = self.framer.Expect(str.encode(write_cmds[k_next]), no_vals[k_next])
+                        self._Write( str.encode(write_cmds[k_next]) )
+                        sent.append( (k_next, req, time.monotonic()) )
+                        k_next = k_next + 1
+                    k, req, t_sent = sent.popleft()
+                    self.instr_obj.timeout = self.read_timeout + no_reads[k]*SAMPLE_TIME_MAX
+                    complete = self._Collect([req])
+                    t_done = time.monotonic()
+                    if times is not None:
+                        times[k] = [max(t_sent, t_prev), t_done] if complete else [numpy.nan, numpy.nan]
+                    t_prev = t_done
+                    if complete:
+                        on_reply(k, req)
+                    else:
+                        self.framer.Discard(req) # any part of the reply that arrives later is dropped as stale
+                        no_failed = no_failed + 1
+                        on_reply(k, None)
+            finally:
+                self.instr_obj.timeout = timeout
+                for k, req, t_sent in sent:
+                    self.framer.Discard(req) # abandoned by an exception in on_reply
+        return no_failed
+
+    def _ReadChunks(self, read_cmd, chnnls, no_reads, chunk_size = CHUNK_READS, binary = False):
+        """
+        Take no_reads reads with the command read_cmd, e.g. READ_CMD, split into commands of at most chunk_size reads
+        chnnls is the dictionary of channel numbers substituted into read_cmd, the no. of reads of each command is added as the last value
+        binary = True => the values are decoded as ints
+
+        Returns (vals, no_failed, timing), vals (type: numpy array of float64) holds the values read, the reads of chunks that timed out are nan
+        timing (type: IBM4_Timing.ChunkTimes) holds the host times of the chunks
+        """
+
+        starts = list( range(0, no_reads, chunk_size) )
+        sizes = [min(chunk_size, no_reads - start) for start in starts]
+        cnt_key = "v%(v1)d"%{"v1":len(chnnls) + 1}
+        write_cmds = [read_cmd%dict(chnnls, **{cnt_key:size}) for size in sizes]
+        decode = IBM4_Decode.Decode_Ints if binary else IBM4_Decode.Decode_Floats
+        vals = numpy.full(no_reads, numpy.nan) # the only array the size of the acquisition, each reply is decoded straight into it
+
+        def store(k, req):
+            if req is not None:
+                vals[starts[k]:starts[k] + sizes[k]] = decode(bytes(req.body), sizes[k])
+
+        times = numpy.full( (len(sizes), 2), numpy.nan )
+        no_failed = self._TransactChunks(write_cmds, sizes, store, times = times)
+        return vals, no_failed, IBM4_Timing.ChunkTimes(times[:, 0], times[:, 1], sizes)
+
+    def _AverageChunks(self, avg_cmd, chnnls, no_reads, chunk_size = CHUNK_READS):
+        """
+        Average of no_reads reads with the command avg_cmd, e.g. AVERAGE_CMD, split into commands of at most chunk_size reads
+        The average of each chunk is weighted by its no. of reads, raises TimeoutError if any chunk times out
+        """
+
+        starts = list( range(0, no_reads, chunk_size) )
+        sizes = [max(3, min(chunk_size, no_reads - start)) for start in starts] # the IBM4 averages at least 3 reads
+        cnt_key = "v%(v1)d"%{"v1":len(chnnls) + 1}
+        write_cmds = [avg_cmd%dict(chnnls, **{cnt_key:size}) for size in sizes]
+        means = numpy.full(len(sizes), numpy.nan)
+
+        def store(k, req):
+            if req is not None:
+                means[k] = float( IBM4_Framing.Reply_Values(req.body)[-1] )
+
+        if self._TransactChunks(write_cmds, [1]*len(sizes), store, sizes) > 0:
+            raise TimeoutError('No reply to ' + write_cmds[0].strip())
+        return float( numpy.dot(means, sizes)/numpy.sum(sizes) )
+
+    def Pipeline(self):
+        """
+        Return an IBM4_Pipeline.Pipeline that queues commands for this IBM4 and sends them in a single write
+        """
+
+        return IBM4_Pipeline.Pipeline(self)
+
+    def FastPath(self):
+        """
+        Return the IBM4_Fast.FastPath of this IBM4, which makes Readers and Writers whose commands are validated and encoded once
+        for use in tight loops, e.g. fast = the_dev.FastPath(); read_A2 = fast.Reader('A2'); v = read_A2()
+        """
+
+        if self.fast_path is None:
+            import IBM4_Fast # imported here, IBM4_Fast builds its command table from the constants of this module when it is imported
+            self.fast_path = IBM4_Fast.FastPath(self)
+        return self.fast_path
+
+    def stats(self):
+        """
+        Return a snapshot of the link statistics, see IBM4_Stats.LinkStats.Snapshot
+        per command type latency count / mean / p50 / p90 / p99 / max, bytes in / out, timeouts, retries and samples/s
+        """
+
+        return self.link_stats.Snapshot()
+
+    def DumpStats(self, file_name, interval = None):
+        """
+        Write the link statistics to the text metrics file file_name
+        interval = None => write once, otherwise rewrite the file every interval seconds until StopStatsDump is called
+        """
+
+        if interval is None:
+            self.link_stats.Dump(file_name)
+        else:
+            self.link_stats.StartDump(file_name, interval)
+
+    def StopStatsDump(self):
+        """
+        Stop the periodic dump of the link statistics
+        """
+
+        self.link_stats.StopDump()
+
+    def Stream(self, input_channel, chunk_size = 500, no_chunks = 64, binary = False):
+        """
+        Return an IBM4_Stream.Stream that reads input_channel continuously in chunks of chunk_size reads into a ring buffer of no_chunks chunks
+        Use it as a context manager, or call Start() / Stop(), other methods of the Ser_Iface may be called while it runs
+        """
+
+        return IBM4_Stream.Stream(self, input_channel, chunk_size, no_chunks, binary)
+
+    def DataLogger(self, file_name, interval = 1.0, duration = None, no_reads = 10, rows_per_file = 3600, max_files = None, loud = False):
+        """
+        Log the averaged voltage at all analog input channels every interval seconds to the rolling CSV files file_name_0000.csv, ...
+        until duration seconds have passed, duration = None => until the user presses Ctrl-C
+
+        The scans are scheduled on the monotonic clock so the read time does not add to the interval, deadlines overrun by a scan are counted and skipped,
+        see IBM4_Logger. Returns a dictionary summarising the run, e.g. the no. rows written and deadlines missed
+        """
+
+        FUNC_NAME = ".DataLogger()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if interval > 0 else False # confirm that the interval is sensible
+            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c10 = c1 and c2 and c3
+
+            if c10:
+                logger = IBM4_Logger.DataLogger(self, file_name, interval, no_reads, rows_per_file, max_files)
+                summary = logger.Run(duration, loud = loud)
+                print('Datalogger wrote',summary["rows"],'rows to',file_name,'missed',summary["missed"],'deadlines')
+                return summary
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\ninterval must be > 0'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def PIDControl(self, output_channel, setpoint, pos_channel, neg_channel = None, kp = 0.5, ki = 10.0, kd = 0.0, no_reads = 1, duration = 5.0, interval = None, v_start = 0.0, loud = False):
+        """
+        Drive output_channel so that the voltage at pos_channel, or between pos_channel and neg_channel, tracks setpoint (V)
+
+        A PID controller with anti-windup sets the output, clamped to [VMIN, VMAX), for duration seconds, see IBM4_Control
+        interval = None => the loop runs as fast as the link allows, otherwise one step every interval seconds
+        no_reads = 1 => a single read per step, otherwise the average of no_reads reads
+        The output starts at v_start and is left at its last value when the loop stops
+
+        Returns a dictionary summarising the run, the reading and output of each step, the final error, and the loop rate,
+        latency and jitter statistics, see IBM4_Control.ControlLoop.Run
+        """
+
+        FUNC_NAME = ".PIDControl()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if output_channel in self.Write_Chnnls else False # confirm that the output channel label is correct
+            c3 = True if pos_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
+            c4 = True if neg_channel is None or (neg_channel in self.Read_Chnnls and neg_channel != pos_channel) else False # confirm that the negative channel label is correct
+            c5 = True if no_reads == 1 or (no_reads > 2 and no_reads < 10000) else False # confirm that no. reads is a sensible value
+            c6 = True if v_start >= self.VMIN and v_start < self.VMAX else False # confirm that the start voltage is in range
+            c7 = True if (duration is not None and duration > 0) and (interval is None or interval > 0) else False # confirm that the timing is sensible
+            c10 = c1 and c2 and c3 and c4 and c5 and c6 and c7
+
+            if c10:
+                import IBM4_Control # imported here, IBM4_Control takes its default output range from the constants of this module when it is imported
+                pid = IBM4_Control.PID(kp, ki, kd, setpoint)
+                loop = IBM4_Control.ControlLoop(self, output_channel, pos_channel, neg_channel, pid, no_reads)
+                summary = loop.Run(duration, interval = interval, v_start = v_start, loud = loud)
+                print('PID control:',summary["steps"],'steps at %(v1)0.1f Hz, final error %(v2)s V, jitter %(v3)0.3f ms'%{"v1":summary["rate_hz"], "v2":summary["error"], "v3":1000.0*summary["jitter_s"]})
+                return summary
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\noutput_channel outside range {A0, A1}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\npos_channel outside range {A2, A3, A4, A5, D2}'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nneg_channel outside range {A2, A3, A4, A5, D2} or equal to pos_channel'
+                if not c5:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
+                if not c6:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nv_start outside range [0.0, 3.3)'
+                if not c7:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nduration and interval must be > 0'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
     def CommsStatus(self):
         """
         investigate the status of the serial comms link
@@ -205,7 +594,8 @@ class Ser_Iface(object):
         try:
             if self.IBM4Port is not None:
                 # open a serial link to a device
-                self.instr_obj = serial.Serial(self.IBM4Port, self.baud_rate, timeout = self.read_timeout, write_timeout = self.write_timeout, stopbits=serial.STOPBITS_ONE)
+                # serial_for_url accepts a port name or a pyserial URL, e.g. socket:// or rfc2217:// for a networked IBM4 or emulator
+                self.instr_obj = serial.serial_for_url(self.IBM4Port, self.baud_rate, timeout = self.read_timeout, write_timeout = self.write_timeout, stopbits=serial.STOPBITS_ONE)
                 
                 # Specify the reading mode for the IBM4
                 self.SetMode(read_mode)
@@ -216,7 +606,7 @@ class Ser_Iface(object):
 
                 self.CommsStatus()
                 
-                self.ResetBuffer() # delete all text from the IB4 Buffer
+                # no need to ResetBuffer, the framer drops anything left in the IBM4 buffer before the first reply
             else:
                 self.ERR_STATEMENT = self.ERR_STATEMENT + '\nNo IBM4 attached to PC'
                 raise Exception
@@ -235,15 +625,14 @@ class Ser_Iface(object):
         try:
             if self.instr_obj.isOpen():
                  # Set all analog outputs to GND
-                self.instr_obj.write(b'a0\r\n')
-                self.instr_obj.write(b'b0\r\n')
+                for zero_cmd in ZERO_CMDS:
+                    self._Transact(zero_cmd)
                 #self.instr_obj.write(b'PWM9:0\r\n')
                 # Set all PWM outputs to GND
                 # PWM pins 5, 7, 9, 10, 11, 12, 13                
                 for k, v in self.PWM_Chnnls.items():
-                    PWM_cmd = 'PWM%(v1)d:0\r\n'%{"v1":v}
-                    self.instr_obj.write( str.encode( PWM_cmd ) )
-                #self.ResetBuffer() # reset buffer
+                    PWM_cmd = PWM_CMD%{"v1":v, "v2":0}
+                    self._Transact(PWM_cmd)
             else:
                 # Do nothing, no link to IBM4 established
                 pass
@@ -262,28 +651,10 @@ class Ser_Iface(object):
 
         try:
             if self.instr_obj.isOpen():
-                #self.ResetBuffer() # reset buffer between write, read cmd pairs, seems to be having no effect
-                self.instr_obj.write(b'*IDN\r\n')
-                response = self.instr_obj.read_until('\n',size=None)
-                Code=response.rsplit(b'\r\n')
-
-                #return Code[1] if len(Code) > 1 else None
-
-                # Need a more generic way to locate the ISBY string
-                # because the ResetBuffer Call does not seem to be having any effect
-                # Must encode the test string as bytes because Python 3.X is really pedantic
-                #print(type('ISBY')) # type str #print(type(Code[i])) # type bytes
-                count = -1
-                for i in range(0,len(Code), 1): 
-                    if b'ISBY' in Code[i]: 
-                        count = i                
-                        break
-                return Code[count] if count>-1 else None
-            
-                # Pythonic method
-                #https://stackoverflow.com/questions/4843158/how-to-check-if-a-string-is-a-substring-of-items-in-a-list-of-strings
-                #matching = [s for s in Code if b'ISBY' in s]
-                #return matching[0] if len(matching)>0 else None
+                # The ISBY search was needed because the ResetBuffer call did not seem to be having any effect
+                # The framer now matches the reply to the *IDN command, so the identity string is the single line that follows the echo
+                Code = bytes( self._Transact(IDN_CMD, no_lines = 1).body ).strip()
+                return Code if b'ISBY' in Code else None
             else:
                 # Do nothing, no link to IBM4 established
                 pass
@@ -298,54 +669,106 @@ class Ser_Iface(object):
         FHP 30 - 5 - 2024
         """
     
+        # Probing COM1 - COM256 or every /dev/tty* one port at a time made construction of Ser_Iface() slow
+        # The search is now performed by IBM4_Discovery, which tries the port at which an IBM4 was last found first
+        # and then probes the listed ports concurrently, USB-serial devices with the IBM4 VID first
+        # Use IBM4_Discovery.Find_All_IBM4 to locate every IBM4 attached to the PC
+
         self.FUNC_NAME = self.FUNC_NAME + ".FindIBM4()" # use this in exception handling messages
         self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
     
         try:
-            if sys.platform.startswith('win'):
-                ports = ['COM%s'%(i+1) for i in range(256)]
-            elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-                # this excludes your current terminal "/dev/tty"
-                ports = glob.glob('/dev/tty[A-Za-z]*')
-            elif sys.platform.startswith('darwin'):
-                ports = glob.glob('/dev/tty.*')
-            else:
-                self.ERR_STATEMENT = self.ERR_STATEMENT + '\nUnsupported platform'
-                raise EnvironmentError('Unsupported platform')
-        
-            baud_rate = 9600
-        
-            self.IBM4Port = None # assign IBM4Port to None 
+            self.IBM4Port = IBM4_Discovery.Find_IBM4(loud, baud_rate = self.baud_rate) # assign IBM4Port to None if no IBM4 is found
+            return self.IBM4Port
+        except Exception as e:
+            print(self.ERR_STATEMENT)
+            print(e)
+            
+    def NegotiateBaud(self, baud_rates = BAUD_RATES, timeout = 0.25, loud = False):
+        """
+        Select the fastest baud rate at which the IBM4 answers *IDN correctly
 
-            for port in ports:
+        The rates in baud_rates are tried fastest first, each with a read timeout of timeout seconds
+        Anything received at a rate that the IBM4 does not accept is dropped by the framer as stale
+        If no rate is accepted the link falls back to the baud rate it was using
+
+        Returns the baud rate in use
+        """
+
+        self.FUNC_NAME = ".NegotiateBaud()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            if self.instr_obj.isOpen():
+                original = self.baud_rate
+                self.instr_obj.timeout = timeout
                 try:
-                    if loud: print('Trying: ',port)
-                    s = serial.Serial(port, baud_rate, timeout = 0.05, write_timeout = 0.1, inter_byte_timeout = 0.1, stopbits=serial.STOPBITS_ONE)
-                    s.write(b'*IDN\r\n')
-                    response = s.read_until('\n',size=None)
-                    Code=response.rsplit(b'\r\n')
-                    if len(Code) > 2:
-                        #if Code[1]==b'ISBY-UCC-RevA.1':
-                        # test to see if Code[1] contains 'ISBY' this is more generic
-                        # will allow for updated rev. no. without necessitating a change in code
-                        # Must encode the test string as bytes because Python 3.X is really pedantic
-                        #print(type('ISBY')) # type str
-                        #print(type(Code[1])) # type bytes
-                        if b'ISBY' in Code[1]:
-                            if loud: print(f'IBM4 found at {port}')
-                            self.IBM4Port = port
-                            s.close()
-                            break # stop the search for an IBM4 at the first one you find   
-                except(OSError, serial.SerialException):
-                    # Ignore the errors that arise from non-IBM4 serial ports
-                    pass
+                    for rate in sorted(baud_rates, reverse = True):
+                        self.instr_obj.baudrate = rate
+                        self.ResetBuffer() # forget anything received at the previous rate
+                        try:
+                            idn = bytes( self._Transact(IDN_CMD, no_lines = 1).body )
+                        except TimeoutError:
+                            idn = b''
+                        if loud: print('Baud rate',rate,':',idn)
+                        if b'ISBY' in idn:
+                            self.baud_rate = rate
+                            return self.baud_rate
+                        self.link_stats.Retry()
+                    # fall back to the rate that was in use
+                    self.instr_obj.baudrate = original
+                    self.ResetBuffer()
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nIBM4 did not answer at any baud rate\nbaud rate left at %(v1)d'%{"v1":original}
+                    raise Exception
+                finally:
+                    self.instr_obj.timeout = self.read_timeout
+            else:
+                self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
             print(e)
-        except EnvironmentError as e:
+            return self.baud_rate
+
+    def LinkSpeed(self, input_channel = 'A2', no_reads = 5000, loud = True):
+        """
+        Measure the throughput of the link using a multi-read of no_reads values at input_channel
+
+        Returns a dictionary containing the baud rate, the bytes/s and samples/s achieved,
+        and the bytes/s limit that the baud rate alone would impose on a UART, baud_rate / 10 for 8N1 framing
+        """
+
+        self.FUNC_NAME = ".LinkSpeed()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if input_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
+            c3 = True if no_reads > 0 and no_reads < 10000 else False # confirm that no. reads is a sensible value
+
+            if c1 and c2 and c3:
+                read_cmd = READ_CMD%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads}
+                start = time.perf_counter()
+                req = self._Transact(read_cmd, no_vals = no_reads)
+                elapsed = time.perf_counter() - start
+                no_bytes = len(read_cmd) + len(req.body) # the echoed command and the reply
+                res = {"baud_rate":self.baud_rate, "bytes_per_s":no_bytes/elapsed, "samples_per_s":no_reads/elapsed,
+                       "uart_limit_bytes_per_s":self.baud_rate/10.0}
+                if loud:
+                    print('Link speed at %(v1)d baud: %(v2)0.0f bytes/s, %(v3)0.0f samples/s (UART limit %(v4)0.0f bytes/s)'%{"v1":res["baud_rate"], "v2":res["bytes_per_s"], "v3":res["samples_per_s"], "v4":res["uart_limit_bytes_per_s"]})
+                return res
+            else:
+                if not c1:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [1, 10000)'
+                raise Exception
+        except Exception as e:
             print(self.ERR_STATEMENT)
             print(e)
-            
+
     # methods for writing data to the IBM4
     
     def SetMode(self, read_mode = 'DC'):
@@ -367,9 +790,9 @@ class Ser_Iface(object):
         
             c10 = c1 and c3 # if all conditions are true then write can proceed
             if c10:
-                write_cmd = 'Mode%(v1)d\r\n'%{"v1":self.Read_Modes[read_mode]}
-                self.instr_obj.write( str.encode(write_cmd) ) # when using serial str must be encoded as bytes
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
+                write_cmd = MODE_CMD%{"v1":self.Read_Modes[read_mode]}
+                self._Transact(write_cmd) # Mode returns only its echo, no need to wait for it
+                self.read_mode = read_mode
             else:
                 if not c1:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
@@ -402,10 +825,9 @@ class Ser_Iface(object):
             c10 = c1 and c2 and c3 # if all conditions are true then write can proceed
         
             if c10:
-                write_cmd = 'Write%(v1)d:%(v2)0.2f\r\n'%{"v1":self.Write_Chnnls[output_channel], "v2":set_voltage}
-                self.instr_obj.write( str.encode(write_cmd) ) # when using serial str must be encoded as bytes
+                write_cmd = WRITE_CMD%{"v1":self.Write_Chnnls[output_channel], "v2":set_voltage}
+                self._Transact(write_cmd) # Write returns only its echo, no need to wait for it
                 #time.sleep(DELAY) # no need for explicit delay, this is handled by write_timeout
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
             else:
                 if not c1:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
@@ -439,9 +861,8 @@ class Ser_Iface(object):
             c10 = c1 and c3 # if all conditions are true then write can proceed
             if c10:
                 output_channel = self.PWM_Chnnls["D9"] # when using the IBM4 enhancement board the PWM is fixed to D9
-                write_cmd = 'PWM%(v1)d:%(v2)d\r\n'%{"v1":output_channel, "v2":percentage}
-                self.instr_obj.write( str.encode(write_cmd) ) # when using serial str must be encoded as bytes
-                #self.ResetBuffer() # reset buffer between write, read cmd pairs
+                write_cmd = PWM_CMD%{"v1":output_channel, "v2":percentage}
+                self._Transact(write_cmd) # PWM returns only its echo, no need to wait for it
             else:
                 if not c1:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
@@ -473,7 +894,7 @@ class Ser_Iface(object):
         try:
             c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
             c2 = True if input_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
-            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c3 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
             c4 = True if read_type in self.Read_Types else False # confirm that the read_type has been chosen correctly
         
             c10 = c1 and c2 and c3 and c4 # if all conditions are true then write can proceed
@@ -497,7 +918,7 @@ class Ser_Iface(object):
                 if not c2:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A0, A1}'
                 if not c3:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10001]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_reads must be at least 3'
                 if not c4:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nread_type incorrectly specified'
                 raise Exception
@@ -527,7 +948,7 @@ class Ser_Iface(object):
             c2 = True if pos_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c3 = True if neg_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c4 = True if neg_channel != pos_channel else False # confirm that the positive channel label is correct
-            c5 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c5 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 and c4 and c5 # if all conditions are true then write can proceed
             
@@ -554,7 +975,7 @@ class Ser_Iface(object):
                 if not c4:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\npos_channel cannot be the same as neg_channel'
                 if not c5:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages outside range [3, 10000]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
@@ -587,12 +1008,10 @@ class Ser_Iface(object):
             
             if c10:
                 no_reads = 1 # 
-                read_cmd = 'Read%(v1)d:%(v2)d\r\n'%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes                
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed                
-                vals = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list
+                read_cmd = READ_CMD%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
+                read_result = bytes( self._Transact(read_cmd, no_vals = 1).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals = IBM4_Framing.Reply_Values(read_result) # parse the numeric value of read_result
                 res = float(vals[-1])
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
                 if loud: 
                     print(read_result)
                     print(vals) # print the parsed values
@@ -631,12 +1050,10 @@ class Ser_Iface(object):
             
             if c10:
                 no_reads = 1 # 
-                read_cmd = 'BRead%(v1)d:%(v2)d\r\n'%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes                
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed                
-                vals = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list
+                read_cmd = BREAD_CMD%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
+                read_result = bytes( self._Transact(read_cmd, no_vals = 1).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals = IBM4_Framing.Reply_Values(read_result) # parse the numeric value of read_result
                 res = int(vals[-1])
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
                 if loud: 
                     print(read_result)
                     print(vals) # print the parsed values
@@ -704,18 +1121,20 @@ class Ser_Iface(object):
         try:
             c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
             c2 = True if input_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
-            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c3 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 # if all conditions are true then write can proceed
             
-            if c10:
-                read_cmd = 'Average%(v1)d:%(v2)d\r\n'%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes                
-                # Working
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed                
-                vals = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list
+            if c10 and no_reads >= 10000:
+                res = self._AverageChunks(AVERAGE_CMD, {"v1":self.Read_Chnnls[input_channel]}, no_reads) # too many reads for one command, see ReadLong
+                if loud:
+                    print(res)
+                return res
+            elif c10:
+                read_cmd = AVERAGE_CMD%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
+                read_result = bytes( self._Transact(read_cmd, no_vals = 1).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals = IBM4_Framing.Reply_Values(read_result) # parse the numeric value of read_result
                 res = float(vals[-1])
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
                 if loud: 
                     print(read_result)
                     print(vals) # print the parsed values
@@ -726,7 +1145,7 @@ class Ser_Iface(object):
                 if not c2:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A0, A1}'
                 if not c3:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10001]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_reads must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
@@ -750,28 +1169,196 @@ class Ser_Iface(object):
 
         try:
             c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
-            c3 = True if no_reads > 3 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c3 # if all conditions are true then write can proceed
         
             if c10:
-                read_vals = numpy.array([]) # instantiate an empty numpy array
+                # The five Average commands are pipelined, sent in one write with the replies collected afterwards
+                # rather than paying the full round trip latency five times
+                pipe = self.Pipeline()
                 for item in self.Read_Chnnls:
-                    value = self.ReadAverageVoltage(item, no_reads, loud)
-                    read_vals = numpy.append(read_vals, value)
-                    if loud: 
-                        print('Voltages at AI: ',read_vals)
+                    pipe.Average(item, no_reads)
+                read_vals = numpy.array(pipe.Execute(loud), dtype = numpy.float64) # failed reads are stored as nan
+                if loud: 
+                    print('Voltages at AI: ',read_vals)
                 return read_vals
             else:
                 if not c1:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
                 if not c3:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10001]'
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
                 raise Exception
         except Exception as e:
-            print(self.ERR_STATEMENT)
+            print(ERR_STATEMENT)
             print(e)
             
+    def ScanAllChnnl(self, no_reads = 10, loud = False):
+
+        """
+        This method interfaces with the IBM4 to perform an averaging read operation on all read channels in a single transaction
+        The IBM4 has no command that reads all channels at once, the five Average commands are sent in one write and the replies collected afterwards
+
+        Inputs:
+        no_reads (type: int) is the num. of readings to be taken at each analog input channel
+
+        Outputs:
+        scan (type: numpy structured array of shape (1,) and dtype SCAN_DTYPE) holds the host time.time() at which the scan was complete
+        and the averaged voltage at each analog input channel, e.g. scan['A2'], failed reads are stored as nan
+        scan = None if the read cannot be made, e.g. no_reads out of range
+        Scans can be collected into a log with numpy.concatenate
+        """
+
+        read_vals = self.ReadAverageVoltageAllChnnl(no_reads, loud)
+        if read_vals is None:
+            return None
+        scan = numpy.full(1, numpy.nan, dtype = SCAN_DTYPE)
+        scan["t"] = time.time()
+        for i, chnnl in enumerate(self.Read_Chnnls):
+            scan[chnnl] = read_vals[i]
+        return scan
+
+    def ReadBlock(self, channels = None, no_reads = 100, chunk_size = None, binary = False, loud = False):
+
+        """
+        This method interfaces with the IBM4 to read several analog input channels in a single transaction
+
+        The IBM4 reads one channel at a time, a Read command is pipelined for each channel and the replies collected afterwards.
+        chunk_size = None => one Read of no_reads per channel, all of the reads of one channel are taken before those of the next
+        otherwise the reads are split into Read commands of chunk_size that visit the channels in turn, so that reading k of each channel
+        is taken closer in time, at the cost of more commands, see DIFF_CHUNK
+        binary = True => the IBM4 sends binary readings, which are converted to volts using the calibration of the IBM4, see GetCalibration
+
+        Inputs:
+        channels (type: list) labels of the analog input channels to be read, channels = None => all of 'A2', 'A3', 'A4', 'A5', 'D2'
+        no_reads (type: int) is the num. of readings to be taken at each analog input channel
+        chunk_size (type: int) is the num. of readings taken by each Read command
+        binary (type: bool) read binary values rather than voltages
+
+        Outputs:
+        block (type: numpy array of shape (len(channels), no_reads)) row i holds the readings of channels[i], failed reads are stored as nan
+        """
+
+        FUNC_NAME = ".ReadBlock()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + FUNC_NAME
+
+        try:
+            channels = list(self.Read_Chnnls) if channels is None else list(channels)
+            chunk_size = no_reads if chunk_size is None else chunk_size
+            c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if len(channels) > 0 and all([ch in self.Read_Chnnls for ch in channels]) else False # confirm that the input channel labels are correct
+            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. reads is a sensible value
+            c4 = True if chunk_size > 0 else False
+
+            c10 = c1 and c2 and c3 and c4 # if all conditions are true then the read can proceed
+
+            if c10:
+                pipe = self.Pipeline()
+                starts = list( range(0, no_reads, chunk_size) )
+                for start in starts:
+                    for ch in channels:
+                        if binary:
+                            pipe.BRead(ch, min(chunk_size, no_reads - start))
+                        else:
+                            pipe.Read(ch, min(chunk_size, no_reads - start))
+                results = pipe.Execute(loud)
+                block = numpy.full( (len(channels), no_reads), numpy.nan )
+                for k, start in enumerate(starts):
+                    for i in range(0, len(channels), 1):
+                        vals = results[k*len(channels) + i]
+                        if vals is not None:
+                            block[i, start:start + len(vals)] = vals
+                if binary:
+                    cal = self.GetCalibration()
+                    block = cal.BlockToVolts(block, channels, self.read_mode) if cal is not None else None # converted in one pass
+                return block
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nchannels outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads outside range [3, 10000)'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nchunk_size must be at least 1'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def DiffMatrix(self, channels = None, no_reads = 100, chunk_size = DIFF_CHUNK, binary = False, loud = False):
+
+        """
+        Differential voltages between every pair of channels from one block of readings, see ReadBlock and Diff_Matrix
+        Replaces one DifferentialRead per pair of channels with a single acquisition
+        The reads are interleaved in Read commands of chunk_size reads so that delta and std describe the differences,
+        chunk_size = None => each channel is read in one pass after the other, faster, but only mean is meaningful
+
+        Outputs:
+        res (type: dict) with keys
+        channels: the channel labels, in the order of the rows and columns of the matrices
+        mean: diff_mean[i, j] = average of channels[i] - channels[j]
+        delta: half the range of channels[i] - channels[j]
+        std: standard deviation of channels[i] - channels[j]
+        block: the readings, see ReadBlock
+        """
+
+        channels = list(self.Read_Chnnls) if channels is None else list(channels)
+        block = self.ReadBlock(channels, no_reads, chunk_size, binary, loud)
+        if block is None:
+            return None
+        diff_mean, diff_delta, diff_std = Diff_Matrix(block)
+        if loud:
+            print('Differential voltages, row - column: ',channels)
+            print(diff_mean)
+        return {"channels":channels, "mean":diff_mean, "delta":diff_delta, "std":diff_std, "block":block}
+
+    def GetCalibration(self):
+        """
+        Return the IBM4_Calibration.Calibration of the IBM4, it is loaded from the calibration file by IDN string when first needed
+        """
+
+        if self.calibration is None:
+            idn = self.IdentifyIBM4()
+            if idn is not None:
+                self.calibration = IBM4_Calibration.Load(idn)
+        return self.calibration
+
+    def Calibrate(self, levels = (0.3, 1.0, 1.7, 2.4, 3.0), no_reads = 200, save = True, loud = False):
+        """
+        Calibrate the binary readings against the voltage readings in the present read mode, see IBM4_Calibration.Calibrate
+        The analog outputs are driven through levels and are zeroed when done
+        """
+
+        return IBM4_Calibration.Calibrate(self, levels, no_reads, save = save, loud = loud)
+
+    def ReadMultipleCalibrated(self, input_channel, no_reads = 10, loud = False):
+
+        """
+        This method performs the same read operation as ReadMultipleVoltage, but the IBM4 sends binary readings
+        which are converted to volts on the host using the calibration of the IBM4 for the present read mode, see GetCalibration.
+        A binary reading takes fewer bytes on the wire than a voltage reading, so long acquisitions are faster
+
+        Inputs:
+        input_channel (type: str) is one of the labels for the analog input channels 'A2', 'A3', 'A4', 'A5', 'D2'
+        no_reads (type: int) is the num. of readings to be taken at the analog input channel
+
+        Outputs:
+        res (type: list) contains three elements
+        res[0] = average of all voltage readings
+        res[1] = amplitude voltage readings
+        res[2] = numpy array with all voltage read values
+        """
+
+        vals_int = self.ReadMultipleBinary(input_channel, no_reads, loud)
+        cal = self.GetCalibration() if vals_int is not None else None
+        if cal is None:
+            return None
+        vals_flt = cal.ToVolts(vals_int, input_channel, self.read_mode)
+        vals_mean = numpy.mean(vals_flt) # compute the average of all the reads
+        vals_delta = 0.5*( numpy.max(vals_flt) - numpy.min(vals_flt) ) # compute the range of the reads
+        return [vals_mean, vals_delta, vals_flt]
+
     def ReadMultipleVoltage(self, input_channel, no_reads = 10, loud = False):
         
         """
@@ -797,18 +1384,17 @@ class Ser_Iface(object):
         try:
             c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
             c2 = True if input_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
-            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c3 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 # if all conditions are true then write can proceed
             
-            if c10:
-                read_cmd = 'Read%(v1)d:%(v2)d\r\n'%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes                
-                # Working
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed                
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
-                vals_flt = numpy.float_(vals_str[-no_reads:]) # convert the list of strings to floats using numpy, save as numpy array (better)
+            if c10 and no_reads >= 10000:
+                res = self.ReadLong(input_channel, no_reads, loud = loud) # too many reads for one command, split into chunks
+                return None if res is None else res[0:3]
+            elif c10:
+                read_cmd = READ_CMD%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
+                read_result = bytes( self._Transact(read_cmd, no_vals = no_reads).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_flt = IBM4_Decode.Decode_Floats(read_result, no_reads) # convert the last no_reads values in read_result to a numpy array of floats
                 vals_mean = numpy.mean(vals_flt) # compute the average of all the diff_reads
                 vals_delta = 0.5*( numpy.max(vals_flt) - numpy.min(vals_flt) ) # compute the range of the diff_read
                 res = [vals_mean, vals_delta, vals_flt]
@@ -822,7 +1408,7 @@ class Ser_Iface(object):
                 if not c2:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A0, A1}'
                 if not c3:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages outside range [3, 10001]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
@@ -849,18 +1435,19 @@ class Ser_Iface(object):
         try:
             c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
             c2 = True if input_channel in self.Read_Chnnls else False # confirm that the input channel label is correct
-            c3 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c3 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 # if all conditions are true then write can proceed
             
-            if c10:
-                read_cmd = 'BRead%(v1)d:%(v2)d\r\n'%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes                
-                # Working
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed                
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list
-                self.ResetBuffer() # reset buffer between write, read cmd pairs
-                vals_int = numpy.int_(vals_str[-no_reads:]) # convert the list of strings to ints using numpy, save as numpy array (better)
+            if c10 and no_reads >= 10000:
+                vals, no_failed, timing = self._ReadChunks(BREAD_CMD, {"v1":self.Read_Chnnls[input_channel]}, no_reads, binary = True) # too many reads for one command, see ReadLong
+                if no_failed > 0:
+                    raise TimeoutError('%(v1)d chunks of the read timed out'%{"v1":no_failed})
+                return vals.astype(numpy.int64)
+            elif c10:
+                read_cmd = BREAD_CMD%{"v1":self.Read_Chnnls[input_channel], "v2":no_reads} # generate the read command
+                read_result = bytes( self._Transact(read_cmd, no_vals = no_reads).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_int = IBM4_Decode.Decode_Ints(read_result, no_reads) # convert the last no_reads values in read_result to a numpy array of ints
                 if loud: 
                     print(read_result)
                     print(vals_int) # print the parsed values
@@ -871,12 +1458,94 @@ class Ser_Iface(object):
                 if not c2:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\ninput_channel outside range {A0, A1}'
                 if not c3:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages outside range [3, 10001]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
             print(e)
     
+    def ReadLong(self, pos_channel, no_reads, neg_channel = None, binary = False, chunk_size = CHUNK_READS, loud = False):
+
+        """
+        This method interfaces with the IBM4 to take a long acquisition, of any no. of readings, at a single channel or differentially between two channels.
+        The IBM4 accepts fewer than 10000 readings per command, the acquisition is split into commands of chunk_size readings which are pipelined,
+        CHUNK_WINDOW at a time, and each reply is given its own timeout, see _TransactChunks. Each reply is decoded straight into one preallocated array,
+        so the memory used is that of the result, e.g. 8 MB for 1000000 readings, plus at most CHUNK_WINDOW replies.
+        binary = True => the IBM4 sends binary readings, which are converted to volts using the calibration of the IBM4, see GetCalibration
+        The host times at which each chunk was started and completed are recorded, from which the time of each reading is estimated, see IBM4_Timing,
+        a smaller chunk_size gives a finer estimate of how the sample rate varies during the acquisition
+
+        Inputs:
+        pos_channel (type: str) is one of the labels for the analog input channels 'A2', 'A3', 'A4', 'A5', 'D2'
+        no_reads (type: int) is the num. of readings to be taken
+        neg_channel (type: str) neg_channel = None => single-ended readings at pos_channel, otherwise differential readings pos_channel - neg_channel
+        binary (type: bool) read binary values rather than voltages, single-ended readings only
+        chunk_size (type: int) is the num. of readings taken by each command, in the range [1, 10000)
+
+        Outputs:
+        res (type: list) contains five elements, the first three are those of ReadMultipleVoltage
+        res[0] = average of all voltage readings
+        res[1] = amplitude voltage readings
+        res[2] = numpy array with all voltage read values, the readings of a chunk that timed out are nan and are left out of the statistics
+        res[3] = standard deviation of the voltage readings
+        res[4] = IBM4_Timing.ChunkTimes holding the host times of the chunks, e.g. res[4].Times(), res[4].Rate(), res[4].Resample(res[2])
+        """
+
+        FUNC_NAME = ".ReadLong()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + FUNC_NAME
+
+        try:
+            c1 = True if self.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if pos_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
+            c3 = True if neg_channel is None or (neg_channel in self.Read_Chnnls and neg_channel != pos_channel) else False # confirm that the negative channel label is correct
+            c4 = True if no_reads > 2 else False # confirm that no. reads is a sensible value
+            c5 = True if chunk_size > 0 and chunk_size < 10000 else False # confirm that the chunks can be read by the IBM4
+            c6 = True if not binary or neg_channel is None else False
+
+            c10 = c1 and c2 and c3 and c4 and c5 and c6 # if all conditions are true then the read can proceed
+
+            if c10:
+                t_start = time.perf_counter()
+                if neg_channel is None:
+                    vals, no_failed, timing = self._ReadChunks(BREAD_CMD if binary else READ_CMD, {"v1":self.Read_Chnnls[pos_channel]}, no_reads, chunk_size, binary)
+                else:
+                    vals, no_failed, timing = self._ReadChunks(DIFF_READ_CMD, {"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel]}, no_reads, chunk_size)
+                if binary:
+                    cal = self.GetCalibration()
+                    if cal is None:
+                        ERR_STATEMENT = ERR_STATEMENT + '\nCould not convert binary readings\nNo calibration available'
+                        raise Exception
+                    vals = cal.ToVolts(vals, pos_channel, self.read_mode)
+                if no_failed == len( range(0, no_reads, chunk_size) ):
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo chunk was read before timing out'
+                    raise TimeoutError
+                ok = vals if no_failed == 0 else vals[~numpy.isnan(vals)] # only copy the readings when some are missing
+                vals_mean = numpy.mean(ok) # compute the average of all the reads
+                vals_delta = 0.5*( numpy.max(ok) - numpy.min(ok) ) # compute the range of the reads
+                vals_std = numpy.std(ok)
+                if loud:
+                    print('%(v1)d readings in %(v2)0.3f s, %(v3)d chunks timed out'%{"v1":no_reads, "v2":time.perf_counter() - t_start, "v3":no_failed})
+                    print('Effective sample rate: %(v1)0.1f Hz'%{"v1":timing.Rate()})
+                    print(vals)
+                return [vals_mean, vals_delta, vals, vals_std, timing]
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\npos_channel outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nneg_channel incorrectly specified'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nno_reads must be at least 3'
+                if not c5:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nchunk_size outside range [1, 10000)'
+                if not c6:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not read from instrument\nbinary readings are single-ended only'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
     # differential voltage reading methods
 
     def DiffReadSingle(self, pos_channel, neg_channel, loud = False):
@@ -908,12 +1577,10 @@ class Ser_Iface(object):
             
             if c10:
                 no_reads = 1
-                read_cmd = 'Diff_Read%(v1)d:%(v2)d:%(v3)d\r\n'%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list of strings
+                read_cmd = DIFF_READ_CMD%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
+                read_result = bytes( self._Transact(read_cmd, no_vals = 1).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_str = IBM4_Framing.Reply_Values(read_result) # parse the numeric value of read_result
                 res = float(vals_str[-1])
-                self.ResetBuffer() # clear the IBM4 buffer after each read            
                 if loud: 
                     print(read_result)
                     print(res) 
@@ -957,17 +1624,20 @@ class Ser_Iface(object):
             c2 = True if pos_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c3 = True if neg_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c4 = True if neg_channel != pos_channel else False # confirm that the positive channel label is correct
-            c5 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c5 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 and c4 and c5 # if all conditions are true then write can proceed
             
-            if c10:
-                read_cmd = 'Diff_Average%(v1)d:%(v2)d:%(v3)d\r\n'%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list of strings
+            if c10 and no_reads >= 10000:
+                res = self._AverageChunks(DIFF_AVERAGE_CMD, {"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel]}, no_reads) # too many reads for one command, see ReadLong
+                if loud:
+                    print(res)
+                return res
+            elif c10:
+                read_cmd = DIFF_AVERAGE_CMD%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
+                read_result = bytes( self._Transact(read_cmd, no_vals = 1).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_str = IBM4_Framing.Reply_Values(read_result) # parse the numeric value of read_result
                 res = float(vals_str[-1])
-                self.ResetBuffer() # clear the IBM4 buffer after each read            
                 if loud: 
                     print(read_result)
                     print(res) 
@@ -982,7 +1652,7 @@ class Ser_Iface(object):
                 if not c4:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\npos_channel cannot be the same as neg_channel'
                 if not c5:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages outside range [3, 10000]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
@@ -1016,22 +1686,20 @@ class Ser_Iface(object):
             c2 = True if pos_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c3 = True if neg_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c4 = True if neg_channel != pos_channel else False # confirm that the positive channel label is correct
-            c5 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c5 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 and c4 and c5 # if all conditions are true then write can proceed
             
-            if c10:
-                read_cmd = 'Diff_Read%(v1)d:%(v2)d:%(v3)d\r\n'%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list of strings
-                #vals_flt = [float(x) for x in vals_str] # convert the list of strings to floats, save as a list
-                # only interested in the last no_reads values so read backwards into the vals_str list using list-slice operator
-                vals_flt = numpy.float_(vals_str[-no_reads:]) # convert the list of strings to floats using numpy, save as numpy array (better)
+            if c10 and no_reads >= 10000:
+                res = self.ReadLong(pos_channel, no_reads, neg_channel, loud = loud) # too many reads for one command, split into chunks
+                return None if res is None else res[0:3]
+            elif c10:
+                read_cmd = DIFF_READ_CMD%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
+                read_result = bytes( self._Transact(read_cmd, no_vals = no_reads).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_flt = IBM4_Decode.Decode_Floats(read_result, no_reads) # convert the last no_reads values in read_result to a numpy array of floats
                 if loud: 
                     print(read_result)
                     print(vals_flt) # print the parsed values
-                self.ResetBuffer() # clear the IBM4 buffer after each read            
                 vals_mean = numpy.mean(vals_flt) # compute the average of all the diff_reads
                 vals_delta = 0.5*( numpy.max(vals_flt) - numpy.min(vals_flt) ) # compute the range of the diff_read
                 res = [vals_mean, vals_delta, vals_flt]
@@ -1046,7 +1714,7 @@ class Ser_Iface(object):
                 if not c4:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\npos_channel cannot be the same as neg_channel'
                 if not c5:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages outside range [3, 10000]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
@@ -1082,12 +1750,10 @@ class Ser_Iface(object):
             
             if c10:
                 no_reads = 1
-                read_cmd = 'Diff_BRead%(v1)d:%(v2)d:%(v3)d\r\n'%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list of strings
+                read_cmd = DIFF_BREAD_CMD%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
+                read_result = bytes( self._Transact(read_cmd, no_vals = 1).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_str = IBM4_Framing.Reply_Values(read_result) # parse the numeric value of read_result
                 res = int(vals_str[-1])
-                self.ResetBuffer() # clear the IBM4 buffer after each read            
                 if loud: 
                     print(read_result)
                     print(res) 
@@ -1131,19 +1797,19 @@ class Ser_Iface(object):
             c2 = True if pos_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c3 = True if neg_channel in self.Read_Chnnls else False # confirm that the positive channel label is correct
             c4 = True if neg_channel != pos_channel else False # confirm that the positive channel label is correct
-            c5 = True if no_reads > 2 and no_reads < 10000 else False # confirm that no. averages being taken is a sensible value
+            c5 = True if no_reads > 2 else False # confirm that no. averages being taken is a sensible value
         
             c10 = c1 and c2 and c3 and c4 and c5 # if all conditions are true then write can proceed
             
-            if c10:
-                read_cmd = 'Diff_BRead%(v1)d:%(v2)d:%(v3)d\r\n'%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
-                self.instr_obj.write( str.encode(read_cmd) ) # when using serial str must be encoded as bytes
-                read_result = self.instr_obj.read_until('\n',size=None) # read_result returned as bytes, must be cast to str before being parsed
-                vals_str = re.findall(r'[-+]?\d+[\.]?\d*', str(read_result) ) # parse the numeric values of read_result into a list of strings
-                #vals_flt = [float(x) for x in vals_str] # convert the list of strings to floats, save as a list
-                # only interested in the last no_reads values so read backwards into the vals_str list using list-slice operator
-                vals_int = numpy.int_(vals_str[-no_reads:]) # convert the list of strings to floats using numpy, save as numpy array (better)
-                self.ResetBuffer() # clear the IBM4 buffer after each read            
+            if c10 and no_reads >= 10000:
+                vals, no_failed, timing = self._ReadChunks(DIFF_BREAD_CMD, {"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel]}, no_reads, binary = True) # too many reads for one command, see ReadLong
+                if no_failed > 0:
+                    raise TimeoutError('%(v1)d chunks of the read timed out'%{"v1":no_failed})
+                return vals.astype(numpy.int64)
+            elif c10:
+                read_cmd = DIFF_BREAD_CMD%{"v1":self.Read_Chnnls[pos_channel], "v2":self.Read_Chnnls[neg_channel], "v3":no_reads}
+                read_result = bytes( self._Transact(read_cmd, no_vals = no_reads).body ) # reply to read_cmd, echo and stale lines removed by the framer
+                vals_int = IBM4_Decode.Decode_Ints(read_result, no_reads) # convert the last no_reads values in read_result to a numpy array of ints
                 if loud: 
                     print(read_result)
                     print(vals_int) # print the parsed values                
@@ -1158,7 +1824,7 @@ class Ser_Iface(object):
                 if not c4:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\npos_channel cannot be the same as neg_channel'
                 if not c5:
-                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages outside range [3, 10000]'
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not read from instrument\nno_averages must be at least 3'
                 raise Exception
         except Exception as e:
             print(self.ERR_STATEMENT)
@@ -1317,7 +1983,106 @@ class Ser_Iface(object):
         print('Differential Read Value = %(v1)0.3f +/- %(v2)0.3f (V)'%{"v1":diff_res[0], "v2":diff_res[1]})
         
     # methods for initiating voltage sweeps
-    def SingleChannelSweepA(self, swp_channel, v_strt, v_end, no_steps, v_fixed = 0.0, no_averages = 10):
+    def _Settle(self, settle_channel, settle_tol = 0.01, settle_max = 0.25, settle_window = 0.02):
+        """
+        Wait for the voltage at settle_channel to stop changing after a write
+
+        Single reads are taken back to back until all the reads taken over the last settle_window seconds, at least two,
+        lie within settle_tol (V) of each other, or until settle_max seconds have passed
+        Judging stability over a fixed time window rather than a fixed no. of reads means that a slow ramp,
+        e.g. an RC load, is not taken as settled just because consecutive reads are close together
+
+        Returns the time taken to settle in seconds, a value >= settle_max means the channel did not settle
+        """
+
+        start = time.perf_counter()
+        times = [] # time of each read relative to start
+        volts = [] # voltage of each read
+        while True:
+            volts.append( self.ReadSingleVoltage(settle_channel) )
+            elapsed = time.perf_counter() - start
+            times.append(elapsed)
+            if elapsed >= settle_window:
+                # the reads inside the window, plus the last read before it so that the whole window is covered
+                first = max(0, numpy.searchsorted(times, elapsed - settle_window) - 1)
+                window = volts[first:]
+                # a single read says nothing about stability, e.g. when one read takes longer than settle_window
+                if len(window) >= 2 and None not in window and max(window) - min(window) <= settle_tol:
+                    return elapsed
+            if elapsed >= settle_max:
+                return elapsed
+
+    def _Sweep(self, swp_channel, set_points, fixed_channel, v_fixed, no_averages, settle_channel = None, settle_tol = 0.01, settle_max = 0.25, sweep_file = None, sync_every = 10):
+        """
+        Sweep engine shared by SingleChannelSweepA and SingleChannelSweepB
+
+        swp_channel is set to each of the voltages in set_points (type: numpy array) in turn while fixed_channel is held at v_fixed
+        the averaged voltages at all analog input channels are read at each step
+
+        The result is sized from set_points before the sweep starts and each step is written into its row in place,
+        rather than growing the result with numpy.append / numpy.vstack, which copied the whole array on every step
+        and returned a 1D array for a single step sweep
+
+        settle_channel = None => a fixed delay of 0.25s is applied after each write
+        otherwise the sweep waits for the voltage at settle_channel to settle, see _Settle, and the settle time of each step is recorded
+
+        Output is a numpy array of shape (len(set_points), 6), each row of the form
+        [v_set, A2, A3, A4, A5, D2]
+        or of shape (len(set_points), 7) when settle_channel is specified, each row of the form
+        [v_set, A2, A3, A4, A5, D2, t_settle]
+        failed reads are stored as nan
+
+        sweep_file = None => the result is only held in memory
+        otherwise each step is appended to the file sweep_file as soon as it is measured, see IBM4_SweepFile, with an fsync every sync_every steps.
+        If sweep_file already holds part of the same sweep, the steps it holds are not measured again, the sweep resumes after them.
+        A step at which every read fails, e.g. because the link has dropped, ends the sweep without being written,
+        the sweep can then be resumed by repeating the same call
+        """
+
+        DELAY = 0.25 # timed delay value in units of seconds
+        no_cols = 1 + len(self.Read_Chnnls) + (0 if settle_channel is None else 1)
+        voltage_data = numpy.full( (len(set_points), no_cols), numpy.nan ) # instantiate the array to store the sweep data
+        voltage_data[:, 0] = set_points # store the set-voltage value for each step
+        first = 0 # the first step to be measured
+        store = None
+        if sweep_file is not None:
+            params = {"swp_channel":swp_channel, "fixed_channel":fixed_channel, "v_fixed":float(v_fixed), "no_averages":no_averages,
+                      "settle_channel":settle_channel, "settle_tol":settle_tol, "settle_max":settle_max, "set_points":[float(v) for v in set_points]}
+            columns = ['v_set'] + list(self.Read_Chnnls) + ([] if settle_channel is None else ['t_settle'])
+            store = IBM4_SweepFile.SweepFile(sweep_file, params, columns, sync_every)
+            first = len(store.done)
+            voltage_data[:first] = store.done
+            if first > 0:
+                print('Resuming sweep from',sweep_file,'at step',first,'of',len(set_points))
+        self.WriteVoltage(fixed_channel, v_fixed) # Set the voltage on the channel that is NOT sweeping
+        # perform the sweep
+        print('\nLinear Sweep in Progress')
+        print('Sweeping voltage on Analog Output:',swp_channel)
+        print('Fixed voltage of',v_fixed,'(V) on Analog Output:',fixed_channel,'\n')
+        interrupted = False
+        try:
+            for i in range(first, len(set_points), 1):
+                self.WriteVoltage(swp_channel, set_points[i]) # set the voltage at the analog output channel
+                if settle_channel is None:
+                    time.sleep(DELAY) # Apply a fixed delay
+                else:
+                    voltage_data[i, -1] = self._Settle(settle_channel, settle_tol, settle_max) # wait only as long as the load needs
+                voltage_data[i, 1:1 + len(self.Read_Chnnls)] = self.ReadAverageVoltageAllChnnl(no_averages) # store the averaged voltages at all analog input channels for this step
+                if store is not None:
+                    if numpy.all( numpy.isnan(voltage_data[i, 1:1 + len(self.Read_Chnnls)]) ):
+                        print('Sweep interrupted at step',i,'of',len(set_points),'repeat the sweep to resume from',sweep_file)
+                        interrupted = True
+                        break
+                    store.Append(voltage_data[i])
+        finally:
+            if store is not None:
+                store.Close()
+        if not interrupted:
+            print('Sweep complete')
+        self.ZeroIBM4() # ground the analog outputs
+        return voltage_data
+
+    def SingleChannelSweepA(self, swp_channel, v_strt, v_end, no_steps, v_fixed = 0.0, no_averages = 10, settle_channel = None, settle_tol = 0.01, settle_max = 0.25, sweep_file = None, sync_every = 10):
     
         """
         Enable the microcontroller to perform a linear sweep of measurements using a single channel
@@ -1330,9 +2095,16 @@ class Ser_Iface(object):
         no_steps is the number of voltage steps
         v_fixed is the constant voltage to be output by the channel that is NOT being swept
         caveat emptor no_steps is constrained by fact that smallest voltage increment is 0.01V
+        settle_channel = None => fixed delay of 0.25s after each voltage step
+        settle_channel is one of A2, A3, A4, A5, D2 => adaptive settle, after each voltage step single reads are taken at settle_channel
+        until it is stable within settle_tol (V), or settle_max (s) has passed
+        sweep_file is the name of a file to which each step is written as it is measured, a sweep interrupted part way
+        is resumed by repeating the call with the same sweep_file, see _Sweep
 
-        Output is a numpy array of the form
+        Output is a numpy array of shape (no. set-points, 6), each row of the form
         [v_set, A2, A3, A4, A5, D2]
+        with adaptive settle the settle time of each step is appended, shape (no. set-points, 7)
+        [v_set, A2, A3, A4, A5, D2, t_settle]
         """
 
         # R. Sheehan 30 - 5 - 2024
@@ -1354,39 +2126,15 @@ class Ser_Iface(object):
             c8 = True if v_fixed >= self.VMIN and v_fixed <= self.VMAX else False # confirm that the fixed voltage is in range
             c6 = True if no_steps > 2 else False # confirm that the no. of steps is appropriate
             c7 = True if no_averages > 3 and no_averages < 103 else False # confirm that no. averages being taken is a sensible value
-            c10 = c1 and c2 and c3 and c4 and c5 and c6 and c7 and c8
+            c9 = True if settle_channel is None or (settle_channel in self.Read_Chnnls and settle_tol > 0 and settle_max > 0) else False # confirm that the settle parameters are sensible
+            c10 = c1 and c2 and c3 and c4 and c5 and c6 and c7 and c8 and c9
         
             if c10:
                 # Set the voltage on the channel that is NOT sweeping
                 fixed_channel = 'A1' if swp_channel == 'A0' else 'A0'
-                self.WriteVoltage(fixed_channel, v_fixed)
                 # Proceed with the single channel linear voltage sweep
-                DELAY = 0.25 # timed delay value in units of seconds
-                voltage_data = numpy.array([]) # instantiate an empty numpy array to store the sweep data
                 delta_v = max( (v_end - v_strt) / float(no_steps - 1), self.DELTA_VMIN) # Determine the sweep voltage increment, this is bounded below by delta_v_min
-                v_set = v_strt # initialise the set-voltage
-                # perform the sweep
-                print('\nLinear Sweep in Progress')
-                print('Sweeping voltage on Analog Output:',swp_channel)
-                print('Fixed voltage of',v_fixed,'(V) on Analog Output:',fixed_channel,'\n')
-                count = 0
-                while v_set < v_end:
-                    step_data = numpy.array([]) # instantiate an empty numpy array to hold the data for each step of the sweep
-                    self.WriteVoltage(swp_channel, v_set) # set the voltage at the analog output channel
-                    time.sleep(DELAY) # Apply a fixed delay
-                    chnnl_values = self.ReadAverageVoltageAllChnnl(no_averages) # read the averaged voltages at all analog input channels
-                    # save the data
-                    step_data = numpy.append(step_data, v_set) # store the set-voltage value for this step
-                    step_data = numpy.append(step_data, chnnl_values) # store the  measured voltage values from all channels for this step
-                    # store the  set-voltage and the measured voltage values from all channels for this step
-                    # use append on the first step to initialise the voltage_data array
-                    # use vstack on subsequent steps to build up the 2D array of data
-                    voltage_data = numpy.append(voltage_data, step_data) if count == 0 else numpy.vstack([voltage_data, step_data])
-                    v_set = v_set + delta_v # increment the set-voltage
-                    count = count + 1 if count == 0 else count # only need to increment count once to build up the array
-                print('Sweep complete')
-                self.ZeroIBM4() # ground the analog outputs
-                return voltage_data
+                return self._Sweep(swp_channel, Sweep_Interval.Set_Points(v_strt, v_end, delta_v), fixed_channel, v_fixed, no_averages, settle_channel, settle_tol, settle_max, sweep_file, sync_every)
             else:
                 if not c1:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
@@ -1400,12 +2148,14 @@ class Ser_Iface(object):
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nn_averages not defined correctly'
                 if not c8:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nv_fixed not in the correct range'
+                if not c9:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nsettle_channel, settle_tol, settle_max not defined correctly'
                 raise Exception        
         except Exception as e:
             print(self.ERR_STATEMENT)
             print(e)    
             
-    def SingleChannelSweepB(self, swp_channel, voltage_interval:Sweep_Interval.SweepSpace, v_fixed = 0.0, no_averages = 10):
+    def SingleChannelSweepB(self, swp_channel, voltage_interval:Sweep_Interval.SweepSpace, v_fixed = 0.0, no_averages = 10, settle_channel = None, settle_tol = 0.01, settle_max = 0.25, sweep_file = None, sync_every = 10):
     
         """
         Enable the microcontroller to perform a linear sweep of measurements using a single channel
@@ -1416,9 +2166,16 @@ class Ser_Iface(object):
         voltage_interval describes the voltage sweep space
         v_fixed is the constant voltage to be output by the channel that is NOT being swept
         caveat emptor no_steps is constrained by fact that smallest voltage increment is 0.01V
+        settle_channel = None => fixed delay of 0.25s after each voltage step
+        settle_channel is one of A2, A3, A4, A5, D2 => adaptive settle, after each voltage step single reads are taken at settle_channel
+        until it is stable within settle_tol (V), or settle_max (s) has passed
+        sweep_file is the name of a file to which each step is written as it is measured, a sweep interrupted part way
+        is resumed by repeating the call with the same sweep_file, see _Sweep
 
-        Output is a numpy array of the form
+        Output is a numpy array of shape (no. set-points, 6), each row of the form
         [v_set, A2, A3, A4, A5, D2]
+        with adaptive settle the settle time of each step is appended, shape (no. set-points, 7)
+        [v_set, A2, A3, A4, A5, D2, t_settle]
         """
 
         # Notes on syntax for passing a class as an argument
@@ -1446,38 +2203,14 @@ class Ser_Iface(object):
             c3 = voltage_interval.defined # check that the parameters in the interval have been defined correctly
             c7 = True if no_averages > 3 and no_averages < 103 else False # confirm that no. averages being taken is a sensible value
             c8 = True if v_fixed >= self.VMIN and v_fixed < self.VMAX else False # confirm that the fixed voltage is in range
-            c10 = c1 and c2 and c3 and c7 and c8
+            c9 = True if settle_channel is None or (settle_channel in self.Read_Chnnls and settle_tol > 0 and settle_max > 0) else False # confirm that the settle parameters are sensible
+            c10 = c1 and c2 and c3 and c7 and c8 and c9
         
             if c10:
                 # Set the voltage on the channel that is NOT sweeping
                 fixed_channel = 'A1' if swp_channel == 'A0' else 'A0'
-                self.WriteVoltage(fixed_channel, v_fixed)
                 # Proceed with the single channel linear voltage sweep
-                DELAY = 0.25 # timed delay value in units of seconds
-                voltage_data = numpy.array([]) # instantiate an empty numpy array to store the sweep data
-                v_set = voltage_interval.start # initialise the set-voltage
-                # perform the sweep
-                print('\nLinear Sweep in Progress')
-                print('Sweeping voltage on Analog Output:',swp_channel)
-                print('Fixed voltage of',v_fixed,'(V) on Analog Output:',fixed_channel,'\n')
-                count = 0
-                while v_set < voltage_interval.stop:
-                    step_data = numpy.array([]) # instantiate an empty numpy array to hold the data for each step of the sweep
-                    self.WriteVoltage(swp_channel, v_set) # set the voltage at the analog output channel
-                    time.sleep(DELAY) # Apply a fixed delay
-                    chnnl_values = self.ReadAverageVoltageAllChnnl(no_averages) # read the averaged voltages at all analog input channels
-                    # save the data
-                    step_data = numpy.append(step_data, v_set) # store the set-voltage value for this step
-                    step_data = numpy.append(step_data, chnnl_values) # store the  measured voltage values from all channels for this step
-                    # store the  set-voltage and the measured voltage values from all channels for this step
-                    # use append on the first step to initialise the voltage_data array
-                    # use vstack on subsequent steps to build up the 2D array of data
-                    voltage_data = numpy.append(voltage_data, step_data) if count == 0 else numpy.vstack([voltage_data, step_data])
-                    v_set = v_set + voltage_interval.delta # increment the set-voltage
-                    count = count + 1 if count == 0 else count # only need to increment count once to build up the array
-                print('Sweep complete')
-                self.ZeroIBM4() # ground the analog outputs
-                return voltage_data
+                return self._Sweep(swp_channel, voltage_interval.SetPoints(), fixed_channel, v_fixed, no_averages, settle_channel, settle_tol, settle_max, sweep_file, sync_every)
             else:
                 if not c1:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
@@ -1489,8 +2222,137 @@ class Ser_Iface(object):
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nn_averages not defined correctly'
                 if not c8:
                     self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nv_fixed not in the correct range'
+                if not c9:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nsettle_channel, settle_tol, settle_max not defined correctly'
                 raise Exception        
         except Exception as e:
             print(self.ERR_STATEMENT)
             print(e)    
-        
\ No newline at end of file
+        
+    def ProgramSweep(self, swp_channel, program:Sweep_Interval.SweepProgram, v_fixed = 0.0, no_averages = 10, settle_channel = None, settle_tol = 0.01, settle_max = 0.25, sweep_file = None, sync_every = 10):
+
+        """
+        Sweep swp_channel through the compiled set-points of a SweepProgram, e.g. an up / down ramp for a hysteresis measurement
+
+        The program is compiled once, see Sweep_Interval.SweepProgram.Compile, and all of its segments are swept as one continuous run,
+        the outputs are not zeroed between segments, only at the end of the sweep.
+        Use program.SegmentIndex() to split the rows of the output by segment
+
+        swp_channel is the channel being used as a voltage source
+        program describes the set-points of the sweep
+        the remaining parameters are those of SingleChannelSweepB
+
+        Output is a numpy array of shape (no. set-points, 6), each row of the form
+        [v_set, A2, A3, A4, A5, D2]
+        with adaptive settle the settle time of each step is appended, shape (no. set-points, 7)
+        [v_set, A2, A3, A4, A5, D2, t_settle]
+        """
+
+        self.FUNC_NAME = ".ProgramSweep()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            c1 = self.instr_obj.isOpen() # confirm that the intstrument object has been instantiated
+            c2 = True if swp_channel in self.Write_Chnnls else False # confirm that the output channel label is correct
+            set_points = program.SetPoints() if program.defined else numpy.array([])
+            c3 = True if len(set_points) > 0 and numpy.min(set_points) >= self.VMIN and numpy.max(set_points) < self.VMAX else False # check that the program is defined and in range, WriteVoltage rejects VMAX
+            c7 = True if no_averages > 3 and no_averages < 103 else False # confirm that no. averages being taken is a sensible value
+            c8 = True if v_fixed >= self.VMIN and v_fixed < self.VMAX else False # confirm that the fixed voltage is in range
+            c9 = True if settle_channel is None or (settle_channel in self.Read_Chnnls and settle_tol > 0 and settle_max > 0) else False # confirm that the settle parameters are sensible
+            c10 = c1 and c2 and c3 and c7 and c8 and c9
+
+            if c10:
+                # Set the voltage on the channel that is NOT sweeping
+                fixed_channel = 'A1' if swp_channel == 'A0' else 'A0'
+                return self._Sweep(swp_channel, set_points, fixed_channel, v_fixed, no_averages, settle_channel, settle_tol, settle_max, sweep_file, sync_every)
+            else:
+                if not c1:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\noutput_channel outside range {A0, A1}'
+                if not c3:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nsweep program not defined or not in range [0.0, 3.3)'
+                if not c7:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nn_averages not defined correctly'
+                if not c8:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nv_fixed not in the correct range [0.0, 3.3)'
+                if not c9:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nsettle_channel, settle_tol, settle_max not defined correctly'
+                raise Exception
+        except Exception as e:
+            print(self.ERR_STATEMENT)
+            print(e)
+
+    def TwoChannelSweep(self, interval_A0:Sweep_Interval.SweepSpace, interval_A1:Sweep_Interval.SweepSpace, no_averages = 10, settle_channel = None, settle_tol = 0.01, settle_max = 0.25):
+
+        """
+        Sweep both analog outputs over a grid, A0 over interval_A0 and A1 over interval_A1, reading all analog inputs at each grid point
+
+        The grid is traversed in serpentine order, see Sweep_Interval.Serpentine, A1 sweeps up on one row of A0 and down on the next,
+        so that consecutive grid points differ by one step of a single output and the outputs never fly back across their whole range.
+        A0 is only written when it changes, i.e. once per row.
+        The result is sized from the two intervals before the sweep starts and each grid point is written into place
+
+        settle_channel = None => fixed delay of 0.25s after each voltage step
+        settle_channel is one of A2, A3, A4, A5, D2 => adaptive settle, see _Settle, the settle time of each point is recorded
+
+        Output is a numpy array of shape (n0, n1, 5), n0, n1 the no. of set-points of interval_A0, interval_A1
+        result[i, j] = [A2, A3, A4, A5, D2] read with A0 at interval_A0.SetPoints()[i] and A1 at interval_A1.SetPoints()[j]
+        with adaptive settle the settle time of each point is appended, shape (n0, n1, 6)
+        failed reads are stored as nan
+        """
+
+        # This is the two channel sweep anticipated in SingleChannelSweepB
+        # returning a 3D array indexed by [A0 step, A1 step, channel] avoids the unwieldy flattened output array described there
+        # R. Sheehan 23 - 7 - 2024
+
+        self.FUNC_NAME = ".TwoChannelSweep()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            c1 = self.instr_obj.isOpen() # confirm that the intstrument object has been instantiated
+            c2 = interval_A0.defined and interval_A0.start >= self.VMIN and interval_A0.stop <= self.VMAX # check that the A0 sweep space is defined and in range
+            c3 = interval_A1.defined and interval_A1.start >= self.VMIN and interval_A1.stop <= self.VMAX # check that the A1 sweep space is defined and in range
+            c7 = True if no_averages > 3 and no_averages < 103 else False # confirm that no. averages being taken is a sensible value
+            c9 = True if settle_channel is None or (settle_channel in self.Read_Chnnls and settle_tol > 0 and settle_max > 0) else False # confirm that the settle parameters are sensible
+            c10 = c1 and c2 and c3 and c7 and c9
+
+            if c10:
+                DELAY = 0.25 # timed delay value in units of seconds
+                set_A0 = interval_A0.SetPoints()
+                set_A1 = interval_A1.SetPoints()
+                no_chnnls = len(self.Read_Chnnls)
+                voltage_data = numpy.full( (len(set_A0), len(set_A1), no_chnnls + (0 if settle_channel is None else 1)), numpy.nan ) # instantiate the array to store the sweep data
+
+                print('\nGrid Sweep in Progress')
+                print('Sweeping voltage on Analog Output A0 over',len(set_A0),'steps')
+                print('Sweeping voltage on Analog Output A1 over',len(set_A1),'steps\n')
+                i_last = -1
+                for i, j in Sweep_Interval.Serpentine(len(set_A0), len(set_A1)):
+                    if i != i_last:
+                        self.WriteVoltage('A0', set_A0[i]) # step A0 at the start of each row
+                        i_last = i
+                    self.WriteVoltage('A1', set_A1[j])
+                    if settle_channel is None:
+                        time.sleep(DELAY) # Apply a fixed delay
+                    else:
+                        voltage_data[i, j, -1] = self._Settle(settle_channel, settle_tol, settle_max) # wait only as long as the load needs
+                    voltage_data[i, j, :no_chnnls] = self.ReadAverageVoltageAllChnnl(no_averages) # store the averaged voltages at all analog input channels for this point
+                print('Sweep complete')
+                self.ZeroIBM4() # ground the analog outputs
+                return voltage_data
+            else:
+                if not c1:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                if not c2:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nA0 voltage sweep bounds not defined or not in range [0.0, 3.3]'
+                if not c3:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nA1 voltage sweep bounds not defined or not in range [0.0, 3.3]'
+                if not c7:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nn_averages not defined correctly'
+                if not c9:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nCould not write to instrument\nsettle_channel, settle_tol, settle_max not defined correctly'
+                raise Exception
+        except Exception as e:
+            print(self.ERR_STATEMENT)
+            print(e)
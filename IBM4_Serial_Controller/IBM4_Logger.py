@@ -0,0 +1,200 @@
+"""
+Periodic datalogging of the IBM4 analog inputs
+
+Calling ReadAverageVoltageAllChnnl in a loop with time.sleep(interval) makes the period interval + the read time,
+so the sample times drift by the read duration on every row and cannot be predicted.
+A DataLogger schedules scan k at t0 + k*interval on the monotonic clock, it sleeps only until the next deadline,
+so the time taken by each read is absorbed rather than accumulated. When a scan overruns one or more deadlines
+those deadlines are counted as missed and skipped, the logger does not burst to catch up, and the schedule is unchanged.
+
+Rows are written as they are taken to a RollingFile, a series of CSV files of at most rows_per_file rows each,
+file_name_0000.csv, file_name_0001.csv, ..., so a run of several days is held on disk, not in memory.
+max_files limits the no. of files kept, the oldest are removed first, e.g.
+
+logger = IBM4_Logger.DataLogger(the_dev, 'Log', interval = 1.0, rows_per_file = 3600, max_files = 48)
+summary = logger.Run(duration = 86400)
+"""
+
+# monotonic clock
+# https://docs.python.org/3/library/time.html#time.monotonic
+
+import os
+import time
+import math
+import threading
+import IBM4_Lib
+
+MOD_NAME_STR = "IBM4_Logger"
+
+class RollingFile(object):
+    """
+    CSV output spread over a series of files of at most rows_per_file rows
+    """
+
+    def __init__(self, file_name, columns, rows_per_file = 3600, max_files = None):
+        """
+        Constructor for the RollingFile object
+
+        file_name (type: str) is the base name of the files, file k is file_name_k.csv, k = 0000, 0001, ...
+        columns (type: list) are the names of the columns, written as the first line of each file
+        rows_per_file (type: int) is the no. of rows after which the next file is started
+        max_files (type: int) is the no. of files kept, None => all files are kept
+        """
+
+        self.file_name = file_name
+        self.columns = list(columns)
+        self.rows_per_file = max(1, rows_per_file)
+        self.max_files = max_files
+        self.files = [] # names of the files written and not removed, oldest first
+        self.the_file = None
+        self.rows = 0 # rows in the current file
+        self.no_files = 0 # files started
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 rolling log %(v1)s, %(v2)d files"%{"v1":self.file_name, "v2":self.no_files}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def _Roll(self):
+        """
+        Close the current file and start the next, removing the oldest file if more than max_files are held
+        """
+
+        self.Close()
+        name = '%(v1)s_%(v2)04d.csv'%{"v1":self.file_name, "v2":self.no_files}
+        self.the_file = open(name, 'w')
+        self.the_file.write(','.join(self.columns) + '\n')
+        self.files.append(name)
+        self.no_files = self.no_files + 1
+        self.rows = 0
+        while self.max_files is not None and len(self.files) > max(1, self.max_files):
+            try:
+                os.remove(self.files.pop(0))
+            except OSError:
+                pass
+
+    def Write(self, line):
+        """
+        Write one formatted row, line must not include the newline
+        each row is flushed so that the file can be followed while the log runs
+        """
+
+        if self.the_file is None or self.rows >= self.rows_per_file:
+            self._Roll()
+        self.the_file.write(line + '\n')
+        self.the_file.flush()
+        self.rows = self.rows + 1
+
+    def Close(self):
+        """
+        Close the current file
+        """
+
+        if self.the_file is not None and not self.the_file.closed:
+            self.the_file.close()
+
+class DataLogger(object):
+    """
+    Scans of all analog input channels taken at a fixed rate on the monotonic clock
+    """
+
+    def __init__(self, the_dev, file_name, interval = 1.0, no_reads = 10, rows_per_file = 3600, max_files = None):
+        """
+        Constructor for the DataLogger object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4
+        file_name (type: str) is the base name of the log files, see RollingFile
+        interval (type: float) is the time between scans in seconds
+        no_reads (type: int) is the no. of reads averaged at each channel in each scan
+        rows_per_file, max_files see RollingFile
+
+        each row is t, late, A2, A3, A4, A5, D2
+        t is the host time.time() at which the scan was complete, late is the time in seconds by which the scan started after its deadline
+        failed reads are written as nan
+        """
+
+        self.the_dev = the_dev
+        self.file_name = file_name
+        self.interval = interval
+        self.no_reads = no_reads
+        self.rows_per_file = rows_per_file
+        self.max_files = max_files
+        self.columns = ['t', 'late'] + list(IBM4_Lib.READ_CHNNLS)
+        self.stop_event = threading.Event()
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 datalogger %(v1)s, interval %(v2)0.3f s"%{"v1":self.file_name, "v2":self.interval}
+
+    def Stop(self):
+        """
+        Stop a Run, e.g. from another thread, the scan in progress is completed and written
+        """
+
+        self.stop_event.set()
+
+    def Run(self, duration = None, max_rows = None, loud = False):
+        """
+        Log until duration seconds have passed, max_rows rows have been written, Stop is called or the user presses Ctrl-C
+
+        Returns a dictionary summarising the run
+        rows: no. rows written, missed: no. deadlines skipped because a scan overran them,
+        max_late_s / mean_late_s: lateness of the start of the scans, files: names of the log files held on disk
+        """
+
+        FUNC_NAME = ".Run()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        self.stop_event.clear()
+        rows = 0
+        missed = 0
+        late_sum = 0.0
+        late_max = 0.0
+        store = RollingFile(self.file_name, self.columns, self.rows_per_file, self.max_files)
+        t0 = time.monotonic()
+        k = 0 # index of the next deadline
+        try:
+            with store:
+                while not self.stop_event.is_set():
+                    deadline = t0 + k*self.interval
+                    if duration is not None and deadline - t0 >= duration:
+                        break
+                    if max_rows is not None and rows >= max_rows:
+                        break
+                    wait = deadline - time.monotonic()
+                    if wait > 0 and self.stop_event.wait(wait):
+                        break
+                    late = time.monotonic() - deadline
+                    scan = self.the_dev.ScanAllChnnl(self.no_reads)
+                    if scan is None:
+                        raise Exception('Scan could not be made, logging stopped') # e.g. no_reads out of range, every scan would fail
+                    scan = scan[0]
+                    store.Write( '%(v1)0.6f,%(v2)0.6f,'%{"v1":scan["t"], "v2":late} + ','.join(['%0.4f'%scan[ch] for ch in IBM4_Lib.READ_CHNNLS]) )
+                    rows = rows + 1
+                    late_sum = late_sum + late
+                    late_max = max(late_max, late)
+                    # the next deadline is the first one that has not already passed
+                    k_next = max(k + 1, int( math.ceil( (time.monotonic() - t0)/self.interval ) ))
+                    missed = missed + (k_next - k - 1)
+                    if loud:
+                        print('Row',rows,'late %(v1)0.4f s'%{"v1":late},'missed',missed, [round(float(scan[ch]), 4) for ch in IBM4_Lib.READ_CHNNLS])
+                    k = k_next
+        except KeyboardInterrupt:
+            print('Datalogger stopped by user')
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+        return {"rows":rows, "missed":missed, "elapsed_s":time.monotonic() - t0,
+                "max_late_s":late_max, "mean_late_s":late_sum/rows if rows > 0 else 0.0, "files":list(store.files)}
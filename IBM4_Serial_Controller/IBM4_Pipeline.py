@@ -0,0 +1,216 @@
+"""
+Pipelined execution of IBM4 commands
+
+Each Ser_Iface write / read is a strict request / response round trip, so a sweep pays the full link latency several times per step.
+A Pipeline queues several commands, sends them to the IBM4 in one buffered write and then matches the replies back,
+in order, to the concurrent.futures.Future returned when each command was queued, e.g.
+
+pipe = the_dev.Pipeline()
+pipe.WriteVoltage('A0', 1.5)
+f2 = pipe.Average('A2', 100)
+f3 = pipe.Read('A3', 50)
+results = pipe.Execute() # results = [None, f2.result(), f3.result()]
+"""
+
+# https://docs.python.org/3/library/concurrent.futures.html#future-objects
+
+import concurrent.futures
+import numpy
+import IBM4_Lib
+import IBM4_Decode
+import IBM4_Framing
+
+MOD_NAME_STR = "IBM4_Pipeline"
+
+class Pipeline(object):
+    """
+    Queue of IBM4 commands that are sent in a single write
+    """
+
+    def __init__(self, the_dev):
+        """
+        Constructor for the Pipeline object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4 that will execute the commands
+        """
+
+        self.MOD_NAME_STR = MOD_NAME_STR
+        self.dev = the_dev
+        self.commands = [] # list of [write_cmd, no_vals, no_lines, decode, future]
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "pipeline of %(v1)d IBM4 commands"%{"v1":len(self.commands)}
+
+    def __len__(self):
+        return len(self.commands)
+
+    def _Queue(self, write_cmd, no_vals = 0, no_lines = 0, decode = None):
+        """
+        add a command to the queue, decode is applied to the reply body to obtain the result
+
+        Returns the future that will hold the result
+        """
+
+        fut = concurrent.futures.Future()
+        self.commands.append( [write_cmd, no_vals, no_lines, decode, fut] )
+        return fut
+
+    def _Invalid(self, FUNC_NAME, reason):
+        """
+        report a command that could not be queued
+        """
+
+        print("Error: " + MOD_NAME_STR + FUNC_NAME + '\nCould not queue command\n' + reason)
+        return None
+
+    # commands that can be queued
+
+    def WriteVoltage(self, output_channel, set_voltage = 0.0):
+        """
+        queue a Write command, output_channel is one of A0, A1, set_voltage must be in the range [0.0, 3.3)
+        """
+
+        if output_channel not in IBM4_Lib.WRITE_CHNNLS:
+            return self._Invalid(".WriteVoltage()", 'output_channel outside range {A0, A1}')
+        if set_voltage < IBM4_Lib.VMIN or set_voltage >= IBM4_Lib.VMAX:
+            return self._Invalid(".WriteVoltage()", 'set_voltage outside range [0.0, 3.3)')
+        return self._Queue( IBM4_Lib.WRITE_CMD%{"v1":IBM4_Lib.WRITE_CHNNLS[output_channel], "v2":set_voltage} )
+
+    def WritePWM(self, percentage):
+        """
+        queue a PWM command on D9, percentage must be in the range [0, 100]
+        """
+
+        if percentage < 0 or percentage >= 101:
+            return self._Invalid(".WritePWM()", 'percentage outside range [0, 100]')
+        return self._Queue( IBM4_Lib.PWM_CMD%{"v1":IBM4_Lib.PWM_CHNNLS["D9"], "v2":percentage} )
+
+    def Identify(self):
+        """
+        queue an *IDN command, the result is the identity string as bytes
+        """
+
+        return self._Queue( IBM4_Lib.IDN_CMD, no_lines = 1, decode = lambda body: bytes(body).strip() )
+
+    def Average(self, input_channel, no_reads = 10):
+        """
+        queue an Average command, the result is the average voltage at input_channel
+        """
+
+        if input_channel not in IBM4_Lib.READ_CHNNLS:
+            return self._Invalid(".Average()", 'input_channel outside range {A2, A3, A4, A5, D2}')
+        if no_reads < 3 or no_reads >= 10000:
+            return self._Invalid(".Average()", 'no_reads outside range [3, 10000)')
+        read_cmd = IBM4_Lib.AVERAGE_CMD%{"v1":IBM4_Lib.READ_CHNNLS[input_channel], "v2":no_reads}
+        return self._Queue( read_cmd, no_vals = 1, decode = lambda body: float(IBM4_Framing.Reply_Values(body)[-1]) )
+
+    def Read(self, input_channel, no_reads = 10):
+        """
+        queue a Read command, the result is a numpy array of the no_reads voltages read at input_channel
+        """
+
+        if input_channel not in IBM4_Lib.READ_CHNNLS:
+            return self._Invalid(".Read()", 'input_channel outside range {A2, A3, A4, A5, D2}')
+        if no_reads < 1 or no_reads >= 10000:
+            return self._Invalid(".Read()", 'no_reads outside range [1, 10000)')
+        read_cmd = IBM4_Lib.READ_CMD%{"v1":IBM4_Lib.READ_CHNNLS[input_channel], "v2":no_reads}
+        return self._Queue( read_cmd, no_vals = no_reads, decode = lambda body: IBM4_Decode.Decode_Floats(body, no_reads) )
+
+    def BRead(self, input_channel, no_reads = 10):
+        """
+        queue a BRead command, the result is a numpy array of the no_reads binary values read at input_channel
+        """
+
+        if input_channel not in IBM4_Lib.READ_CHNNLS:
+            return self._Invalid(".BRead()", 'input_channel outside range {A2, A3, A4, A5, D2}')
+        if no_reads < 1 or no_reads >= 10000:
+            return self._Invalid(".BRead()", 'no_reads outside range [1, 10000)')
+        read_cmd = IBM4_Lib.BREAD_CMD%{"v1":IBM4_Lib.READ_CHNNLS[input_channel], "v2":no_reads}
+        return self._Queue( read_cmd, no_vals = no_reads, decode = lambda body: IBM4_Decode.Decode_Ints(body, no_reads) )
+
+    def DiffRead(self, pos_channel, neg_channel, no_reads = 10):
+        """
+        queue a Diff_Read command, the result is a numpy array of the no_reads differential voltages pos_channel - neg_channel
+        """
+
+        if pos_channel not in IBM4_Lib.READ_CHNNLS or neg_channel not in IBM4_Lib.READ_CHNNLS or pos_channel == neg_channel:
+            return self._Invalid(".DiffRead()", 'pos_channel, neg_channel incorrectly specified')
+        if no_reads < 1 or no_reads >= 10000:
+            return self._Invalid(".DiffRead()", 'no_reads outside range [1, 10000)')
+        read_cmd = IBM4_Lib.DIFF_READ_CMD%{"v1":IBM4_Lib.READ_CHNNLS[pos_channel], "v2":IBM4_Lib.READ_CHNNLS[neg_channel], "v3":no_reads}
+        return self._Queue( read_cmd, no_vals = no_reads, decode = lambda body: IBM4_Decode.Decode_Floats(body, no_reads) )
+
+    def DiffAverage(self, pos_channel, neg_channel, no_reads = 10):
+        """
+        queue a Diff_Average command, the result is the average differential voltage pos_channel - neg_channel
+        """
+
+        if pos_channel not in IBM4_Lib.READ_CHNNLS or neg_channel not in IBM4_Lib.READ_CHNNLS or pos_channel == neg_channel:
+            return self._Invalid(".DiffAverage()", 'pos_channel, neg_channel incorrectly specified')
+        if no_reads < 3 or no_reads >= 10000:
+            return self._Invalid(".DiffAverage()", 'no_reads outside range [3, 10000)')
+        read_cmd = IBM4_Lib.DIFF_AVERAGE_CMD%{"v1":IBM4_Lib.READ_CHNNLS[pos_channel], "v2":IBM4_Lib.READ_CHNNLS[neg_channel], "v3":no_reads}
+        return self._Queue( read_cmd, no_vals = 1, decode = lambda body: float(IBM4_Framing.Reply_Values(body)[-1]) )
+
+    # execution
+
+    def Execute(self, loud = False):
+        """
+        Send all queued commands in one write and collect the replies
+
+        Returns a list with the result of each queued command, in order, None for writes and for commands that failed
+        The queue is emptied so that the Pipeline object can be reused
+        """
+
+        FUNC_NAME = ".Execute()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        commands = self.commands
+        self.commands = []
+
+        try:
+            if self.dev.instr_obj is None or not self.dev.instr_obj.isOpen():
+                ERR_STATEMENT = ERR_STATEMENT + '\nCould not write to instrument\nNo comms established'
+                raise Exception
+
+            with self.dev.io_lock:
+                # register every command with the framer before anything is sent
+                reqs = [self.dev.framer.Expect(str.encode(cmd[0]), cmd[1], cmd[2]) for cmd in commands]
+                self.dev._Write( str.encode( ''.join([cmd[0] for cmd in commands]) ) )
+
+                # only wait for the commands that return data, writes are complete once sent
+                awaited = [req for req in reqs if not req.EchoOnly()]
+                complete = self.dev._Collect(awaited)
+                if not complete:
+                    # any part of a reply that arrives later is dropped as stale, done under io_lock as the framer is shared
+                    for req in awaited:
+                        if not req.complete:
+                            self.dev.framer.Discard(req)
+
+            results = []
+            for cmd, req in zip(commands, reqs):
+                write_cmd, no_vals, no_lines, decode, fut = cmd
+                if req.EchoOnly():
+                    fut.set_result(None)
+                elif req.complete:
+                    fut.set_result( decode(req.body) )
+                else:
+                    fut.set_exception( TimeoutError('No reply to ' + write_cmd.strip()) )
+                results.append( fut.result() if fut.exception() is None else None )
+                if loud:
+                    print(write_cmd.strip(), bytes(req.body))
+            if not complete:
+                ERR_STATEMENT = ERR_STATEMENT + '\nTimed out waiting for replies'
+                raise Exception
+            return results
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+            for cmd in commands:
+                if not cmd[4].done():
+                    cmd[4].set_exception(e)
+            return [cmd[4].result() if cmd[4].exception() is None else None for cmd in commands]
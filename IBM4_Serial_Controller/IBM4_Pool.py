@@ -0,0 +1,154 @@
+"""
+A pool of IBM4 operated together
+
+A rig may have several IBM4 attached, a Ser_Iface talks to a single board and FindIBM4 stops at the first one found.
+An IBM4Pool opens every IBM4 found by IBM4_Discovery.Find_All_IBM4, or a given list of ports,
+and runs the same operation on all boards at the same time, one thread per board,
+so that an operation on the pool takes about as long as it takes on the slowest board, e.g.
+
+with IBM4_Pool.IBM4Pool() as pool:
+    for res in pool.ReadAverageVoltageAllChnnl(10):
+        print(res["port"], res["t_done"] - res["t_start"], res["result"])
+
+The result of each operation is a list with one dictionary per board, in the order of pool.ports, holding
+port, result, t_start, t_done (host time.time() at which the operation started / finished on that board) and error
+"""
+
+# concurrent.futures
+# https://docs.python.org/3/library/concurrent.futures.html
+
+import time
+import concurrent.futures
+import numpy
+import IBM4_Lib
+import IBM4_Discovery
+
+MOD_NAME_STR = "IBM4_Pool"
+
+class IBM4Pool(object):
+    """
+    Several IBM4 operated concurrently
+    """
+
+    def __init__(self, port_names = None, read_mode = 'DC', loud = False):
+        """
+        Constructor for the IBM4Pool object
+
+        port_names (type: list) are the ports to which the IBM4 are attached
+        port_names = None => every IBM4 attached to the PC is opened
+        read_mode is the reading mode used for every IBM4, see IBM4_Lib.Ser_Iface
+        """
+
+        FUNC_NAME = ".IBM4Pool()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        self.ports = []
+        self.devs = []
+        self.executor = None
+        try:
+            if port_names is None:
+                port_names = [port for port, idn in IBM4_Discovery.Find_All_IBM4(loud)]
+
+            if len(port_names) > 0:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = len(port_names), thread_name_prefix = MOD_NAME_STR)
+                # the boards are opened concurrently as well, each open sets the read mode and zeroes the outputs
+                devs = list( self.executor.map(lambda port: IBM4_Lib.Ser_Iface(port, read_mode), port_names) )
+                for port, dev in zip(port_names, devs):
+                    if dev.instr_obj is not None and dev.instr_obj.isOpen():
+                        self.ports.append(port)
+                        self.devs.append(dev)
+                    elif loud:
+                        print('Could not open IBM4 at',port)
+            else:
+                ERR_STATEMENT = ERR_STATEMENT + '\nNo IBM4 attached to PC'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "pool of %(v1)d IBM4 at %(v2)s"%{"v1":len(self.devs), "v2":', '.join(self.ports)}
+
+    def __len__(self):
+        return len(self.devs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def Close(self):
+        """
+        Zero the outputs of every IBM4 in the pool and close the links
+        """
+
+        if len(self.devs) > 0:
+            self.ZeroIBM4()
+            for dev in self.devs:
+                print('Closing Serial link with:',dev.instr_obj.name)
+                dev.instr_obj.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def Run(self, operation, *args, **kwargs):
+        """
+        Run operation on every IBM4 in the pool at the same time
+
+        operation is either the name of a Ser_Iface method, e.g. 'ReadAverageVoltageAllChnnl',
+        or a function whose first argument is a Ser_Iface, the remaining arguments are passed on to it
+
+        Returns a list of dictionaries, one per board in the order of self.ports
+        """
+
+        def timed(dev):
+            res = {"port":dev.IBM4Port, "result":None, "t_start":time.time(), "t_done":0.0, "error":None}
+            try:
+                func = getattr(dev, operation) if isinstance(operation, str) else (lambda *a, **k: operation(dev, *a, **k))
+                res["result"] = func(*args, **kwargs)
+            except Exception as e:
+                res["error"] = e
+            res["t_done"] = time.time()
+            return res
+
+        if self.executor is None:
+            return []
+        return list( self.executor.map(timed, self.devs) )
+
+    # operations that are commonly run on all boards
+
+    def IdentifyIBM4(self):
+        return self.Run('IdentifyIBM4')
+
+    def ZeroIBM4(self):
+        return self.Run('ZeroIBM4')
+
+    def WriteVoltage(self, output_channel, set_voltage = 0.0):
+        return self.Run('WriteVoltage', output_channel, set_voltage)
+
+    def ReadAverageVoltageAllChnnl(self, no_reads = 10, loud = False):
+        return self.Run('ReadAverageVoltageAllChnnl', no_reads, loud)
+
+    def ScanAllChnnl(self, no_reads = 10, loud = False):
+        return self.Run('ScanAllChnnl', no_reads, loud)
+
+    def ReadMultipleVoltage(self, input_channel, no_reads = 10, loud = False):
+        return self.Run('ReadMultipleVoltage', input_channel, no_reads, loud)
+
+    def SweepStep(self, swp_channel, v_set, no_averages = 10):
+        """
+        One step of a sweep on every board: set swp_channel to v_set then read the averaged voltages at all analog input channels
+        The result for each board is the row [v_set, A2, A3, A4, A5, D2] as returned by Ser_Iface._Sweep
+        """
+
+        def step(dev, swp_channel, v_set, no_averages):
+            dev.WriteVoltage(swp_channel, v_set)
+            chnnl_values = dev.ReadAverageVoltageAllChnnl(no_averages)
+            return None if chnnl_values is None else numpy.concatenate(([v_set], chnnl_values))
+
+        return self.Run(step, swp_channel, v_set, no_averages)
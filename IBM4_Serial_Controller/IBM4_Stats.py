@@ -0,0 +1,225 @@
+"""
+Latency and throughput instrumentation for the IBM4 serial link
+
+A LinkStats object is attached to each Ser_Iface. Every command is timed from the moment it is registered with the framer
+until the framer reports its reply complete, so commands sent by _Transact, by an IBM4_Pipeline and by an IBM4_Stream
+are all measured in the same way. Write, PWM, Mode and Zero commands are counted but not timed, their echo is only read
+when the next reply is awaited, which can be long after it arrived, e.g. after the settle delay of a sweep.
+For pipelined or streamed commands the latency includes the time spent queued behind the commands sent before them.
+
+For each type of command a histogram of latencies is kept in logarithmically spaced bins,
+recording a command is a handful of arithmetic operations, no per-command allocation.
+The bytes sent and received, timeouts, retries and values received are also counted.
+
+Snapshot() returns the statistics as a dictionary, Dump() writes them to a text metrics file,
+StartDump() does so periodically from a background thread
+"""
+
+import os
+import math
+import time
+import threading
+import numpy
+
+MOD_NAME_STR = "IBM4_Stats"
+
+# latency histogram bins, BINS_PER_DECADE bins per decade from 10^LOG_MIN s to 10^LOG_MAX s
+# the first and last bins also hold latencies below / above the range
+LOG_MIN = -5
+LOG_MAX = 2
+BINS_PER_DECADE = 10
+NO_BINS = (LOG_MAX - LOG_MIN)*BINS_PER_DECADE
+BIN_EDGES = 10.0**(LOG_MIN + numpy.arange(1, NO_BINS + 1)/BINS_PER_DECADE) # upper edge of each bin, units of second
+
+# The type of command is identified from the leading letters of the command
+# a0, b0 are the zero commands
+CMD_NAMES = {b'a':'Zero', b'b':'Zero', b'*IDN':'IDN'}
+
+def Command_Type(command):
+    """
+    Return the type of an IBM4 command, e.g. b'Read1:500' => 'Read', b'Diff_Average0:1:10' => 'Diff_Average'
+    """
+
+    end = 0
+    while end < len(command) and (chr(command[end]).isalpha() or command[end] in b'_*'):
+        end = end + 1
+    name = bytes(command[:end])
+    return CMD_NAMES.get(name, name.decode(errors = 'replace'))
+
+class CommandStats(object):
+    """
+    Latency histogram and counters for one type of command
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.timed = 0 # no. commands whose latency was recorded
+        self.total = 0.0 # sum of latencies, units of second
+        self.max = 0.0
+        self.values = 0 # no. values received in the replies
+        self.hist = numpy.zeros(NO_BINS, dtype = numpy.int64)
+
+    def Record(self, latency, no_vals):
+        self.count = self.count + 1
+        self.values = self.values + no_vals
+        if latency is None:
+            return
+        self.timed = self.timed + 1
+        self.total = self.total + latency
+        self.max = max(self.max, latency)
+        idx = int( (math.log10(latency) - LOG_MIN)*BINS_PER_DECADE ) if latency > 0 else 0
+        self.hist[min(max(idx, 0), NO_BINS - 1)] += 1
+
+    def Quantile(self, q):
+        """
+        Return the upper edge of the histogram bin that holds quantile q of the latencies, units of second
+        """
+
+        if self.timed == 0:
+            return 0.0
+        idx = numpy.searchsorted(numpy.cumsum(self.hist), q*self.timed)
+        return min(float(BIN_EDGES[min(idx, NO_BINS - 1)]), self.max)
+
+class LinkStats(object):
+    """
+    Instrumentation of the commands sent over one IBM4 serial link
+    """
+
+    def __init__(self):
+        """
+        Constructor for the LinkStats object
+        """
+
+        self.lock = threading.Lock() # the dump thread reads while the link is in use
+        self.dump_thread = None
+        self.dump_stop = threading.Event()
+        self.Reset()
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 link statistics"
+
+    def Reset(self):
+        """
+        Clear all statistics
+        """
+
+        with self.lock:
+            self.t_reset = time.time() # wall clock time of the last reset
+            self.t_reset_mono = time.perf_counter()
+            self.commands = {} # command type : CommandStats
+            self.types = {} # command : command type, so that each distinct command is only parsed once
+            self.bytes_out = 0
+            self.bytes_in = 0
+            self.timeouts = 0
+            self.retries = 0
+
+    def Sent(self, no_bytes):
+        self.bytes_out = self.bytes_out + no_bytes
+
+    def Received(self, no_bytes):
+        self.bytes_in = self.bytes_in + no_bytes
+
+    def Timeout(self):
+        self.timeouts = self.timeouts + 1
+
+    def Retry(self):
+        self.retries = self.retries + 1
+
+    def Record(self, command, latency, no_vals = 0):
+        """
+        Record the latency (s) of a completed command, no_vals is the no. of values in its reply
+        latency = None => the command is counted but its latency is not known
+        """
+
+        cmd_type = self.types.get(command)
+        if cmd_type is None:
+            cmd_type = Command_Type(command)
+            self.types[command] = cmd_type
+        with self.lock:
+            cmd_stats = self.commands.get(cmd_type)
+            if cmd_stats is None:
+                cmd_stats = CommandStats()
+                self.commands[cmd_type] = cmd_stats
+            cmd_stats.Record(latency, no_vals)
+
+    def Snapshot(self):
+        """
+        Return the statistics as a dictionary
+
+        for each command type: count, the no. of those that were timed, mean / p50 / p90 / p99 / max latency in ms, and the values received
+        totals: bytes in / out, timeouts, retries, values received, and samples/s over the elapsed time
+        and over the time spent waiting on reads
+        """
+
+        with self.lock:
+            elapsed = time.perf_counter() - self.t_reset_mono
+            commands = {}
+            samples = 0
+            busy = 0.0
+            for cmd_type, cmd_stats in self.commands.items():
+                commands[cmd_type] = {"count":cmd_stats.count, "timed":cmd_stats.timed, "mean_ms":1000.0*cmd_stats.total/max(1, cmd_stats.timed),
+                                      "p50_ms":1000.0*cmd_stats.Quantile(0.5), "p90_ms":1000.0*cmd_stats.Quantile(0.9),
+                                      "p99_ms":1000.0*cmd_stats.Quantile(0.99), "max_ms":1000.0*cmd_stats.max, "values":cmd_stats.values}
+                if cmd_stats.values > 0:
+                    samples = samples + cmd_stats.values
+                    busy = busy + cmd_stats.total
+            return {"since":self.t_reset, "elapsed_s":elapsed, "commands":commands,
+                    "bytes_out":self.bytes_out, "bytes_in":self.bytes_in, "timeouts":self.timeouts, "retries":self.retries,
+                    "samples":samples, "samples_per_s":samples/elapsed if elapsed > 0 else 0.0,
+                    "read_samples_per_s":samples/busy if busy > 0 else 0.0}
+
+    def Dump(self, file_name, label = 'ibm4'):
+        """
+        Write the statistics to file_name as lines of the form
+        name{labels} value
+        The file is replaced atomically so that a reader never sees a partial file
+        """
+
+        FUNC_NAME = ".Dump()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        try:
+            snap = self.Snapshot()
+            lines = ['# IBM4 link statistics %(v1)s'%{"v1":time.strftime('%Y-%m-%d %H:%M:%S')}]
+            for key in ["elapsed_s", "bytes_out", "bytes_in", "timeouts", "retries", "samples", "samples_per_s", "read_samples_per_s"]:
+                lines.append('%(v1)s_%(v2)s %(v3)s'%{"v1":label, "v2":key, "v3":snap[key]})
+            for cmd_type, cmd_stats in sorted(snap["commands"].items()):
+                for key, val in cmd_stats.items():
+                    lines.append('%(v1)s_cmd_%(v2)s{cmd="%(v3)s"} %(v4)s'%{"v1":label, "v2":key, "v3":cmd_type, "v4":val})
+            tmp_file = file_name + '.tmp'
+            with open(tmp_file, 'w') as the_file:
+                the_file.write('\n'.join(lines) + '\n')
+            os.replace(tmp_file, file_name)
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def StartDump(self, file_name, interval = 10.0, label = 'ibm4'):
+        """
+        Dump the statistics to file_name every interval seconds from a background thread
+        """
+
+        self.StopDump()
+        self.dump_stop.clear()
+
+        def run():
+            while not self.dump_stop.wait(interval):
+                self.Dump(file_name, label)
+            self.Dump(file_name, label) # final dump when stopped
+
+        self.dump_thread = threading.Thread(target = run, name = MOD_NAME_STR, daemon = True)
+        self.dump_thread.start()
+
+    def StopDump(self):
+        """
+        Stop the periodic dump
+        """
+
+        if self.dump_thread is not None:
+            self.dump_stop.set()
+            self.dump_thread.join()
+            self.dump_thread = None
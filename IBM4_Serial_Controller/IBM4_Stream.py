@@ -0,0 +1,269 @@
+"""
+Continuous streaming acquisition from the IBM4
+
+ReadMultipleVoltage is limited to 10000 reads per call and the caller is blocked while it runs.
+A Stream issues Read (or BRead) commands back to back from a background thread, keeping the next command queued
+on the IBM4 while the current reply is being received, and writes each reply as one chunk into a fixed size numpy ring buffer
+together with the host times at which the chunk was started and completed.
+
+Consumers iterate over Chunks(), which yields views of the ring buffer rather than copies, e.g.
+
+with the_dev.Stream('A2', chunk_size = 500) as stream:
+    for seq, t_start, t_done, vals in stream.Chunks(max_chunks = 100):
+        print(seq, numpy.mean(vals))
+
+Collect copies a no. of chunks into one array together with their host times, see IBM4_Timing, e.g.
+
+vals, timing = stream.Collect(100)
+t, vals_uniform = timing.Resample(vals)
+
+A chunk that is overwritten before a consumer reaches it is counted as dropped,
+a chunk that takes more than late_factor times the typical chunk time to arrive is counted as late,
+a read that does not complete within the read_timeout of the Ser_Iface is counted as failed
+"""
+
+# threading.Condition
+# https://docs.python.org/3/library/threading.html#condition-objects
+
+import time
+import threading
+import collections
+import numpy
+import IBM4_Lib
+import IBM4_Decode
+import IBM4_Timing
+
+MOD_NAME_STR = "IBM4_Stream"
+
+class Stream(object):
+    """
+    Background acquisition of back to back multi-reads into a numpy ring buffer
+    """
+
+    def __init__(self, the_dev, input_channel, chunk_size = 500, no_chunks = 64, binary = False, late_factor = 2.0):
+        """
+        Constructor for the Stream object
+
+        the_dev (type: IBM4_Lib.Ser_Iface) is the open IBM4 that will be read
+        input_channel (type: str) is one of the labels for the analog input channels 'A2', 'A3', 'A4', 'A5', 'D2'
+        chunk_size (type: int) is the no. of reads made by each command, must be in the range [1, 10000)
+        no_chunks (type: int) is the no. of chunks held in the ring buffer
+        binary = True => BRead commands, values stored as int64, otherwise Read commands, values stored as float64
+        binary values are converted to volts with the_dev.GetCalibration().ToVolts(vals, input_channel, the_dev.read_mode)
+        late_factor (type: float) a chunk taking longer than late_factor times the running mean chunk time is late
+        """
+
+        FUNC_NAME = ".Stream()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        self.defined = False
+        self.running = False
+        self.thread = None
+        try:
+            c1 = True if the_dev.instr_obj is not None and the_dev.instr_obj.isOpen() else False # confirm that the instrument object has been instantiated
+            c2 = True if input_channel in IBM4_Lib.READ_CHNNLS else False # confirm that the input channel label is correct
+            c3 = True if chunk_size > 0 and chunk_size < 10000 else False # confirm that the no. reads per command is a sensible value
+            c4 = True if no_chunks > 1 else False # the ring must hold the chunk being written and at least one other
+            c10 = c1 and c2 and c3 and c4
+
+            if c10:
+                self.dev = the_dev
+                self.input_channel = input_channel
+                self.chunk_size = chunk_size
+                self.no_chunks = no_chunks
+                self.binary = binary
+                self.late_factor = late_factor
+                read_cmd = IBM4_Lib.BREAD_CMD if binary else IBM4_Lib.READ_CMD
+                self.read_cmd = str.encode( read_cmd%{"v1":IBM4_Lib.READ_CHNNLS[input_channel], "v2":chunk_size} )
+
+                # the ring buffer, chunk seq is stored in row seq % no_chunks
+                self.data = numpy.zeros( (no_chunks, chunk_size), dtype = numpy.int64 if binary else numpy.float64 )
+                self.t_start = numpy.zeros(no_chunks) # time.monotonic() at which the IBM4 started each chunk
+                self.t_done = numpy.zeros(no_chunks) # time.monotonic() at which each chunk was completely received
+
+                self.cond = threading.Condition() # guards written, notifies consumers of new chunks
+                self.written = 0 # no. chunks written to the ring since the stream started
+                self.dropped = 0 # no. chunks overwritten before a consumer reached them
+                self.late = 0 # no. chunks that took more than late_factor times the mean chunk time
+                self.failed = 0 # no. reads that timed out
+                self.mean_dt = None # running mean of the time taken per chunk
+                self.t_first = 0.0 # time.monotonic() at which the first chunk was started
+                self.defined = True
+            else:
+                if not c1:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not stream from instrument\nNo comms established'
+                if not c2:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not stream from instrument\ninput_channel outside range {A2, A3, A4, A5, D2}'
+                if not c3:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not stream from instrument\nchunk_size outside range [1, 10000)'
+                if not c4:
+                    ERR_STATEMENT = ERR_STATEMENT + '\nCould not stream from instrument\nno_chunks must be at least 2'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "stream of %(v1)d-read chunks from IBM4 channel %(v2)s"%{"v1":self.chunk_size, "v2":self.input_channel}
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+    def Start(self):
+        """
+        Start the background reader
+        """
+
+        if self.defined and not self.running:
+            self.running = True
+            self.thread = threading.Thread(target = self._Run, name = MOD_NAME_STR, daemon = True)
+            self.thread.start()
+
+    def Stop(self):
+        """
+        Stop the background reader, the command in flight is allowed to complete so that the Ser_Iface can be used again
+        """
+
+        if self.running:
+            self.running = False
+            self.thread.join()
+        with self.cond:
+            self.cond.notify_all()
+
+    def _Run(self):
+        """
+        The background reader, two commands are kept in flight so that the IBM4 starts the next chunk
+        as soon as it has sent the current one
+        """
+
+        FUNC_NAME = "._Run()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        dev = self.dev
+        in_flight = collections.deque() # requests sent to the IBM4, with the time they were sent
+        t_prev = 0.0 # time at which the previous chunk was completed
+        try:
+            while self.running:
+                with dev.io_lock:
+                    while len(in_flight) < 2:
+                        in_flight.append( (dev.framer.Expect(self.read_cmd, self.chunk_size), time.monotonic()) )
+                        dev._Write(self.read_cmd)
+                    req, t_sent = in_flight[0]
+                    complete = dev._Collect([req])
+                    if not complete:
+                        dev.framer.Discard(req)
+                t_done = time.monotonic()
+                in_flight.popleft()
+                if complete:
+                    self._Store(req.body, max(t_sent, t_prev), t_done)
+                else:
+                    self.failed = self.failed + 1
+                t_prev = t_done
+        except Exception as e:
+            self.running = False
+            print(ERR_STATEMENT)
+            print(e)
+        finally:
+            # let the commands still in flight complete so that their replies are not left on the link
+            with dev.io_lock:
+                for req, t_sent in in_flight:
+                    if not dev._Collect([req]):
+                        dev.framer.Discard(req)
+            with self.cond:
+                self.cond.notify_all()
+
+    def _Store(self, body, t_start, t_done):
+        """
+        Decode a reply into the next row of the ring buffer
+        """
+
+        vals = IBM4_Decode.Decode_Ints(body, self.chunk_size) if self.binary else IBM4_Decode.Decode_Floats(body, self.chunk_size)
+        if vals.size != self.chunk_size:
+            self.failed = self.failed + 1
+            return
+
+        dt = t_done - t_start
+        if self.mean_dt is not None and dt > self.late_factor*self.mean_dt:
+            self.late = self.late + 1
+        self.mean_dt = dt if self.mean_dt is None else 0.9*self.mean_dt + 0.1*dt
+
+        if self.written == 0:
+            self.t_first = t_start
+        slot = self.written % self.no_chunks
+        self.data[slot] = vals
+        self.t_start[slot] = t_start
+        self.t_done[slot] = t_done
+        with self.cond:
+            self.written = self.written + 1
+            self.cond.notify_all()
+
+    def Chunks(self, max_chunks = None, timeout = None):
+        """
+        Generator of the chunks acquired by the stream, starting from the oldest chunk held in the ring buffer
+
+        Yields (seq, t_start, t_done, vals), vals is a view of the ring buffer row holding chunk seq, not a copy,
+        it remains valid until the ring wraps around to that row, copy it if it is to be kept
+
+        Chunks that were overwritten before they were reached are skipped and counted as dropped
+        Iteration ends after max_chunks chunks, when the stream stops, or if no chunk arrives within timeout seconds
+        """
+
+        with self.cond:
+            seq = max(0, self.written - (self.no_chunks - 1))
+        count = 0
+        while max_chunks is None or count < max_chunks:
+            with self.cond:
+                while seq >= self.written:
+                    if not self.running:
+                        return
+                    if not self.cond.wait(timeout):
+                        return
+                # the row being written next is not safe to read, so at most no_chunks - 1 chunks are available
+                behind = self.written - seq - (self.no_chunks - 1)
+                if behind > 0:
+                    self.dropped = self.dropped + behind
+                    seq = seq + behind
+            slot = seq % self.no_chunks
+            yield seq, self.t_start[slot], self.t_done[slot], self.data[slot]
+            seq = seq + 1
+            count = count + 1
+
+    def Collect(self, no_chunks, timeout = None):
+        """
+        Copy the next no_chunks chunks acquired by the stream into one array, see Chunks
+
+        Returns (vals, timing), vals (type: numpy array) holds the readings of the chunks in the order they were taken,
+        timing (type: IBM4_Timing.ChunkTimes) holds the host times of the chunks, from which the time of each reading is estimated
+        Fewer than no_chunks chunks are returned if the stream stops or no chunk arrives within timeout seconds
+        """
+
+        vals = numpy.zeros( (no_chunks, self.chunk_size), dtype = self.data.dtype )
+        t_start = numpy.zeros(no_chunks)
+        t_done = numpy.zeros(no_chunks)
+        count = 0
+        for seq, t_s, t_d, chunk in self.Chunks(no_chunks, timeout):
+            vals[count] = chunk
+            t_start[count] = t_s
+            t_done[count] = t_d
+            count = count + 1
+        return vals[0:count].ravel(), IBM4_Timing.ChunkTimes(t_start[0:count], t_done[0:count], numpy.full(count, self.chunk_size))
+
+    def Status(self):
+        """
+        Return a dictionary of the stream counters and the acquisition rate
+        """
+
+        with self.cond:
+            written = self.written
+            last = self.t_done[(written - 1) % self.no_chunks] if written > 0 else 0.0
+        elapsed = last - self.t_first
+        return {"chunks":written, "samples":written*self.chunk_size, "dropped":self.dropped, "late":self.late, "failed":self.failed,
+                "samples_per_s":float(written*self.chunk_size/elapsed) if elapsed > 0 else 0.0}
@@ -0,0 +1,166 @@
+"""
+Crash-safe on-disk storage of sweep results
+
+A sweep of IBM4_Lib.Ser_Iface holds its results in memory and only returns them when the sweep is complete,
+so a sweep that is interrupted, e.g. by the USB link dropping, loses every step measured.
+A SweepFile appends each step to a file as soon as it has been measured so that an interrupted sweep can be resumed
+from the last completed step by repeating the same call with the same file.
+
+File layout, all values little-endian
+MAGIC (8 bytes)
+header length n (uint32)
+header (n bytes), JSON holding the sweep parameters and the column names, padded with spaces to a multiple of 8 bytes
+one record per completed step, no. columns float64 values, i.e. one row of the sweep result
+
+The file is flushed to disk with os.fsync every sync_every steps and when it is closed.
+A record left incomplete by a crash is removed when the file is reopened, at most sync_every steps are lost by a power failure.
+Read_Sweep_File returns the parameters and the completed rows of a file
+"""
+
+# Durability of writes
+# https://docs.python.org/3/library/os.html#os.fsync
+
+import os
+import json
+import time
+import struct
+import numpy
+
+MOD_NAME_STR = "IBM4_SweepFile"
+
+MAGIC = b'IBM4SWP\x01'
+LEN_FMT = '<I'
+ROW_DTYPE = numpy.dtype('<f8')
+
+def _Read_Header(the_file):
+    """
+    Read the header of an open sweep file, returns the header dictionary and the offset of the first record
+    """
+
+    magic = the_file.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError('not an IBM4 sweep file')
+    (hdr_len,) = struct.unpack(LEN_FMT, the_file.read(struct.calcsize(LEN_FMT)))
+    header = json.loads( the_file.read(hdr_len).decode() )
+    return header, len(MAGIC) + struct.calcsize(LEN_FMT) + hdr_len
+
+def _Same_Params(a, b):
+    """
+    Do the sweep parameters a and b describe the same sweep
+    """
+
+    if set(a) != set(b):
+        return False
+    for key in a:
+        if key == "set_points":
+            if not numpy.array_equal(numpy.asarray(a[key], dtype = numpy.float64), numpy.asarray(b[key], dtype = numpy.float64)):
+                return False
+        elif a[key] != b[key]:
+            return False
+    return True
+
+def Read_Sweep_File(file_name):
+    """
+    Read a sweep file
+
+    Returns the header dictionary and a numpy array holding the completed rows of the sweep
+    """
+
+    with open(file_name, 'rb') as the_file:
+        header, data_start = _Read_Header(the_file)
+        no_cols = len(header["columns"])
+        raw = the_file.read()
+    no_rows = len(raw)//(no_cols*ROW_DTYPE.itemsize)
+    data = numpy.frombuffer(raw[:no_rows*no_cols*ROW_DTYPE.itemsize], dtype = ROW_DTYPE).reshape(no_rows, no_cols)
+    return header, data.astype(numpy.float64)
+
+class SweepFile(object):
+    """
+    Append-only file of the completed steps of a sweep
+    """
+
+    def __init__(self, file_name, params, columns, sync_every = 10):
+        """
+        Constructor for the SweepFile object
+
+        file_name (type: str) is the file to which the steps are written
+        params (type: dict) are the sweep parameters, they must be JSON serialisable and include set_points
+        columns (type: list) are the names of the columns of each row
+        sync_every (type: int) is the no. of steps between calls to os.fsync
+
+        If file_name already holds steps of a sweep with the same params, the file is reopened and the completed rows are held in done,
+        if it holds a different sweep a ValueError is raised rather than overwriting it
+        """
+
+        self.file_name = file_name
+        self.params = params
+        self.columns = list(columns)
+        self.sync_every = max(1, sync_every)
+        self.pending = 0 # no. steps written since the last fsync
+        self.row_bytes = len(self.columns)*ROW_DTYPE.itemsize
+        self.done = numpy.zeros( (0, len(self.columns)) ) # rows completed before the file was opened
+
+        if os.path.exists(file_name) and os.path.getsize(file_name) > 0:
+            self.the_file = open(file_name, 'r+b')
+            try:
+                header, data_start = _Read_Header(self.the_file)
+                if not _Same_Params(header["params"], params) or header["columns"] != self.columns:
+                    raise ValueError('%(v1)s holds a different sweep, choose another file'%{"v1":file_name})
+                size = os.path.getsize(file_name)
+                no_rows = min( (size - data_start)//self.row_bytes, len(params["set_points"]) )
+                # drop any record left incomplete by a crash
+                self.the_file.truncate(data_start + no_rows*self.row_bytes)
+                self.the_file.seek(data_start)
+                raw = self.the_file.read(no_rows*self.row_bytes)
+                self.done = numpy.frombuffer(raw, dtype = ROW_DTYPE).reshape(no_rows, len(self.columns)).astype(numpy.float64)
+                self.the_file.seek(0, os.SEEK_END)
+            except Exception:
+                self.the_file.close()
+                raise
+        else:
+            header = json.dumps( {"format":1, "created":time.strftime('%Y-%m-%d %H:%M:%S'), "params":params, "columns":self.columns} ).encode()
+            header = header + b' '*(-(len(MAGIC) + struct.calcsize(LEN_FMT) + len(header)) % 8) # records start on an 8 byte boundary
+            self.the_file = open(file_name, 'wb')
+            self.the_file.write(MAGIC + struct.pack(LEN_FMT, len(header)) + header)
+            self.Sync()
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "IBM4 sweep file %(v1)s, %(v2)d steps completed before opening"%{"v1":self.file_name, "v2":len(self.done)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def Append(self, row):
+        """
+        Write the row of a completed step, the file is synced to disk every sync_every steps
+        """
+
+        self.the_file.write( numpy.asarray(row, dtype = ROW_DTYPE).tobytes() )
+        self.pending = self.pending + 1
+        if self.pending >= self.sync_every:
+            self.Sync()
+
+    def Sync(self):
+        """
+        Flush the steps written so far to disk
+        """
+
+        self.the_file.flush()
+        os.fsync(self.the_file.fileno())
+        self.pending = 0
+
+    def Close(self):
+        """
+        Sync and close the file
+        """
+
+        if not self.the_file.closed:
+            self.Sync()
+            self.the_file.close()
@@ -0,0 +1,105 @@
+"""
+Host timestamps of IBM4 multi-reads
+
+The IBM4 does not time stamp its readings and its sample rate varies from command to command, with the channel,
+the no. of reads and whatever else the board is doing, so the time between readings is not known in advance.
+What the host does know is when each chunk of readings, the reply to one Read command, was started and completed.
+A ChunkTimes records those times on the monotonic clock for a series of chunks and estimates from them
+
+the time per sample inside each chunk, (t_done - t_start) / no. readings in the chunk
+the time at which each reading was taken, the readings of a chunk are spread evenly between its start and completion
+the effective sample rate, the median over the chunks of 1 / time per sample
+
+When the chunks are pipelined, as in Ser_Iface.ReadLong and IBM4_Stream, a chunk is started when the previous one completes
+so its time per sample is not inflated by the link round trip, only the first chunk of ReadLong includes it.
+
+Resample interpolates the readings onto a uniform time grid in one vectorised pass, so that FFT or filtering code
+can treat them as evenly sampled, e.g.
+
+res = the_dev.ReadLong('A2', 100000, chunk_size = 500)
+t, vals = res[4].Resample(res[2])
+"""
+
+# numpy.interp
+# https://numpy.org/doc/stable/reference/generated/numpy.interp.html
+
+import numpy
+
+MOD_NAME_STR = "IBM4_Timing"
+
+class ChunkTimes(object):
+    """
+    Host times of a series of chunks of IBM4 readings
+    """
+
+    def __init__(self, t_start, t_done, sizes):
+        """
+        Constructor for the ChunkTimes object
+
+        t_start (type: array) time.monotonic() at which each chunk was started, nan for a chunk that was not read
+        t_done (type: array) time.monotonic() at which each chunk was completely received, nan for a chunk that was not read
+        sizes (type: array) no. of readings in each chunk
+        """
+
+        self.t_start = numpy.asarray(t_start, dtype = numpy.float64)
+        self.t_done = numpy.asarray(t_done, dtype = numpy.float64)
+        self.sizes = numpy.asarray(sizes, dtype = numpy.int64)
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "host times of %(v1)d chunks of IBM4 readings, %(v2)0.1f samples/s"%{"v1":self.sizes.size, "v2":self.Rate()}
+
+    def __len__(self):
+        return int( numpy.sum(self.sizes) )
+
+    def SampleTime(self):
+        """
+        Return the estimated time per reading inside each chunk, units of second, nan for a chunk that was not read
+        """
+
+        return (self.t_done - self.t_start)/self.sizes
+
+    def Rate(self):
+        """
+        Return the effective sample rate, the median over the chunks that were read of 1 / time per reading, units of Hz
+        The median is used so that a chunk delayed by the host, e.g. by the first command latency, does not bias the estimate
+        """
+
+        dt = self.SampleTime()
+        dt = dt[numpy.isfinite(dt) & (dt > 0)]
+        return float( 1.0/numpy.median(dt) ) if dt.size > 0 else 0.0
+
+    def Times(self):
+        """
+        Return the estimated time.monotonic() of each reading, reading i of a chunk of n readings is placed at t_start + (i + 0.5)*(t_done - t_start)/n
+        The readings of a chunk that was not read have time nan
+        """
+
+        first = numpy.cumsum(self.sizes) - self.sizes # index of the first reading of each chunk
+        chunk = numpy.repeat( numpy.arange(self.sizes.size), self.sizes ) # chunk of each reading
+        i = numpy.arange(chunk.size) - first[chunk] # position of each reading in its chunk
+        return self.t_start[chunk] + (i + 0.5)*self.SampleTime()[chunk]
+
+    def Resample(self, vals, rate = None):
+        """
+        Interpolate the readings vals, one per reading of the chunks, onto a uniform grid of times
+        rate (type: float) is the sample rate of the grid, rate = None => the effective sample rate, see Rate
+        Readings that are nan, or whose time is unknown, are skipped
+
+        Returns (t, vals_uniform), t is the uniform grid of times, starting at the time of the first reading
+        """
+
+        times = self.Times()
+        vals = numpy.asarray(vals, dtype = numpy.float64)
+        ok = numpy.isfinite(times) & numpy.isfinite(vals)
+        times = times[ok]
+        vals = vals[ok]
+        rate = self.Rate() if rate is None else rate
+        if times.size < 2 or rate <= 0:
+            return numpy.zeros(0), numpy.zeros(0)
+        # the times of readings in successive chunks are increasing, as numpy.interp requires
+        t = times[0] + numpy.arange( int( numpy.floor( (times[-1] - times[0])*rate ) ) + 1 )/rate
+        return t, numpy.interp(t, times, vals)
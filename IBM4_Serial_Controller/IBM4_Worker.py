@@ -0,0 +1,167 @@
+"""
+Thread-safe front end to an IBM4
+
+The methods of IBM4_Lib.Ser_Iface record their exception handling messages in self.FUNC_NAME and self.ERR_STATEMENT,
+so two threads using the same Ser_Iface, e.g. a datalogger and a sweep, overwrite each other's messages,
+and a method that makes several transactions, e.g. a sweep step, can have another thread's commands sent between them.
+
+A WorkerSer_Iface owns a Ser_Iface that is opened, used and closed by a single worker thread.
+Callers on any thread submit Ser_Iface method calls to a priority queue and are returned a concurrent.futures.Future,
+the worker runs the calls one at a time, so no two calls ever share the link and each reply stream is received whole.
+Calls of equal priority are run in the order they were submitted, a lower priority value is run first, e.g.
+
+with IBM4_Worker.WorkerSer_Iface() as dev:
+    fut = dev.ReadAverageVoltage('A2', 100) # any public Ser_Iface method, returns a Future
+    dev.ZeroIBM4(priority = IBM4_Worker.HIGH) # jumps ahead of every call still queued
+    print(fut.result())
+
+Priority only orders the calls that are waiting, a call that is running, e.g. a long sweep, is not interrupted
+"""
+
+# queue.PriorityQueue and concurrent.futures.Future
+# https://docs.python.org/3/library/queue.html#queue.PriorityQueue
+# https://docs.python.org/3/library/concurrent.futures.html#future-objects
+
+import queue
+import itertools
+import threading
+import concurrent.futures
+import IBM4_Lib
+
+MOD_NAME_STR = "IBM4_Worker"
+
+# priorities of the calls, lower values are run first
+HIGH = 0
+NORMAL = 1
+LOW = 2
+PRIORITIES = (HIGH, NORMAL, LOW)
+_STOP = float('inf') # sorts after every call, the worker stops once every call submitted before Close has run
+
+class WorkerSer_Iface(object):
+    """
+    class for interfacing to an IBM4 from several threads through a single worker thread
+    """
+
+    def __init__(self, port_name = None, read_mode = 'DC', baud_rate = IBM4_Lib.DEFAULT_BAUD, negotiate_baud = False):
+        """
+        Constructor for the WorkerSer_Iface object
+        The worker thread is started and the Ser_Iface is opened in it, the arguments are those of IBM4_Lib.Ser_Iface
+        """
+
+        FUNC_NAME = ".WorkerSer_Iface()" # use this in exception handling messages
+        ERR_STATEMENT = "Error: " + MOD_NAME_STR + FUNC_NAME
+
+        self.MOD_NAME_STR = MOD_NAME_STR
+        self.dev = None
+        self.calls = queue.PriorityQueue() # (priority, seq, future, method name, args, kwargs)
+        self.seq = itertools.count() # orders calls of equal priority by submission
+        self.closed = False
+        self.worker = threading.Thread(target = self._Run, name = MOD_NAME_STR, daemon = True)
+        self.worker.start()
+        try:
+            self.dev = self._Put(HIGH, IBM4_Lib.Ser_Iface, (port_name, read_mode, baud_rate, negotiate_baud), {}).result()
+            if self.dev.instr_obj is None or not self.dev.instr_obj.isOpen():
+                ERR_STATEMENT = ERR_STATEMENT + '\nCould not open IBM4'
+                raise Exception
+        except Exception as e:
+            print(ERR_STATEMENT)
+            print(e)
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "class for interfacing to an IBM4 from several threads through a single worker thread"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def __getattr__(self, name):
+        """
+        Public methods of IBM4_Lib.Ser_Iface are submitted to the worker, the keyword priority sets the priority of the call
+        """
+
+        if name.startswith('_') or not callable(getattr(IBM4_Lib.Ser_Iface, name, None)):
+            raise AttributeError("'%(v1)s' object has no attribute '%(v2)s'"%{"v1":type(self).__name__, "v2":name})
+
+        def submit(*args, priority = NORMAL, **kwargs):
+            return self.Submit(name, *args, priority = priority, **kwargs)
+
+        submit.__name__ = name
+        submit.__doc__ = getattr(IBM4_Lib.Ser_Iface, name).__doc__
+        return submit
+
+    def _Put(self, priority, method, args, kwargs):
+        """
+        Queue a call and return its Future, priority must be one of HIGH, NORMAL, LOW
+        """
+
+        if self.closed:
+            raise RuntimeError('IBM4 worker is closed')
+        if priority not in PRIORITIES:
+            raise ValueError('priority must be one of HIGH, NORMAL, LOW')
+        future = concurrent.futures.Future()
+        self.calls.put( (priority, next(self.seq), future, method, args, kwargs) )
+        return future
+
+    def _Run(self):
+        """
+        Worker thread, runs the queued calls one at a time until Close
+        """
+
+        while True:
+            priority, seq, future, method, args, kwargs = self.calls.get()
+            if priority == _STOP:
+                if self.dev is not None and self.dev.instr_obj is not None:
+                    self.dev.__del__() # zero the outputs and close the link from the thread that owns it
+                    self.dev.IBM4Port = None # so that it is not closed again when garbage collected
+                # cancel any call that reached the queue while the worker was stopping, so that no Future is left waiting
+                while not self.calls.empty():
+                    self.calls.get_nowait()[2].cancel()
+                future.set_result(None)
+                return
+            if not future.set_running_or_notify_cancel():
+                continue # cancelled while queued
+            try:
+                func = method if callable(method) else getattr(self.dev, method)
+                future.set_result( func(*args, **kwargs) )
+            except BaseException as e:
+                future.set_exception(e)
+
+    def Submit(self, method, *args, priority = NORMAL, **kwargs):
+        """
+        Queue a call of the Ser_Iface method named method, e.g. 'ReadAverageVoltage', with args and kwargs
+        Returns a concurrent.futures.Future that holds the value returned by the method, a queued call can be cancelled with future.cancel()
+        """
+
+        return self._Put(priority, method, args, kwargs)
+
+    def Call(self, method, *args, priority = NORMAL, timeout = None, **kwargs):
+        """
+        Submit a call and wait up to timeout seconds for its result, timeout = None => wait until it is done
+        """
+
+        return self.Submit(method, *args, priority = priority, **kwargs).result(timeout)
+
+    def Pending(self):
+        """
+        Return the approximate no. of calls waiting in the queue
+        """
+
+        return self.calls.qsize()
+
+    def Close(self):
+        """
+        Run every call already submitted, then zero the outputs, close the link and stop the worker
+        """
+
+        if not self.closed:
+            self.closed = True
+            done = concurrent.futures.Future()
+            self.calls.put( (_STOP, next(self.seq), done, None, (), {}) )
+            done.result()
+            self.worker.join()
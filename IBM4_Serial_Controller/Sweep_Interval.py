@@ -5,6 +5,23 @@ e.g. sweep from start-value to stop-value in steps of delta
 R. Sheehan 1 - 3 - 2019
 """
 
+import numpy
+
+def Set_Points(start_value, stop_value, delta):
+    """
+    Return the set-points start_value, start_value + delta, start_value + 2 delta, ... < stop_value as a numpy array
+
+    The values are accumulated by repeated addition, exactly as the sweep loops in IBM4_Lib have always done,
+    so that the no. of points and their values are those the sweep has always produced
+    """
+
+    points = []
+    v_set = start_value
+    while v_set < stop_value:
+        points.append(v_set)
+        v_set = v_set + delta
+    return numpy.array(points, dtype = numpy.float64)
+
 class SweepSpace(object):
     """
     Class that describes the bounds of a parameter sweep space
@@ -70,7 +87,202 @@ class SweepSpace(object):
         except Exception as e:
             print(self.ERR_STATEMENT)
             print(e)
-        
 
+    def SetPoints(self):
+        """
+        Return the set-points of the sweep space as a numpy array, see Set_Points
+        """
+
+        return Set_Points(self.start, self.stop, self.delta) if self.defined else numpy.array([], dtype = numpy.float64)
+
+def Serpentine(no_outer, no_inner):
+    """
+    Return the (outer, inner) index pairs of a no_outer x no_inner grid in serpentine (boustrophedon) order as a numpy array of shape (no_outer*no_inner, 2)
+
+    The inner index runs forwards on even rows of the outer index and backwards on odd rows,
+    so that consecutive points differ by one step of a single index, never by a fly-back across the whole inner range
+    """
+
+    inner = numpy.arange(no_inner)
+    order = numpy.empty( (no_outer, no_inner, 2), dtype = numpy.int64 )
+    order[:, :, 0] = numpy.arange(no_outer)[:, numpy.newaxis]
+    order[:, :, 1] = inner
+    order[1::2, :, 1] = inner[::-1]
+    return order.reshape(no_outer*no_inner, 2)
+
+class SweepProgram(object):
+    """
+    Class that describes a sweep made of segments, e.g. up / down ramps for hysteresis or IV measurements,
+    logarithmic ramps, explicit lists of values and dwell points
+
+    The segments are compiled once into a single list of set-points quantised to the delta_min resolution of the analog outputs,
+    codes that repeat the previous code, e.g. where one segment ends at the value the next begins, or where a logarithmic ramp
+    is finer than delta_min, are dropped, dwell points are kept so that the output is held and read again.
+    The compiled set-points are swept as one continuous run, see IBM4_Lib.Ser_Iface.ProgramSweep, e.g.
+
+    prog = Sweep_Interval.SweepProgram()
+    prog.Ramp(0.0, 3.0, 31).Dwell(5).Ramp(3.0, 0.0, 31)
+    """
+
+    def __init__(self, delta_min = 0.01):
+        """
+        Constructor for the SweepProgram object
+
+        delta_min (type:float) is the resolution of the analog outputs, set-points are rounded to integer multiples of delta_min
+        """
+
+        self.MOD_NAME_STR = "Sweep_Interval"
+        self.FUNC_NAME = ".__init__()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        self.delta_min = delta_min
+        self.segments = [] # list of (values, dwell), dwell segments may repeat the previous code
+        self.codes = None # compiled set-points in units of delta_min
+        self.segment_index = None # segment to which each compiled set-point belongs
+        self.defined = False
+
+    def __str__(self):
+        """
+        return a string the describes the class
+        """
+
+        return "Sweep program of %(v1)d segments"%{"v1":len(self.segments)}
+
+    def _Add(self, values, dwell = False):
+        """
+        Append a segment and mark the program for recompilation
+        """
+
+        self.segments.append( (numpy.asarray(values, dtype = numpy.float64).ravel(), dwell) )
+        self.codes = None
+        self.defined = True
+        return self
+
+    def Ramp(self, start_value, stop_value, no_points):
+        """
+        Append a linear ramp of no_points from start_value to stop_value inclusive, start_value > stop_value ramps down
+        """
+
+        self.FUNC_NAME = ".Ramp()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            c1 = True if no_points > 1 else False
+            c2 = True if abs(stop_value - start_value) > 0 else False
+            c10 = c1 and c2
+
+            if c10:
+                return self._Add( numpy.linspace(start_value, stop_value, no_points) )
+            else:
+                if not c1:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nno_points in ramp is too small'
+                if not c2:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nlength of ramp is not defined'
+                raise Exception
+        except Exception as e:
+            print(self.ERR_STATEMENT)
+            print(e)
+            return self
+
+    def LogRamp(self, start_value, stop_value, no_points):
+        """
+        Append a ramp of no_points from start_value to stop_value inclusive, logarithmically spaced, both values must be > 0
+        """
+
+        self.FUNC_NAME = ".LogRamp()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            c1 = True if no_points > 1 else False
+            c2 = True if start_value > 0 and stop_value > 0 and start_value != stop_value else False
+            c10 = c1 and c2
 
+            if c10:
+                return self._Add( numpy.geomspace(start_value, stop_value, no_points) )
+            else:
+                if not c1:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nno_points in ramp is too small'
+                if not c2:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nramp bounds must be distinct and > 0'
+                raise Exception
+        except Exception as e:
+            print(self.ERR_STATEMENT)
+            print(e)
+            return self
+
+    def Interval(self, sweep_space):
+        """
+        Append the set-points of a SweepSpace
+        """
+
+        return self._Add( sweep_space.SetPoints() )
+
+    def Points(self, values):
+        """
+        Append an explicit list of set-points
+        """
+
+        return self._Add(values)
+
+    def Dwell(self, no_points, value = None):
+        """
+        Hold the output at value for no_points steps, value = None holds the output at the last set-point of the program
+        """
+
+        self.FUNC_NAME = ".Dwell()" # use this in exception handling messages
+        self.ERR_STATEMENT = "Error: " + self.MOD_NAME_STR + self.FUNC_NAME
+
+        try:
+            c1 = True if no_points > 0 else False
+            c2 = True if value is not None or len(self.segments) > 0 else False
+            c10 = c1 and c2
+
+            if c10:
+                if value is None:
+                    value = [seg for seg, dwell in self.segments if len(seg) > 0][-1][-1]
+                return self._Add( numpy.full(no_points, value), dwell = True )
+            else:
+                if not c1:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nno_points in dwell is too small'
+                if not c2:
+                    self.ERR_STATEMENT = self.ERR_STATEMENT + '\nno value to dwell at'
+                raise Exception
+        except Exception as e:
+            print(self.ERR_STATEMENT)
+            print(e)
+            return self
+
+    def Compile(self):
+        """
+        Quantise the segments to integer codes in units of delta_min and drop codes that repeat the previous code, except at dwell points
+        The result is kept, the program is only recompiled after a segment is added
+        """
+
+        if self.codes is None:
+            if len(self.segments) == 0:
+                self.codes = numpy.array([], dtype = numpy.int64)
+                self.segment_index = numpy.array([], dtype = numpy.int64)
+            else:
+                codes = numpy.concatenate( [numpy.rint(seg/self.delta_min).astype(numpy.int64) for seg, dwell in self.segments] )
+                index = numpy.concatenate( [numpy.full(len(seg), k, dtype = numpy.int64) for k, (seg, dwell) in enumerate(self.segments)] )
+                dwell = numpy.concatenate( [numpy.full(len(seg), dwell, dtype = bool) for seg, dwell in self.segments] )
+                keep = numpy.ones(len(codes), dtype = bool)
+                keep[1:] = (codes[1:] != codes[:-1]) | dwell[1:]
+                self.codes = codes[keep]
+                self.segment_index = index[keep]
+        return self.codes
+
+    def SetPoints(self):
+        """
+        Return the compiled set-points of the program as a numpy array
+        """
+
+        return numpy.round(self.Compile()*self.delta_min, 6) # remove the rounding error of the product, e.g. 0.30000000000000004
+
+    def SegmentIndex(self):
+        """
+        Return the segment to which each compiled set-point belongs, e.g. to separate the up and down branches of a hysteresis sweep
+        """
 
+        self.Compile()
+        return self.segment_index
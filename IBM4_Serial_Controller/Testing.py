@@ -36,4 +36,49 @@ Control_Examples.Multimeter_Mode()
 
 # 7. Linear single channel sweep
 #Control_Examples.Linear_Sweep_V1()
-#Control_Examples.Linear_Sweep_V2()
\ No newline at end of file
+#Control_Examples.Linear_Sweep_V2()
+
+# 8. asyncio reads on several IBM4
+#Control_Examples.Async_Multiple_Boards(['COM3', 'COM4'])
+
+# 9. Linear sweep with adaptive settle time
+#Control_Examples.Linear_Sweep_Settle()
+
+# 10. Continuous streaming acquisition
+#Control_Examples.Streaming_Acquisition()
+
+# 11. Reads on every attached IBM4 using a pool
+#Control_Examples.Pool_All_Boards()
+
+# 12. Examples run against an emulated IBM4
+#Control_Examples.Emulated_IBM4()
+
+# 13. Differential voltages between all pairs of channels
+#Control_Examples.Differential_Matrix()
+
+# 14. Sweep written to disk step by step, resumable
+#Control_Examples.Resumable_Sweep()
+
+# 15. Sweep of both analog outputs over a grid of voltages
+#Control_Examples.Grid_Sweep()
+
+# 16. Up / down sweep for hysteresis measurements using a sweep program
+#Control_Examples.Hysteresis_Sweep()
+
+# 17. Datalogging at a fixed rate to rolling files
+#Control_Examples.Data_Logging()
+
+# 18. One IBM4 shared by several threads
+#Control_Examples.Shared_IBM4()
+
+# 19. Tight write / read loop using pre-encoded commands
+#Control_Examples.Fast_Loop()
+
+# 20. Constant current through a sense resistor using closed loop control
+#Control_Examples.Constant_Current()
+
+# 21. Long acquisition of one million readings
+#Control_Examples.Long_Acquisition()
+
+# 22. Host timestamps of readings and resampling onto a uniform time grid
+#Control_Examples.Timed_Readings()